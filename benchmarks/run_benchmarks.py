@@ -0,0 +1,320 @@
+"""
+Offline benchmark suite of the CLI hot paths: address and seed validation, operations construction, transaction
+signing, XDR results decoding, encrypted files and a whole payment submitted to the local mock Horizon server.
+No network access is done. Run from the repository root:
+
+    python benchmarks/run_benchmarks.py --output before.json
+    python benchmarks/run_benchmarks.py --output after.json --compare before.json
+
+Each benchmark is first run a few times as warmup (filling caches and importing what it needs), then its number
+of runs per repetition is calibrated to take at least --min-time seconds, and the time per run of each repetition
+is measured. The results (and the commit they were measured on) are written as JSON to compare commits.
+"""
+# System imports
+import argparse
+import base64
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+# Local imports
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY_DIR)
+from pygeek_stellar.mock_horizon import MockHorizon
+from pygeek_stellar.stellar_requests import *
+from pygeek_stellar.utils.cryptography import *
+from pygeek_stellar.utils.file import *
+from pygeek_stellar.utils.strkey import get_address_error, validate_addresses
+
+DEFAULT_WARMUP = 3
+DEFAULT_REPEAT = 5
+DEFAULT_MIN_TIME_SECONDS = 0.2
+ADDRESSES_COUNT = 20000
+INVALID_ADDRESSES_RATIO = 10  # One in each 10 addresses has a corrupted checksum
+TRANSACTION_OPERATIONS = STELLAR_MAX_OPERATIONS_PER_TRANSACTION
+DECODED_RESULTS_COUNT = 1000
+CONFIG_FILE_SIZE = 64 * 1024
+PASSWORD = 'benchmark password'
+
+# Registered benchmark: its name, the number of items processed by each run (to report the throughput) and the
+# function preparing its state and returning the function to be timed
+Benchmark = namedtuple('Benchmark', ['name', 'items', 'prepare'])
+BENCHMARKS = []
+
+
+def benchmark(name, items=1):
+    """
+    Registers a benchmark. The decorated function prepares the benchmark state and returns the function to be
+    timed, which is called without arguments.
+    :param str name: Benchmark name, as 'group/case'.
+    :param int items: Number of items (e.g. addresses) processed by each run.
+    """
+    def register(prepare):
+        BENCHMARKS.append(Benchmark(name, items, prepare))
+        return prepare
+    return register
+
+
+def generate_addresses(count):
+    """
+    Generates random account addresses, some of them with a corrupted checksum.
+    :param int count: Number of addresses to generate.
+    :return: Returns the generated addresses.
+    :rtype: list of str
+    """
+    from stellar_base.utils import encode_check
+
+    addresses = []
+    for i in range(count):
+        address = encode_check('account', os.urandom(32)).decode()
+        if i % INVALID_ADDRESSES_RATIO == 0:
+            address = address[:-1] + ('A' if address[-1] != 'A' else 'B')
+        addresses.append(address)
+    return addresses
+
+
+def transaction_result_xdr(operations):
+    """
+    Packs the TransactionResult XDR of a successful transaction with the given number of successful payments.
+    :param int operations: Number of payments.
+    :return: Returns the base64 encoded XDR.
+    :rtype: str
+    """
+    xdr = struct.pack('>qiI', STELLAR_BASE_FEE * operations, 0, operations)
+    xdr += struct.pack('>iii', 0, 1, 0) * operations
+    return base64.b64encode(xdr + struct.pack('>i', 0)).decode()
+
+
+@benchmark('validation/is_address_valid', items=ADDRESSES_COUNT)
+def prepare_is_address_valid():
+    addresses = generate_addresses(ADDRESSES_COUNT)
+    return lambda: [is_address_valid(address) for address in addresses]
+
+
+@benchmark('validation/get_address_error', items=ADDRESSES_COUNT)
+def prepare_get_address_error():
+    addresses = generate_addresses(ADDRESSES_COUNT)
+    return lambda: [get_address_error(address) is None for address in addresses]
+
+
+@benchmark('validation/validate_addresses', items=ADDRESSES_COUNT)
+def prepare_validate_addresses():
+    addresses = generate_addresses(ADDRESSES_COUNT)
+    return lambda: validate_addresses(addresses)
+
+
+@benchmark('validation/is_seed_valid')
+def prepare_is_seed_valid():
+    seed = generate_keypairs(1)[0][1]
+    return lambda: is_seed_valid(seed)
+
+
+@benchmark('validation/is_seed_matching_address')
+def prepare_is_seed_matching_address():
+    address, seed = generate_keypairs(1)[0]
+    return lambda: is_seed_matching_address(seed, address)
+
+
+@benchmark('validation/seed_to_address (uncached)')
+def prepare_seed_to_address():
+    seed = generate_keypairs(1)[0][1]
+
+    def run():
+        forget_seed_addresses()
+        seed_to_address(seed)
+    return run
+
+
+@benchmark('operations/create_payment_op', items=TRANSACTION_OPERATIONS)
+def prepare_create_payment_op():
+    destination, issuer = [address for address, _ in generate_keypairs(2)]
+    return lambda: [create_payment_op(destination, '10.5', 'EUR', issuer) for _ in range(TRANSACTION_OPERATIONS)]
+
+
+@benchmark('operations/create_path_payment_op', items=TRANSACTION_OPERATIONS)
+def prepare_create_path_payment_op():
+    destination, issuer = [address for address, _ in generate_keypairs(2)]
+    path = [('USD', issuer), ('BTC', issuer)]
+    return lambda: [create_path_payment_op(destination, 'XLM', None, '100', 'EUR', issuer, '10', path)
+                    for _ in range(TRANSACTION_OPERATIONS)]
+
+
+@benchmark('signing/build_transaction_envelope', items=TRANSACTION_OPERATIONS)
+def prepare_build_transaction_envelope():
+    from stellar_base.keypair import Keypair
+
+    (source, seed), (destination, _) = generate_keypairs(2)
+    operations = [create_payment_op(destination, '1', source=source) for _ in range(TRANSACTION_OPERATIONS)]
+    signers = [Keypair.from_seed(seed)]
+    return lambda: build_transaction_envelope(source, 1, operations, 'benchmark', signers).xdr()
+
+
+@benchmark('xdr/decode_transaction_result')
+def prepare_decode_transaction_result():
+    xdr = transaction_result_xdr(1)
+    return lambda: decode_transaction_result(xdr)
+
+
+@benchmark('xdr/decode_transaction_results', items=DECODED_RESULTS_COUNT)
+def prepare_decode_transaction_results():
+    xdrs = [transaction_result_xdr(TRANSACTION_OPERATIONS)] * DECODED_RESULTS_COUNT
+    return lambda: decode_transaction_results(xdrs)
+
+
+@benchmark('crypto/password2cryptographic_key (uncached)')
+def prepare_password2cryptographic_key():
+    salt = generate_salt()
+
+    def run():
+        wipe_cryptographic_keys()
+        password2cryptographic_key(PASSWORD, salt)
+    return run
+
+
+@benchmark('crypto/encrypt_decrypt_with_header')
+def prepare_encrypt_decrypt_with_header():
+    content = os.urandom(CONFIG_FILE_SIZE)
+    salt = generate_salt()
+    return lambda: decrypt_with_header(encrypt_with_header(content, PASSWORD, salt), PASSWORD)
+
+
+@benchmark('crypto/encrypted_config_file_round_trip')
+def prepare_encrypted_config_file_round_trip():
+    content = base64.b64encode(os.urandom(CONFIG_FILE_SIZE * 3 // 4)).decode()
+    directory = tempfile.TemporaryDirectory()  # Removed once the benchmark is no longer referenced
+
+    def run():
+        filename = os.path.join(directory.name, 'config.json')
+        write_encrypted_file(filename, content, PASSWORD)
+        load_encrypted_file(filename, PASSWORD)
+    return run
+
+
+@benchmark('end_to_end/payment')
+def prepare_payment():
+    horizon = MockHorizon()
+    set_horizon_url(horizon.start())
+    (source, seed), (destination, _) = generate_keypairs(2)
+    horizon.fund_account(source)
+    horizon.fund_account(destination)
+
+    def run():
+        operations = [create_payment_op(destination, '0.0000001', source=source)]
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = submit_operations(seed, operations, 'benchmark')
+            process_server_payment_response(response)
+        if not is_successful_submit_response(response):
+            raise RuntimeError('The payment was not submitted: {}'.format(response))
+    return run
+
+
+def measure(timed, warmup, repeat, min_time):
+    """
+    Measures the time per run of a function.
+    :param timed: Function to be timed.
+    :param int warmup: Number of runs before the measurement.
+    :param int repeat: Number of measured repetitions.
+    :param float min_time: Minimum duration, in seconds, of each repetition.
+    :return: Returns the number of runs per repetition and the time per run, in seconds, of each repetition.
+    :rtype: (int, list of float)
+    """
+    for _ in range(warmup):
+        timed()
+
+    number = 1
+    while True:
+        elapsed = _time_runs(timed, number)
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9) * 1.1))
+
+    return number, [elapsed / number] + [_time_runs(timed, number) / number for _ in range(repeat - 1)]
+
+
+def _time_runs(timed, number):
+    """
+    Times several runs of a function.
+    :param timed: Function to be timed.
+    :param int number: Number of runs.
+    :return: Returns the total elapsed time, in seconds.
+    :rtype: float
+    """
+    start = time.perf_counter()
+    for _ in range(number):
+        timed()
+    return time.perf_counter() - start
+
+
+def get_commit():
+    """
+    Returns the commit of the repository being benchmarked.
+    :return: Returns the commit hash (with a '-dirty' suffix if there are uncommitted changes) or None if it is not
+    known.
+    :rtype: str or None
+    """
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=REPOSITORY_DIR,
+                                         stderr=subprocess.DEVNULL).decode().strip()
+        dirty = subprocess.call(['git', 'diff', '--quiet', 'HEAD', '--', 'pygeek_stellar'], cwd=REPOSITORY_DIR,
+                                stderr=subprocess.DEVNULL) != 0
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ('-dirty' if dirty else '')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--warmup', type=int, default=DEFAULT_WARMUP, help='Runs before measuring each benchmark')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='Measured repetitions of each benchmark')
+    parser.add_argument('--min-time', type=float, default=DEFAULT_MIN_TIME_SECONDS,
+                        help='Minimum duration, in seconds, of each repetition')
+    parser.add_argument('--filter', action='append', default=[],
+                        help='Only run the benchmarks whose name contains this text (can be repeated)')
+    parser.add_argument('--output', help='JSON file to which the results are written')
+    parser.add_argument('--compare', help='JSON file of previous results to compare the results with')
+    parser.add_argument('--list', action='store_true', help='List the benchmarks and exit')
+    args = parser.parse_args()
+
+    benchmarks = [b for b in BENCHMARKS if not args.filter or any(text in b.name for text in args.filter)]
+    if args.list:
+        print('\n'.join(b.name for b in benchmarks))
+        return
+    baseline = {}
+    if args.compare is not None:
+        content = decode_json_content(load_file(args.compare))
+        if content is None:
+            sys.exit(1)
+        baseline = content.get('results', {})
+
+    results = {}
+    print('{:<48} {:>12} {:>10} {:>16} {:>8}'.format('benchmark', 'median', 'stdev', 'items/s', 'change'))
+    for b in benchmarks:
+        runs, times = measure(b.prepare(), max(0, args.warmup), max(1, args.repeat), args.min_time)
+        median = statistics.median(times)
+        results[b.name] = {'items': b.items, 'runs': runs, 'times': times, 'min': min(times), 'median': median,
+                           'mean': statistics.mean(times), 'stdev': statistics.stdev(times) if len(times) > 1 else 0.0}
+        change = ''
+        if b.name in baseline:
+            change = '{:+.1%}'.format(median / baseline[b.name]['median'] - 1)
+        print('{:<48} {:>10.3f}ms {:>9.1%} {:>16,.0f} {:>8}'.format(
+            b.name, median * 1000, results[b.name]['stdev'] / median, b.items / median, change))
+
+    if args.output is not None:
+        report = {'commit': get_commit(), 'date': datetime.now(timezone.utc).isoformat(),
+                  'python': platform.python_version(), 'platform': platform.platform(),
+                  'warmup': args.warmup, 'repeat': args.repeat, 'min_time': args.min_time, 'results': results}
+        if not write_file(args.output, json.dumps(report, indent=2)):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,6 @@
-# 3rd party imports
-from stellar_base.keypair import Keypair
 # Local imports
 from .constants import *
+from .keystore import Keystore
 from .utils.user_input import *
 from .utils.file import *
 from .utils.generic import *
@@ -27,38 +26,61 @@ class CliSession:
         self.account_name: str = account_name
         self.account_address: str = account_address
         self.account_seed: str = account_seed
+        self._validated_seed = None  # Seed already checked to be valid and matching the account address
 
     def store_account_in_config_file(self):
-        if not _config_file_exists():
-            password = password_input("Please insert an encryption/decryption password "
-                                      "to protect the configuration file")
-            if password != password_input("Please insert the encryption/decryption password again"):
-                print("The inserted passwords are distinct. The configuration file could not be created")
-                return
-            configs_json = CONFIG_FILE_EMPTY_JSON
+        if _config_file_exists():
+            keystore = _config_file_open()
         else:
-            password = password_input("Please insert the decryption password of the configuration file")
-            configs_json = _config_file_load(password)
-            if configs_json is None:
-                print("The configuration file is either empty, could not be decrypted or is an invalid JSON file.")
-                return
-
-        configs_json[JSON_ACCOUNTS_TAG].append({
-            JSON_ACCOUNT_NAME_TAG: self.account_name,
-            JSON_ACCOUNT_ADDRESS_TAG: self.account_address,
-            JSON_ACCOUNT_SEED_TAG: self.account_seed})
-
-        _config_file_write(json.dumps(configs_json), password)
+            keystore = _config_file_create()
+        if keystore is None:
+            return
+
+        if keystore.add_account(self.account_name, self.account_address, self.account_seed):
+            print("Account successfully stored in the configuration file: {}".format(keystore.filename))
+
+    def store_channel_accounts(self, channel_accounts):
+        """
+        Stores new channel accounts of the CLI session account on the configuration file. They are added
+        to the channel accounts already stored, if any.
+        :param list channel_accounts: List of (address, seed) tuples of the channel accounts.
+        :return: Returns True in case of success and False otherwise.
+        :rtype: bool
+        """
+        keystore = _config_file_open() if _config_file_exists() else _config_file_create()
+        if keystore is None:
+            return False
+
+        n_stored_channels = len(_config_file_channel_seeds(keystore, self.account_address))
+        return keystore.add_accounts(
+            (CHANNEL_ACCOUNT_NAME_FORMAT.format(self.account_address, n_stored_channels + i + 1), address, seed)
+            for i, (address, seed) in enumerate(channel_accounts))
+
+    def load_channel_seeds(self):
+        """
+        Loads the seeds of the channel accounts of the CLI session account from the configuration file.
+        :return: Returns the list of channel account seeds (empty if there are none) or None if the
+        configuration file could not be opened.
+        :rtype: list or None
+        """
+        if not _config_file_exists():
+            return []
+        keystore = _config_file_open()
+        if keystore is None:
+            return None
+        return _config_file_channel_seeds(keystore, self.account_address)
 
     def fetch_valid_seed(self):
-        if self.account_seed is None \
-                or not is_seed_valid(self.account_seed) \
-                or not is_seed_matching_address(self.account_seed, self.account_address):
+        if self.account_seed is not None and self.account_seed == self._validated_seed:
+            return self.account_seed
+        if not is_seed_matching_address(self.account_seed, self.account_address):
             self.account_seed = self.ask_for_user_seed("Either no seed was found for this CLI session account, "
                                                        "the seed for this CLI session account is invalid or "
                                                        "the seed does match the current CLI session account address. "
                                                        "No transaction can be made without a valid seed. Please "
                                                        "insert your seed to process the transaction")
+        else:
+            self._validated_seed = self.account_seed
         return self.account_seed
 
     def ask_for_user_seed(self, msg):
@@ -80,6 +102,20 @@ class CliSession:
         return 'Account Name: {}, Account Address: {}'.format(self.account_name, self.account_address)
 
 
+def store_accounts_in_config_file(accounts):
+    """
+    Stores several accounts on the configuration file with a single write. The configuration file is
+    created if it does not exist yet.
+    :param accounts: Iterable of (name, address, seed) tuples. Names and seeds can be None.
+    :return: Returns True in case of success and False otherwise.
+    :rtype: bool
+    """
+    keystore = _config_file_open() if _config_file_exists() else _config_file_create()
+    if keystore is None:
+        return False
+    return keystore.add_accounts(accounts)
+
+
 def init_cli_session():
     """
     This function initializes a CLI session. There are three alternatives to initialize a session:
@@ -103,42 +139,81 @@ def init_cli_session():
     return None
 
 
+def init_cli_session_from_account(account, password=None):
+    """
+    This function initializes a CLI session from the given account without prompting the user. The account
+    is looked up on the configuration file (by name or address) when a configuration file password is
+    given. An address which is not stored on the configuration file is used without seed.
+    :param str account: Name or address of the account.
+    :param str password: Password to decrypt the configuration file. It can be None.
+    :return: Returns the initialized CLI session or None if something went wrong.
+    :rtype: CliSession or None
+    """
+    if password is not None and _config_file_exists():
+        keystore = _config_file_open(password)
+        if keystore is None:
+            return None
+        if is_address_valid(account):
+            stored_account = keystore.get_account_by_address(account)
+        else:
+            stored_account = keystore.get_account_by_name(account)
+        if stored_account is not None:
+            return CliSession(stored_account[JSON_ACCOUNT_NAME_TAG],
+                              stored_account[JSON_ACCOUNT_ADDRESS_TAG],
+                              stored_account.get(JSON_ACCOUNT_SEED_TAG, None))
+
+    if is_address_valid(account):
+        return CliSession(None, account, None)
+
+    print("The account {} was not found on the configuration file".format(account))
+    return None
+
+
 def _init_session_from_conf_file():
     """
     Initializes a session from an account stored on the configuration file. This function assumes that the
     configuration file already exists. This method can fail in the following situations:
-    1: The configuration file is empty.
-    2: The configuration file could not be decrypted (for example if a wrong decryption password was given).
-    3: The configuration file is not a valid JSON file.
-    4: The configuration file does not have the 'accounts' JSON key, or there are no accounts stored on it.
-    5: The index of the configuration file account specified by the user is invalid.
+    1: The configuration file could not be opened or decrypted (for example if a wrong decryption password was given).
+    2: There are no accounts stored on the configuration file.
+    3: The account specified by the user (by index, name or address) is not stored on the configuration file.
+    When there are few accounts they are all listed, otherwise only the chosen account is decrypted.
     :return: Returns the initialized CLI session or None if something went wrong.
     :rtype: CliSession or None
     """
-    configs_json, conf_file_password = _config_file_load()
-    if configs_json is None:
-        print("The configuration file is either empty, could not be decrypted or is an invalid JSON file.")
+    keystore = _config_file_open()
+    if keystore is None:
         return None
 
-    if not _config_file_is_valid_content(configs_json):
-        print("The content of the configuration file is invalid")
-        return None
-
-    n_accounts_found = _config_file_get_number_of_accounts(configs_json)
+    n_accounts_found = keystore.count()
     if n_accounts_found <= 0:
         print("No accounts were found on the configuration file.")
         return None
 
-    _config_file_print_accounts(configs_json)
-    account_n = int_input('Which account do you want to use? (specify the index)') - 1
-    if account_n < 0 or account_n >= n_accounts_found:
-        print("Specified account index is invalid")
+    accounts = None
+    if n_accounts_found <= MAX_LISTED_CONFIG_FILE_ACCOUNTS:
+        accounts = keystore.get_accounts()
+        if accounts is None:
+            return None
+        _config_file_print_accounts(accounts)
+        selection = safe_input('Which account do you want to use? (specify the index, name or address)')
+    else:
+        print('{} Stellar accounts were found on the configuration file.'.format(n_accounts_found))
+        selection = safe_input('Which account do you want to use? (specify the name or address)')
+
+    if accounts is not None and is_int_str(selection):
+        account_n = int(selection) - 1
+        account = accounts[account_n] if 0 <= account_n < n_accounts_found else None
+    elif is_address_valid(selection):
+        account = keystore.get_account_by_address(selection)
+    else:
+        account = keystore.get_account_by_name(selection)
+    if account is None:
+        print("Specified account is invalid")
         return None
 
-    name = configs_json[JSON_ACCOUNTS_TAG][account_n][JSON_ACCOUNT_NAME_TAG]
-    address = configs_json[JSON_ACCOUNTS_TAG][account_n][JSON_ACCOUNT_ADDRESS_TAG]
-    seed = configs_json[JSON_ACCOUNTS_TAG][account_n].get(JSON_ACCOUNT_SEED_TAG, None)
-    return CliSession(name, address, seed)
+    return CliSession(account[JSON_ACCOUNT_NAME_TAG],
+                      account[JSON_ACCOUNT_ADDRESS_TAG],
+                      account.get(JSON_ACCOUNT_SEED_TAG, None))
 
 
 def _init_session_from_existent_account():
@@ -167,6 +242,8 @@ def _init_session_from_new_account():
     :return: Returns the initialized CLI session.
     :rtype: CliSession
     """
+    from stellar_base.keypair import Keypair
+
     account_name = None
     if yes_or_no_input("Do you want to give a name to the new account to be created?") == USER_INPUT_YES:
         account_name = safe_input("Please insert the account name")
@@ -190,12 +267,11 @@ def _init_session_from_new_account():
     return cli_session
 
 
-def _config_file_print_accounts(configs_json):
+def _config_file_print_accounts(accounts):
     """
     Prints the accounts found on the configuration file.
-    :param json configs_json: Configuration file JSON decoded data.
+    :param list accounts: Accounts stored on the configuration file.
     """
-    accounts = _config_file_get_accounts(configs_json)
     print('The following {} Stellar accounts were found on the configuration file:'.format(len(accounts)))
     for i, account in enumerate(accounts):
         print('[{}] Account Name: {}, Account Address: {}'.format(
@@ -203,84 +279,105 @@ def _config_file_print_accounts(configs_json):
     print('')
 
 
+def _config_file_channel_seeds(keystore, account_address):
+    """
+    Loads the seeds of the channel accounts of the given account, which are stored under consecutively
+    numbered names. Only the records of the channel accounts are decrypted.
+    :param Keystore keystore: Opened configuration file.
+    :param str account_address: Address of the account owning the channel accounts.
+    :return: Returns the list of channel account seeds.
+    :rtype: list
+    """
+    seeds = []
+    while True:
+        account = keystore.get_account_by_name(CHANNEL_ACCOUNT_NAME_FORMAT.format(account_address, len(seeds) + 1))
+        if account is None or account.get(JSON_ACCOUNT_SEED_TAG) is None:
+            return seeds
+        seeds.append(account[JSON_ACCOUNT_SEED_TAG])
+
+
 def _config_file_exists():
     """
-    Checks if the configuration file exists.
+    Checks if the configuration file exists, either in the keystore format or in the legacy format.
     :return: Returns True if the configuration file exists and False otherwise.
     :rtype: bool
     """
-    if os.path.isfile(DEFAULT_CONFIG_FILE):
+    if os.path.isfile(DEFAULT_KEYSTORE_FILE) or os.path.isfile(DEFAULT_CONFIG_FILE):
         return True
     return False
 
 
-def _config_file_load(password=None):
+def _config_file_open(password=None):
     """
-    Requests a password to decrypt the configuration file, decrypts it and returns the decoded JSON content
-    together with the decryption password. If the file cannot be opened or decrypted or if its content cannot
-    be decoded as JSON this method returns None.
-    :param str password: Password to decrypt the file. If no password is given one is requested from the user.
-    :return: In case of success it returns.
-    :rtype: (json, str) or (None, None)
+    Opens the configuration file. A configuration file in the legacy format (a single encrypted JSON
+    document) is migrated to the keystore format.
+    :param str password: Password to decrypt the file. If no password is given the one set on the
+    PYGEEK_STELLAR_PASSWORD environment variable is used (e.g. by scripts, which cannot prompt for it) or,
+    if it is not set, one is requested from the user.
+    :return: Returns the opened keystore or None if it could not be opened.
+    :rtype: Keystore or None
     """
+    if password is None:
+        password = os.environ.get(CONFIG_FILE_PASSWORD_ENV_VAR)
     if password is None:
         password = password_input("Please insert the configuration file decryption password")
-    configs_content = decode_json_content(load_encrypted_file(DEFAULT_CONFIG_FILE, password))
-    return (None, None) if configs_content is None else (configs_content, password)
 
-
-def _config_file_write(config_json, password):
-    """
-    Encrypts the specified content with the given password and writes it to the configuration file.
-    :param json config_json: Content to be stored on the configuration file.
-    :param password: Encryption password,
-    """
-    file = DEFAULT_CONFIG_FILE
-    succeeded = write_encrypted_file(file, config_json, password)
-    if succeeded:
-        print("Configuration file successfully stored in: {}".format(file))
+    keystore = Keystore(DEFAULT_KEYSTORE_FILE)
+    if not keystore.exists() and os.path.isfile(DEFAULT_CONFIG_FILE):
+        return _config_file_migrate(keystore, password)
+    return keystore if keystore.open(password) else None
 
 
-def _config_file_is_to_update():
+def _config_file_create():
     """
-    Ask the user if the configuration file should be updated or not.
-    :return: Returns True if the user wants to update the configuration file and False otherwise.
-    :rtype: bool
+    Creates an empty configuration file, protected by a password requested from the user.
+    :return: Returns the created keystore or None if it could not be created.
+    :rtype: Keystore or None
     """
-    if yes_or_no_input("Do you want to save the account on the configuration file?") == USER_INPUT_YES:
-        return True
-    return False
+    password = password_input("Please insert an encryption/decryption password "
+                              "to protect the configuration file")
+    if password != password_input("Please insert the encryption/decryption password again"):
+        print("The inserted passwords are distinct. The configuration file could not be created")
+        return None
+    if len(password) == 0:
+        print('A valid password must be given to encrypt the file')
+        return None
+
+    keystore = Keystore(DEFAULT_KEYSTORE_FILE)
+    return keystore if keystore.create(password) else None
 
 
-def _config_file_is_valid_content(configs_json):
+def _config_file_migrate(keystore, password):
     """
-    Checks if the content of the configuration file is valid. For this to be true an 'accounts' JSON key
-    must be found.
-    :param json configs_json: Configuration file JSON decoded data.
-    :return: Returns True if the content is valid and False otherwise.
-    :rtype: bool
+    Migrates the legacy configuration file to the given (not yet existent) keystore, protecting it with the
+    same password. The legacy configuration file is then renamed so that it is not migrated again.
+    :param Keystore keystore: Keystore to which the accounts are migrated.
+    :param str password: Password of the legacy configuration file.
+    :return: Returns the keystore or None if the migration failed.
+    :rtype: Keystore or None
     """
-    if JSON_ACCOUNTS_TAG in configs_json:
-        return True
-    return False
+    configs_json = decode_json_content(load_encrypted_file(DEFAULT_CONFIG_FILE, password))
+    if configs_json is None or JSON_ACCOUNTS_TAG not in configs_json:
+        print("The configuration file is either empty, could not be decrypted or is an invalid JSON file.")
+        return None
 
+    accounts = [(account.get(JSON_ACCOUNT_NAME_TAG), account[JSON_ACCOUNT_ADDRESS_TAG],
+                 account.get(JSON_ACCOUNT_SEED_TAG)) for account in configs_json[JSON_ACCOUNTS_TAG]]
+    if not keystore.create(password) or not keystore.add_accounts(accounts):
+        return None
 
-def _config_file_get_number_of_accounts(configs_json):
-    """
-    Returns the number of accounts stored on the configuration file.
-    :param json configs_json: Configuration file JSON decoded data.
-    :return: Returns the number of accounts stored on the configuration file.
-    :rtype: int
-    """
-    return len(configs_json[JSON_ACCOUNTS_TAG])
+    os.replace(DEFAULT_CONFIG_FILE, DEFAULT_CONFIG_FILE + LEGACY_CONFIG_FILE_BACKUP_SUFFIX)
+    print("The configuration file was migrated to {}. The previous configuration file was kept in {}".format(
+        keystore.filename, DEFAULT_CONFIG_FILE + LEGACY_CONFIG_FILE_BACKUP_SUFFIX))
+    return keystore
 
 
-def _config_file_get_accounts(configs_json):
+def _config_file_is_to_update():
     """
-    Returns the accounts stored on the configuration file. It assumes that the given configuration JSON
-    content is valid (which means that it must have an 'accounts' JSON key).
-    :param json configs_json: Configuration file JSON decoded data.
-    :return: Returns the accounts stored on the configuration file.
-    :rtype: json
+    Ask the user if the configuration file should be updated or not.
+    :return: Returns True if the user wants to update the configuration file and False otherwise.
+    :rtype: bool
     """
-    return configs_json[JSON_ACCOUNTS_TAG]
+    if yes_or_no_input("Do you want to save the account on the configuration file?") == USER_INPUT_YES:
+        return True
+    return False
@@ -1,17 +1,59 @@
 # System imports
-from pathlib import Path
+import os
 
 CLI_BANNER_TEXT = 'PYGEEK-STELLAR'
 
 # Config file related constants
-DEFAULT_CONFIG_FILE = '{}/.pygeek-stellar.config'.format(str(Path.home()))
+DEFAULT_KEYSTORE_FILE = '{}/.pygeek-stellar.keystore'.format(os.path.expanduser('~'))
+DEFAULT_HISTORY_STORE_FILE = '{}/.pygeek-stellar.history.sqlite'.format(os.path.expanduser('~'))
+DEFAULT_CONFIG_FILE = '{}/.pygeek-stellar.config'.format(os.path.expanduser('~'))  # Legacy single blob configuration file
+LEGACY_CONFIG_FILE_BACKUP_SUFFIX = '.bak'
+MAX_LISTED_CONFIG_FILE_ACCOUNTS = 50
 JSON_ACCOUNTS_TAG = 'accounts'
 JSON_ACCOUNT_NAME_TAG = 'account_name'
 JSON_ACCOUNT_ADDRESS_TAG = 'address'
 JSON_ACCOUNT_SEED_TAG = 'secret_seed'
 CONFIG_FILE_EMPTY_JSON = {JSON_ACCOUNTS_TAG: []}
+CONFIG_FILE_PASSWORD_ENV_VAR = 'PYGEEK_STELLAR_PASSWORD'
+CHANNEL_ACCOUNT_NAME_FORMAT = 'channel-{}-{}'  # Channel accounts are stored as channel-{main address}-{index}
+
+# Batch payments CSV file related constants
+CSV_BATCH_PAYMENT_DESTINATION_TAG = 'destination'
+CSV_BATCH_PAYMENT_ASSET_TAG = 'asset'
+CSV_BATCH_PAYMENT_AMOUNT_TAG = 'amount'
+CSV_BATCH_PAYMENT_MEMO_TAG = 'memo'
+CSV_BATCH_PAYMENT_ASSET_SEPARATOR = ':'
+BATCH_PAYMENTS_MAX_REPORTED_ERRORS = 20
+
+# Signed transaction envelopes NDJSON file related constants
+SIGNED_ENVELOPE_LINES_TAG = 'lines'
+SIGNED_ENVELOPE_SOURCE_TAG = 'source'
+SIGNED_ENVELOPE_SEQUENCE_TAG = 'sequence'
+SIGNED_ENVELOPE_HASH_TAG = 'hash'
+SIGNED_ENVELOPE_XDR_TAG = 'envelope_xdr'
+
+# Transaction envelopes submission results NDJSON file related constants
+SUBMIT_RESULT_STATUS_TAG = 'status'
+SUBMIT_RESULT_CODE_TAG = 'result_code'
+SUBMIT_RESULT_OPERATION_CODES_TAG = 'operation_result_codes'
+SUBMIT_RESULT_ATTEMPTS_TAG = 'attempts'
+SUBMIT_RESULT_LEDGER_TAG = 'ledger'
+SUBMIT_RESULT_FEE_CHARGED_TAG = 'fee_charged'
+SUBMIT_RESULT_ERROR_TAG = 'error'
+
+# Script related constants
+SCRIPT_STDIN = '-'
+SCRIPT_COMMENT_PREFIX = '#'
+DEFAULT_SCRIPT_CONCURRENCY = 8
 
 # Stellar related constants
 STELLAR_HORIZON_TESTNET_URL = 'https://horizon-testnet.stellar.org'
+STELLAR_HORIZON_URL_ENV_VAR = 'PYGEEK_STELLAR_HORIZON_URL'
+HORIZON_TIMEOUT_SECONDS = (5, 20)  # (connect, read)
+HORIZON_CONNECTION_POOL_SIZE = 32
+HORIZON_TRANSIENT_HTTP_STATUS_CODES = [429, 500, 502, 503, 504]  # Errors worth retrying the request on
+HORIZON_RATE_LIMITED_MAX_ATTEMPTS = 5  # Times a request rejected with HTTP 429 is sent before the 429 is returned
+STELLAR_NETWORK = 'TESTNET'  # Network (TESTNET or PUBLIC) whose passphrase is used to sign the transactions
+STELLAR_BASE_FEE = 100  # Fee, in stroops, of each transaction operation
 STELLAR_ASSET_TYPE_XLM = 'native'
 STELLAR_DONATION_ADDRESS = 'GBLHVU7EJMSUW72PINTRBRIHT55ZQ7HXFAXELG2JG53X4VAZSHZKLEY6'
@@ -0,0 +1,274 @@
+# System imports
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+# Local imports
+from .constants import *
+from .stellar_requests import *
+from .utils.file import *
+from .utils.horizon import *
+
+DEFAULT_SUBMIT_ENVELOPES_CONCURRENCY = 16
+SUBMIT_ENVELOPE_MAX_ATTEMPTS = 6
+SUBMIT_ENVELOPE_BACKOFF_BASE_SECONDS = 0.5
+SUBMIT_ENVELOPE_BACKOFF_MAX_SECONDS = 30
+
+SUBMIT_RESULT_SUCCESS = 'success'  # Applied to the ledger, with all its operations succeeding
+SUBMIT_RESULT_FAILED = 'failed'  # Applied to the ledger (consuming the sequence number and fee) but failed
+SUBMIT_RESULT_REJECTED = 'rejected'  # Not applied to the ledger (e.g. tx_bad_seq)
+SUBMIT_RESULT_ERROR = 'error'  # Could not be submitted (e.g. Horizon kept timing out)
+SUBMIT_RESULT_SKIPPED = 'skipped'  # Not submitted since a previous transaction of its source was not applied
+FINAL_SUBMIT_RESULTS = [SUBMIT_RESULT_SUCCESS, SUBMIT_RESULT_FAILED]
+ENVELOPES_ALREADY_SUBMITTED = 'already submitted'  # Applied to the ledger according to the results file
+
+
+def submit_envelopes(envelopes_file, results_file, concurrency=DEFAULT_SUBMIT_ENVELOPES_CONCURRENCY):
+    """
+    Submits the signed transaction envelopes of a NDJSON file (as written by sign_batch_payments_offline())
+    to the Stellar network. The transactions of different source accounts are submitted concurrently, while
+    the transactions of each source account are submitted one at a time, by sequence number order. Transient
+    Horizon errors (timeouts, 5xx and 429 responses) are retried with a jittered exponential backoff.
+    The result of each transaction is appended to the results NDJSON file, which also works as checkpoint:
+    the transactions already applied to the ledger according to it are not submitted again, so an
+    interrupted submission can be resumed by running it again with the same files.
+    :param str envelopes_file: NDJSON file with the signed transaction envelopes.
+    :param str results_file: NDJSON file to which the results are appended.
+    :param int concurrency: Maximum number of transactions being submitted at the same time.
+    :return: Returns the number of transactions per result (e.g. 'success') or None if nothing was submitted.
+    :rtype: dict or None
+    """
+    envelopes = read_envelopes_file(envelopes_file)
+    if envelopes is None:
+        return None
+
+    submitted_hashes = _load_final_results_hashes(results_file)
+    sources = OrderedDict()  # source address -> envelopes to be submitted, by sequence number order
+    for envelope in envelopes:
+        if envelope[SIGNED_ENVELOPE_HASH_TAG] not in submitted_hashes:
+            sources.setdefault(envelope[SIGNED_ENVELOPE_SOURCE_TAG], []).append(envelope)
+    for source_envelopes in sources.values():
+        source_envelopes.sort(key=lambda e: e[SIGNED_ENVELOPE_SEQUENCE_TAG])
+
+    counts = {SUBMIT_RESULT_SUCCESS: 0, ENVELOPES_ALREADY_SUBMITTED: len(envelopes) - sum(map(len, sources.values()))}
+    if not sources:
+        return counts
+
+    lock = threading.Lock()
+    try:
+        with open(results_file, 'a') as results:
+            def write_result(result):
+                with lock:
+                    results.write(json.dumps(result) + '\n')
+                    results.flush()
+                    counts[result[SUBMIT_RESULT_STATUS_TAG]] = counts.get(result[SUBMIT_RESULT_STATUS_TAG], 0) + 1
+
+            submit_source_envelopes = with_current_command(_submit_source_envelopes)
+            with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(sources)))) as executor:
+                for future in [executor.submit(submit_source_envelopes, source_envelopes, write_result)
+                               for source_envelopes in sources.values()]:
+                    future.result()
+            os.fsync(results.fileno())
+    except (OSError, IOError):
+        print("There was a problem opening/writing the file: {}".format(results_file))
+        return None
+
+    forget_account_state(*sources.keys())
+    return counts
+
+
+def read_envelopes_file(envelopes_file):
+    """
+    Reads and validates the signed transaction envelopes of a NDJSON file. The source account, sequence
+    number and hash of the records which do not have them are taken from the envelope itself.
+    :param str envelopes_file: NDJSON file with the signed transaction envelopes.
+    :return: Returns the envelope records or None if the file could not be read or has invalid records.
+    :rtype: list of dict or None
+    """
+    from stellar_base.transaction_envelope import TransactionEnvelope
+
+    if not os.path.isfile(envelopes_file):
+        print('The given envelopes file does not exist')
+        return None
+
+    envelopes = []
+    n_invalid = 0
+    for line_number, record in read_ndjson_file(envelopes_file):
+        try:
+            if not isinstance(record, dict) or not isinstance(record.get(SIGNED_ENVELOPE_XDR_TAG), str):
+                raise ValueError('The line has no {} field'.format(SIGNED_ENVELOPE_XDR_TAG))
+            if any(tag not in record for tag in [SIGNED_ENVELOPE_SOURCE_TAG, SIGNED_ENVELOPE_SEQUENCE_TAG,
+                                                 SIGNED_ENVELOPE_HASH_TAG]):
+                envelope = TransactionEnvelope.from_xdr(record[SIGNED_ENVELOPE_XDR_TAG])
+                record.setdefault(SIGNED_ENVELOPE_SOURCE_TAG, envelope.tx.source.decode())
+                record.setdefault(SIGNED_ENVELOPE_SEQUENCE_TAG, envelope.tx.sequence)
+                record.setdefault(SIGNED_ENVELOPE_HASH_TAG, envelope.hash_meta().hex())
+            record[SIGNED_ENVELOPE_SEQUENCE_TAG] = int(record[SIGNED_ENVELOPE_SEQUENCE_TAG])
+        except Exception as e:
+            # Too broad exception because stellar_base raises several kinds of exceptions for invalid envelopes
+            n_invalid += 1
+            if n_invalid <= BATCH_PAYMENTS_MAX_REPORTED_ERRORS:
+                print('Line {}: Invalid transaction envelope ({})'.format(line_number, e))
+            continue
+        envelopes.append(record)
+
+    if n_invalid:
+        print('{} invalid lines were found on the envelopes file. No transaction was submitted'.format(n_invalid))
+        return None
+    return envelopes
+
+
+def submit_envelope(envelope_xdr, transaction_hash=None):
+    """
+    Submits a signed transaction envelope to Horizon, retrying the transient errors (connection errors,
+    timeouts, 5xx and 429 responses) with a jittered exponential backoff. Resubmitting an envelope is
+    safe since the network applies each transaction (sequence number) only once. However, a transaction
+    applied by an attempt whose response was lost (e.g. a 504 or a timeout), on this or a previous run, is
+    rejected with tx_bad_seq when resubmitted. So, if its hash is given, the transaction is looked up on
+    Horizon when it is rejected with tx_bad_seq or no response is received, and its actual result is returned.
+    :param str envelope_xdr: Base64 encoded transaction envelope.
+    :param str transaction_hash: Hex encoded hash of the transaction. It can be None.
+    :return: Returns the Horizon response (None if none could be decoded), the last error message (None
+    if a response was received) and the number of attempts.
+    :rtype: (dict or None, str or None, int)
+    """
+    import requests
+
+    url = '{}/transactions'.format(get_horizon_url())
+    error = None
+    for attempt in range(1, SUBMIT_ENVELOPE_MAX_ATTEMPTS + 1):
+        try:
+            with timed_span('transaction_submit'):
+                response = get_horizon_session().post(url, data={'tx': envelope_xdr})
+            if response.status_code not in HORIZON_TRANSIENT_HTTP_STATUS_CODES:
+                response = response.json()
+                if not isinstance(response, dict):
+                    raise ValueError('The response is not a JSON object')
+                if transaction_hash is not None and \
+                        get_transaction_result_code(response) == STELLAR_TX_BAD_SEQ_RESULT_CODE:
+                    response = get_applied_transaction_response(transaction_hash) or response
+                return response, None, attempt
+            error = 'Horizon responded with HTTP status code {}'.format(response.status_code)
+        except requests.exceptions.RequestException as e:
+            error = 'Horizon could not be reached: {}'.format(e)
+        except ValueError:
+            return None, 'Horizon responded with an invalid JSON document', attempt
+
+        if attempt < SUBMIT_ENVELOPE_MAX_ATTEMPTS:
+            # "Full jitter" backoff, so the retries of concurrent submissions do not hit Horizon all at once
+            backoff = min(SUBMIT_ENVELOPE_BACKOFF_MAX_SECONDS, SUBMIT_ENVELOPE_BACKOFF_BASE_SECONDS * 2 ** attempt)
+            time.sleep(random.uniform(0, backoff))
+
+    response = get_applied_transaction_response(transaction_hash) if transaction_hash is not None else None
+    if response is not None:
+        return response, None, SUBMIT_ENVELOPE_MAX_ATTEMPTS
+    return None, error, SUBMIT_ENVELOPE_MAX_ATTEMPTS
+
+
+def get_applied_transaction_response(transaction_hash):
+    """
+    Looks up on Horizon a transaction applied to the ledger and describes its result as a transaction
+    submission response would: the transaction record itself if it succeeded, or a tx_failed response
+    (with the operation result codes) otherwise.
+    :param str transaction_hash: Hex encoded hash of the transaction.
+    :return: Returns the response or None if the transaction was not applied (or could not be looked up).
+    :rtype: dict or None
+    """
+    import requests
+
+    try:
+        response = get_horizon_session().get('{}/transactions/{}'.format(get_horizon_url(), transaction_hash))
+        if response.status_code != 200:
+            return None
+        record = response.json()
+    except (requests.exceptions.RequestException, ValueError):
+        return None
+    if not isinstance(record, dict):
+        return None
+
+    if record.get('successful', True):
+        return record
+    result_xdr = record.get('result_xdr')
+    tx_result = decode_transaction_result(result_xdr) if result_xdr else None
+    result_codes = {'transaction': STELLAR_TX_FAILED_RESULT_CODE}
+    if tx_result is not None:
+        result_codes['operations'] = [operation.code for operation in tx_result.operations]
+    return {'extras': {'result_codes': result_codes, 'result_xdr': result_xdr}}
+
+
+def _submit_source_envelopes(envelopes, write_result):
+    """
+    Submits, one at a time, the envelopes of a single source account. Once a transaction is not applied to
+    the ledger, the following ones are skipped since their sequence numbers can no longer be valid.
+    :param list envelopes: Envelope records of the source account, by sequence number order.
+    :param write_result: Function receiving the result record of each envelope.
+    """
+    for i, envelope in enumerate(envelopes):
+        response, error, attempts = submit_envelope(envelope[SIGNED_ENVELOPE_XDR_TAG],
+                                                    envelope[SIGNED_ENVELOPE_HASH_TAG])
+        result = _create_submit_result(envelope, response, error, attempts)
+        write_result(result)
+        if result[SUBMIT_RESULT_STATUS_TAG] not in FINAL_SUBMIT_RESULTS:
+            for skipped_envelope in envelopes[i + 1:]:
+                write_result(_create_submit_result(skipped_envelope, None, 'Transaction with sequence number {} '
+                                                   'was not applied'.format(envelope[SIGNED_ENVELOPE_SEQUENCE_TAG]),
+                                                   0, SUBMIT_RESULT_SKIPPED))
+            return
+
+
+def _create_submit_result(envelope, response, error, attempts, status=None):
+    """
+    Creates the result record of a submitted envelope.
+    :param dict envelope: Envelope record.
+    :param dict response: Horizon response. It can be None.
+    :param str error: Error preventing the submission. It can be None.
+    :param int attempts: Number of submission attempts.
+    :param str status: Result status. If None it is derived from the Horizon response.
+    :return: Returns the result record.
+    :rtype: dict
+    """
+    result_code = get_transaction_result_code(response)
+    if status is None:
+        if result_code == STELLAR_TX_SUCCESS_RESULT_CODE:
+            status = SUBMIT_RESULT_SUCCESS
+        elif result_code == STELLAR_TX_FAILED_RESULT_CODE:
+            status = SUBMIT_RESULT_FAILED
+        else:
+            status = SUBMIT_RESULT_REJECTED if response is not None else SUBMIT_RESULT_ERROR
+
+    result = OrderedDict([
+        (SIGNED_ENVELOPE_HASH_TAG, envelope[SIGNED_ENVELOPE_HASH_TAG]),
+        (SIGNED_ENVELOPE_SOURCE_TAG, envelope[SIGNED_ENVELOPE_SOURCE_TAG]),
+        (SIGNED_ENVELOPE_SEQUENCE_TAG, envelope[SIGNED_ENVELOPE_SEQUENCE_TAG]),
+        (SUBMIT_RESULT_STATUS_TAG, status),
+        (SUBMIT_RESULT_CODE_TAG, result_code),
+        (SUBMIT_RESULT_ATTEMPTS_TAG, attempts)])
+    if SIGNED_ENVELOPE_LINES_TAG in envelope:
+        result[SIGNED_ENVELOPE_LINES_TAG] = envelope[SIGNED_ENVELOPE_LINES_TAG]
+    if response is not None:
+        result[SUBMIT_RESULT_LEDGER_TAG] = response.get('ledger')
+        result_codes = response.get('extras', {}).get('result_codes', {})
+        if result_codes.get('operations'):
+            result[SUBMIT_RESULT_OPERATION_CODES_TAG] = result_codes['operations']
+        tx_result = get_submit_response_transaction_result(response)
+        if tx_result is not None:
+            result[SUBMIT_RESULT_FEE_CHARGED_TAG] = tx_result.fee_charged
+    if error is not None:
+        result[SUBMIT_RESULT_ERROR_TAG] = error
+    return result
+
+
+def _load_final_results_hashes(results_file):
+    """
+    Loads the hashes of the transactions which, according to a results file, were applied to the ledger.
+    :param str results_file: NDJSON results file. It may not exist.
+    :return: Returns the set of hashes.
+    :rtype: set
+    """
+    if not os.path.isfile(results_file):
+        return set()
+    return {result.get(SIGNED_ENVELOPE_HASH_TAG) for _, result in read_ndjson_file(results_file)
+            if isinstance(result, dict) and result.get(SUBMIT_RESULT_STATUS_TAG) in FINAL_SUBMIT_RESULTS} - {None}
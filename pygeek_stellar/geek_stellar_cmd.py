@@ -2,8 +2,12 @@
 from cmd import Cmd
 import os
 import shlex
+import time
 # Local imports
 from .stellar_requests import *
+from .envelope_submission import *
+from .history_store import *
+from .path_finder import *
 from .stellar_queries import *
 from .utils.generic import *
 from .cli_session import *
@@ -11,10 +15,20 @@ from .cli_session import *
 
 class GeekStellarCmd(Cmd):
 
-    def __init__(self, session):
+    # Commands which only query the network, which can be run concurrently on scripts
+    READ_ONLY_COMMANDS = ['current_account', 'get_account_balances', 'get_balances_many', 'find_payment_paths',
+                          'stats']
+    # Commands which only query the network or the local stores when given any of the listed flags (otherwise
+    # they sync the local history store first, so they must not run concurrently with each other)
+    READ_ONLY_WITH_FLAGS_COMMANDS = {'get_account_payments': ['--no-sync', '--remote'],
+                                     'get_account_transactions': ['--no-sync', '--remote']}
+
+    def __init__(self, session, metrics_file=None):
         super(GeekStellarCmd, self).__init__()
         self.session = session
         self.prompt = '> '
+        self.order_books = OrderBookGraph()  # Kept along the session, so only the stale order books are refetched
+        self.metrics_file = metrics_file  # Prometheus text file rewritten after each command, if not None
 
     def cmdloop(self, intro=None):
         """
@@ -27,6 +41,21 @@ class GeekStellarCmd(Cmd):
             except KeyboardInterrupt:
                 self.do_quit(None)
 
+    def onecmd(self, line):
+        """
+        Extend the base class onecmd method to measure the latency of the commands (and of their phases,
+        see timed_span()) and to export it to the metrics file, if any
+        """
+        command = self.parseline(line)[0]
+        if not command or not hasattr(self, 'do_' + command):
+            return super(GeekStellarCmd, self).onecmd(line)
+        try:
+            with command_span(command):
+                return super(GeekStellarCmd, self).onecmd(line)
+        finally:
+            if self.metrics_file is not None:
+                write_file(self.metrics_file, to_prometheus_text())
+
     def do_current_account(self, args):
         """
         Prints information regarding the current Stellar account being used
@@ -37,52 +66,119 @@ class GeekStellarCmd(Cmd):
         """
         Requests the current XLM (Stellar Lumens) balance from the Stellar Horizon server.
         If no account address is specified the account address of the current CLI session
-        will be used.
-        Usage: get_account_balances {account_address: optional}
+        will be used. Recently fetched account details are reused unless --fresh is given.
+        Usage: get_account_balances {account_address: optional} {--fresh: optional}
         """
         args = shlex.split(args)
+        fresh = pop_flag(args, '--fresh')
         account_address = args[0] if len(args) >= 1 else self.session.account_address
 
-        balances = get_account_balances(account_address)
+        balances = get_account_balances(account_address, fresh)
         if balances is None:
             print('No balances could be retrieved')
             return
-        for balance in balances:
-            print('  {}: {}'.format(balance[0], balance[1]))
+        for asset, stroops in balances.items():
+            print('  {}: {}'.format(format_asset(asset), stroops_to_amount(stroops)))
 
-    def do_get_account_payments(self, args):
+    def do_get_balances_many(self, args):
         """
-        Queries the Stellar Horizon server regarding payments related info.
-        If no account address is specified the account address of the current CLI session
-        will be used.
-        Usage: get_account_payments {account_address: optional}
+        Requests the balances of all the account addresses listed on a file (one address per line)
+        from the Stellar Horizon server. Several accounts are fetched at the same time, up to the
+        given concurrency. The total of each asset over all the accounts is printed at the end.
+        Usage: get_balances_many {addresses_file} {--concurrency N: optional} {--fresh: optional}
         """
         args = shlex.split(args)
-        account_address = args[0] if len(args) >= 1 else self.session.account_address
+        fresh = pop_flag(args, '--fresh')
+        concurrency = pop_option(args, '--concurrency', str(DEFAULT_BALANCES_CONCURRENCY))
+        if len(args) < 1:
+            print('An addresses file is mandatory')
+            return
+        if not is_int_str(concurrency) or int(concurrency) <= 0:
+            print('The concurrency must be a positive integer value')
+            return
 
-        payments = get_account_payments(account_address)
-        if payments is None:
-            print('No payments could be retrieved')
+        content = load_file(args[0])
+        if content is None:
+            print('The addresses file could not be read')
             return
-        print(payments)
-        # TODO: Process payments json
+        addresses = [line.strip() for line in content.splitlines() if line.strip()]
+
+        start = time.monotonic()
+        results = get_balances_many(addresses, int(concurrency), fresh)
+        elapsed = time.monotonic() - start
+
+        n_failed = 0
+        for address, balances, error in results:
+            if balances is None:
+                n_failed += 1
+                print('{}: {}'.format(address, error))
+            else:
+                print('{}: {}'.format(address, ', '.join('{} {}'.format(stroops_to_amount(stroops), format_asset(asset))
+                                                         for asset, stroops in balances.items())))
+        print('{} accounts fetched in {:.2f} seconds ({} failed)'.format(len(results), elapsed, n_failed))
+
+        aggregation = aggregate_balances((address, balances) for address, balances, _ in results
+                                         if balances is not None)
+        for asset, total, holders in zip(aggregation.assets, aggregation.totals, aggregation.holders):
+            print('  {}: {} ({} accounts)'.format(format_asset(asset), stroops_to_amount(total), holders))
+
+    def do_get_account_payments(self, args):
+        """
+        Queries the payments of an account. The payments history is kept on a local store, which is first
+        synced with the Stellar Horizon server by fetching only the payments created since the last sync
+        (unless --no-sync is given), so the queries do not page through the whole history again. With
+        --remote the payments are fetched page by page from the Stellar Horizon server instead. Each payment
+        is written as a JSON line (NDJSON) to the screen or to the given output file. If no account address
+        is specified the account address of the current CLI session will be used.
+        Usage: get_account_payments {account_address: optional} {--limit N: optional}
+        {--order asc|desc: optional} {--since YYYY-MM-DD: optional} {--until YYYY-MM-DD: optional}
+        {--asset XLM|CODE|CODE:ISSUER: optional} {--counterparty address: optional} {--output file: optional}
+        {--no-sync: optional} {--remote: optional} {--fresh: optional}
+        """
+        self._stream_account_records(args, HISTORY_PAYMENTS)
 
     def do_get_account_transactions(self, args):
         """
-        Queries the Stellar Horizon server regarding transactions related info.
-        If no account address is specified the account address of the current CLI session
-        will be used.
-        Usage: get_account_transactions {account_address: optional}
+        Queries the transactions of an account. The transactions history is kept on a local store, which
+        is first synced with the Stellar Horizon server by fetching only the transactions created since the
+        last sync (unless --no-sync is given). With --remote the transactions are fetched page by page from
+        the Stellar Horizon server instead. Each transaction is written as a JSON line (NDJSON) to the screen
+        or to the given output file. If no account address is specified the account address of the current
+        CLI session will be used.
+        Usage: get_account_transactions {account_address: optional} {--limit N: optional}
+        {--order asc|desc: optional} {--since YYYY-MM-DD: optional} {--until YYYY-MM-DD: optional}
+        {--output file: optional} {--no-sync: optional} {--remote: optional} {--fresh: optional}
+        """
+        self._stream_account_records(args, HISTORY_TRANSACTIONS)
+
+    def do_watch_payments(self, args):
+        """
+        Watches the payments of an account as they happen, through the Stellar Horizon server stream. Each
+        payment is printed as a JSON line as soon as it is received, until ctrl+c is pressed or the given
+        number of payments is received. If no account address is specified the account address of the
+        current CLI session will be used.
+        Usage: watch_payments {account_address: optional} {--cursor paging_token: optional} {--limit N: optional}
         """
+        from stellar_base.exceptions import HorizonError
+
         args = shlex.split(args)
+        cursor = pop_option(args, '--cursor', HORIZON_STREAM_CURSOR_NOW)
+        limit = pop_option(args, '--limit')
         account_address = args[0] if len(args) >= 1 else self.session.account_address
 
-        transactions = get_account_transactions(account_address)
-        if transactions is None:
-            print('No transactions could be retrieved')
+        if limit is not None and (not is_int_str(limit) or int(limit) <= 0):
+            print('The limit must be a positive integer value')
             return
-        print(transactions)
-        # TODO: Process transactions json
+
+        print('Watching the payments of {} (press ctrl+c to stop)'.format(account_address))
+        payments = watch_account_payments(account_address, cursor, int(limit) if limit is not None else None)
+        try:
+            for payment in payments:
+                print(json.dumps(payment), flush=True)
+        except HorizonError as e:
+            print('The payments could not be watched: {}'.format(e))
+        except KeyboardInterrupt:
+            payments.close()
 
     def do_request_funds(self, args):
         """
@@ -146,6 +242,66 @@ class GeekStellarCmd(Cmd):
         
         create_new_account(self.session.account_address, seed, address, amount, memo)
         
+    def do_generate_accounts(self, args):
+        """
+        Generates new Stellar accounts, stores them on the configuration file and creates them on the
+        network by transferring the given XLM amount to each one of them, using up to 100 account
+        creations per transaction. With --channels the transactions are submitted in parallel through
+        the channel accounts of the current account (see create_channels).
+        Usage: generate_accounts {number_of_accounts} {starting_balance} {--name-prefix prefix: optional}
+        {--processes N: optional} {--channels: optional}
+        """
+        args = shlex.split(args)
+        use_channels = pop_flag(args, '--channels')
+        name_prefix = pop_option(args, '--name-prefix')
+        processes = pop_option(args, '--processes')
+        if len(args) < 2:
+            print('A number of accounts and a starting balance are mandatory')
+            return
+
+        n_accounts = args[0]
+        starting_balance = args[1].replace(',', '.')
+
+        if not is_int_str(n_accounts) or int(n_accounts) <= 0:
+            print('The number of accounts must be a positive integer value')
+            return
+        if not is_stellar_amount_valid(starting_balance):
+            print('The starting balance must be a valid value')
+            return
+        if processes is not None and (not is_int_str(processes) or int(processes) <= 0):
+            print('The number of processes must be a positive integer value')
+            return
+
+        seed = self.session.fetch_valid_seed()
+        if seed is None:
+            print("The accounts cannot be created without a valid account seed")
+            return
+
+        channel_seeds = self._load_channel_seeds() if use_channels else None
+        if use_channels and channel_seeds is None:
+            return
+
+        start = time.monotonic()
+        keypairs = generate_keypairs(int(n_accounts), int(processes) if processes is not None else None)
+        elapsed = time.monotonic() - start
+        print('{} keypairs generated in {:.2f} seconds ({:.0f} keypairs/s)'.format(
+            len(keypairs), elapsed, len(keypairs) / max(elapsed, 1e-9)))
+
+        # The accounts are stored before being created so that their seeds are never lost
+        accounts = [('{}-{}'.format(name_prefix, i + 1) if name_prefix else None, address, account_seed)
+                    for i, (address, account_seed) in enumerate(keypairs)]
+        if not store_accounts_in_config_file(accounts):
+            print("The accounts could not be stored on the configuration file")
+            return
+
+        start = time.monotonic()
+        n_created = create_new_accounts(self.session.account_address, seed, [address for address, _ in keypairs],
+                                        starting_balance, channel_seeds)
+        elapsed = time.monotonic() - start
+        if n_created is not None:
+            print('{} of {} accounts created in {:.2f} seconds ({:.1f} accounts/s)'.format(
+                n_created, len(keypairs), elapsed, n_created / max(elapsed, 1e-9)))
+
     def do_send_token_payment(self, args):
         """
         Sends a XLM payment to the given destination address
@@ -199,6 +355,225 @@ class GeekStellarCmd(Cmd):
 
         send_payment(self.session.account_address, seed, destination, 'XLM', amount, None, memo)
 
+    def do_send_batch_payments(self, args):
+        """
+        Sends all the payments listed on a CSV file, packing up to 100 payments on each transaction.
+        The file must have a header line with the 'destination' and 'amount' columns and optionally
+        the 'asset' (XLM or CODE:ISSUER) and 'memo' columns. With --channels the transactions are
+        submitted in parallel through the channel accounts of the current account (see create_channels).
+        Usage: send_batch_payments {payments_csv_file} {--channels: optional}
+        """
+        args = shlex.split(args)
+        use_channels = pop_flag(args, '--channels')
+        if len(args) < 1:
+            print('A payments CSV file is mandatory')
+            return
+
+        payments_file = args[0]
+
+        seed = self.session.fetch_valid_seed()
+        if seed is None:
+            print("The payments cannot be done without a valid account seed")
+            return
+
+        channel_seeds = self._load_channel_seeds() if use_channels else None
+        if use_channels and channel_seeds is None:
+            return
+
+        send_batch_payments(self.session.account_address, seed, payments_file, channel_seeds)
+
+    def do_sign_offline(self, args):
+        """
+        Builds and signs the transactions of a payments CSV file (see send_batch_payments) without any
+        network access, writing the signed transaction envelopes as JSON lines to the output file. The
+        current sequence number of the account must be given, since it cannot be fetched from the network.
+        Usage: sign_offline {payments_csv_file} {sequence_number} {output_file}
+        """
+        args = shlex.split(args)
+        if len(args) < 3:
+            print('A payments CSV file, a sequence number and an output file are mandatory')
+            return
+
+        payments_file = args[0]
+        sequence = args[1]
+        output_file = args[2]
+
+        if not is_int_str(sequence) or int(sequence) < 0:
+            print('The sequence number must be a non negative integer value')
+            return
+
+        seed = self.session.fetch_valid_seed()
+        if seed is None:
+            print("The payments cannot be signed without a valid account seed")
+            return
+
+        start = time.monotonic()
+        n_envelopes = sign_batch_payments_offline(self.session.account_address, seed, payments_file,
+                                                  int(sequence), output_file)
+        elapsed = time.monotonic() - start
+        if n_envelopes is not None:
+            print('{} signed transactions were written to {} in {:.2f} seconds'.format(
+                n_envelopes, output_file, elapsed))
+
+    def do_submit_envelopes(self, args):
+        """
+        Submits the signed transaction envelopes of a file written by sign_offline. The transactions of
+        different source accounts are submitted in parallel, while the ones of each source account are
+        submitted in sequence number order. The result of each transaction is appended as a JSON line to
+        the results file, and the transactions it reports as applied are not submitted again, so an
+        interrupted submission is resumed by running the same command again.
+        Usage: submit_envelopes {envelopes_file} {results_file} {--concurrency N: optional}
+        """
+        args = shlex.split(args)
+        concurrency = pop_option(args, '--concurrency')
+        if len(args) < 2:
+            print('An envelopes file and a results file are mandatory')
+            return
+        if concurrency is not None and (not is_int_str(concurrency) or int(concurrency) <= 0):
+            print('The concurrency must be a positive integer value')
+            return
+
+        start = time.monotonic()
+        counts = submit_envelopes(args[0], args[1], int(concurrency) if concurrency is not None
+                                  else DEFAULT_SUBMIT_ENVELOPES_CONCURRENCY)
+        elapsed = time.monotonic() - start
+        if counts is None:
+            return
+
+        n_submitted = sum(count for status, count in counts.items() if status != ENVELOPES_ALREADY_SUBMITTED)
+        print('{} transactions were processed in {:.2f} seconds ({:.1f} transactions/s)'.format(
+            n_submitted, elapsed, n_submitted / max(elapsed, 1e-9)))
+        for status, count in sorted(counts.items()):
+            print('  {}: {}'.format(status, count))
+
+    def do_find_payment_paths(self, args):
+        """
+        Finds the best paths of a path payment on the order books of the Stellar decentralized exchange,
+        taking their depth into account. By default the given amount is the amount to be received and the
+        paths needing the least amount to be sent are printed. With --send the given amount is the amount
+        to be sent and the paths receiving the most are printed. The paths are searched between the source
+        and destination assets, the assets most traded against them (up to --discover assets, discovered
+        from their offers) and the assets given with --via, whose order books are fetched from the Stellar
+        Horizon server (only the ones not fetched recently). The discovered assets connect the source and
+        destination assets through up to two intermediate assets; longer paths need their other assets to
+        be given with --via. With --order-books the order books are loaded from a file written by
+        save_order_books instead, so no network access is needed and only the paths on that file are found.
+        The assets are given as XLM or CODE:ISSUER.
+        Usage: find_payment_paths {source_asset} {destination_asset} {amount} {--send: optional}
+        {--via ASSET,ASSET: optional} {--discover N: optional} {--order-books file: optional}
+        {--max-path-length N: optional} {--limit N: optional}
+        """
+        args = shlex.split(args)
+        strict_send = pop_flag(args, '--send')
+        via = pop_option(args, '--via', '')
+        discover = pop_option(args, '--discover', str(DEFAULT_DISCOVERED_ASSETS))
+        order_books_file = pop_option(args, '--order-books')
+        max_path_length = pop_option(args, '--max-path-length', str(STELLAR_MAX_PATH_LENGTH))
+        limit = pop_option(args, '--limit', str(DEFAULT_PAYMENT_PATHS_LIMIT))
+        if len(args) < 3:
+            print('A source asset, a destination asset and an amount are mandatory')
+            return
+        assets = [parse_asset(asset) for asset in args[:2] + [a for a in via.split(',') if a.strip()]]
+        if None in assets:
+            print('The assets must be given as XLM or CODE{}ISSUER'.format(CSV_BATCH_PAYMENT_ASSET_SEPARATOR))
+            return
+        amount = args[2].replace(',', '.')
+        if not is_stellar_amount_valid(amount):
+            print('The amount must be a valid value')
+            return
+        if not is_int_str(max_path_length) or not is_in_range(int(max_path_length), 0, STELLAR_MAX_PATH_LENGTH):
+            print('The maximum path length must be between 0 and {}'.format(STELLAR_MAX_PATH_LENGTH))
+            return
+        if not is_int_str(limit) or int(limit) <= 0:
+            print('The limit must be a positive integer value')
+            return
+        if not is_int_str(discover) or int(discover) < 0:
+            print('The number of discovered assets must be a non negative integer value')
+            return
+
+        if order_books_file is not None:
+            if not self.order_books.load(order_books_file):
+                return
+        else:
+            discovered_assets = discover_traded_assets(assets[:2], int(discover)) if int(discover) > 0 else []
+            self.order_books.add_assets(assets + discovered_assets)
+
+        start = time.monotonic()
+        if strict_send:
+            paths = self.order_books.find_strict_send_paths(assets[0], amount_to_stroops(amount), assets[1],
+                                                            int(max_path_length), int(limit))
+        else:
+            paths = self.order_books.find_strict_receive_paths(assets[0], assets[1], amount_to_stroops(amount),
+                                                               int(max_path_length), int(limit))
+        elapsed = time.monotonic() - start
+        if not paths:
+            print('No path was found ({:.2f} ms)'.format(elapsed * 1000))
+            return
+        for path in paths:
+            print('  send {} {}, receive {} {}{}'.format(
+                stroops_to_amount(path.source_amount), format_asset(path.source_asset),
+                stroops_to_amount(path.destination_amount), format_asset(path.destination_asset),
+                ' through ' + ', '.join(format_asset(asset) for asset in path.path) if path.path else ''))
+        print('{} paths found in {:.2f} ms'.format(len(paths), elapsed * 1000))
+
+    def do_save_order_books(self, args):
+        """
+        Fetches from the Stellar Horizon server the order books between every pair of the given assets
+        (only the ones not fetched recently) and saves every order book fetched along the session to a
+        file, from which find_payment_paths can find paths offline. The assets are given as XLM or
+        CODE:ISSUER.
+        Usage: save_order_books {output_file} {asset} {asset} {asset: optional} ...
+        """
+        args = shlex.split(args)
+        if len(args) < 3:
+            print('An output file and at least two assets are mandatory')
+            return
+        assets = [parse_asset(asset) for asset in args[1:]]
+        if None in assets:
+            print('The assets must be given as XLM or CODE{}ISSUER'.format(CSV_BATCH_PAYMENT_ASSET_SEPARATOR))
+            return
+
+        n_fetched = self.order_books.add_assets(assets)
+        if self.order_books.save(args[0]):
+            print('{} order books saved ({} fetched)'.format(len(self.order_books.get_asset_pairs()), n_fetched))
+
+    def do_create_channels(self, args):
+        """
+        Creates channel accounts for the current account, funding each one of them with the given XLM
+        amount. The channel accounts are stored on the configuration file and allow several transactions
+        of the current account to be submitted in parallel (see send_batch_payments).
+        Usage: create_channels {number_of_channels} {starting_balance}
+        """
+        from stellar_base.keypair import Keypair
+
+        args = shlex.split(args)
+        if len(args) < 2:
+            print('A number of channels and a starting balance are mandatory')
+            return
+
+        n_channels = args[0]
+        starting_balance = args[1].replace(',', '.')
+
+        if not is_int_str(n_channels) or not 0 < int(n_channels) <= MAX_CHANNEL_ACCOUNTS:
+            print('The number of channels must be an integer value between 1 and {}'.format(MAX_CHANNEL_ACCOUNTS))
+            return
+
+        seed = self.session.fetch_valid_seed()
+        if seed is None:
+            print("The channel accounts cannot be created without a valid account seed")
+            return
+
+        # The channel accounts are stored before being created so that their seeds are never lost
+        keypairs = [Keypair.random() for _ in range(int(n_channels))]
+        channel_accounts = [(keypair.address().decode(), keypair.seed().decode()) for keypair in keypairs]
+        if not self.session.store_channel_accounts(channel_accounts):
+            print("The channel accounts could not be stored on the configuration file")
+            return
+
+        if create_channel_accounts(self.session.account_address, seed,
+                                   [address for address, _ in channel_accounts], starting_balance):
+            print('{} channel accounts were created'.format(len(channel_accounts)))
+
     def do_establish_trustline(self, args):
         """
         Creates a new Stellar token with the given name and limit
@@ -224,6 +599,129 @@ class GeekStellarCmd(Cmd):
 
         establish_trustline(self.session.account_address, seed, destination, token_name, token_limit)
 
+    def _load_channel_seeds(self):
+        """
+        Loads the seeds of the channel accounts of the current account, up to the maximum number of channels.
+        :return: Returns the list of channel account seeds or None if there are none.
+        :rtype: list or None
+        """
+        channel_seeds = self.session.load_channel_seeds()
+        if not channel_seeds:
+            print("No channel accounts were found for the current account")
+            return None
+        return channel_seeds[:MAX_CHANNEL_ACCOUNTS]
+
+    def _stream_account_records(self, args, records_name):
+        """
+        Parses the arguments of the account history commands and streams the requested records as NDJSON.
+        :param str args: Command arguments.
+        :param str records_name: Name of the records, either 'payments' or 'transactions'.
+        """
+        from stellar_base.exceptions import HorizonError
+
+        args = shlex.split(args)
+        fresh = pop_flag(args, '--fresh')
+        no_sync = pop_flag(args, '--no-sync')
+        remote = pop_flag(args, '--remote')
+        limit = pop_option(args, '--limit')
+        order = pop_option(args, '--order', HORIZON_ORDER_ASC)
+        since = pop_option(args, '--since')
+        until = pop_option(args, '--until')
+        filters = {}
+        if records_name == HISTORY_PAYMENTS:
+            filters = {'asset': pop_option(args, '--asset'), 'counterparty': pop_option(args, '--counterparty')}
+        output_file = pop_option(args, '--output')
+        account_address = args[0] if len(args) >= 1 else self.session.account_address
+
+        if limit is not None and (not is_int_str(limit) or int(limit) <= 0):
+            print('The limit must be a positive integer value')
+            return
+        if order not in [HORIZON_ORDER_ASC, HORIZON_ORDER_DESC]:
+            print('The order must be either {} or {}'.format(HORIZON_ORDER_ASC, HORIZON_ORDER_DESC))
+            return
+        if any(date is not None and parse_iso_datetime(date) is None for date in [since, until]):
+            print('The dates must be given in the YYYY-MM-DD format')
+            return
+        if filters.get('counterparty') is not None and not is_address_valid(filters['counterparty']):
+            print('The counterparty address is invalid')
+            return
+        if not output_file and output_file is not None:
+            print('An output file must be given')
+            return
+        if remote and (until is not None or any(value is not None for value in filters.values())):
+            print('The --until, --asset and --counterparty filters are not supported with --remote')
+            return
+
+        if not no_sync and not is_account_existent(account_address, fresh):
+            print('No {} could be retrieved'.format(records_name))
+            return
+
+        query = {'limit': int(limit) if limit is not None else None, 'order': order,
+                 'since': parse_iso_datetime(since) if since is not None else None}
+        until_date = parse_iso_datetime(until) if until is not None else None
+        try:
+            if remote:
+                iter_records = iter_account_payments if records_name == HISTORY_PAYMENTS else iter_account_transactions
+                self._write_records(iter_records(account_address, **query), records_name, output_file)
+                return
+
+            with HistoryStore(DEFAULT_HISTORY_STORE_FILE) as store:
+                if not store.open():
+                    return
+                if records_name == HISTORY_PAYMENTS:
+                    n_synced = store.sync_payments(account_address) if not no_sync else 0
+                    records = store.query_payments(account_address, until=until_date, **query, **filters)
+                else:
+                    n_synced = store.sync_transactions(account_address) if not no_sync else 0
+                    records = store.query_transactions(account_address, until=until_date, **query)
+                if output_file is not None and n_synced:
+                    print('{} new {} were fetched from the network'.format(n_synced, records_name))
+                self._write_records(records, records_name, output_file)
+        except HorizonError as e:
+            print('The {} could not be retrieved: {}'.format(records_name, e))
+
+    @staticmethod
+    def _write_records(records, records_name, output_file):
+        """
+        Writes the given records as JSON lines (NDJSON) to the screen or to the given output file.
+        :param records: Iterable of records.
+        :param str records_name: Name of the records, used on the printed messages.
+        :param str output_file: Output file. If None the records are written to the screen.
+        """
+        if output_file is None:
+            for record in records:
+                print(json.dumps(record), flush=True)
+        else:
+            n_records = write_ndjson_file(output_file, records)
+            if n_records is not None:
+                print('{} {} were written to {}'.format(n_records, records_name, output_file))
+
+    def do_stats(self, args):
+        """
+        Prints the latency percentiles of the commands run along the session and of their phases (e.g. the
+        key derivation, the account query, the transaction signing and submission). With --prometheus the
+        latency histograms are also written to the given file in the Prometheus text format (e.g. for the
+        node exporter textfile collector). With --reset the measurements are dropped afterwards.
+        Usage: stats {--prometheus file: optional} {--reset: optional}
+        """
+        args = shlex.split(args)
+        reset = pop_flag(args, '--reset')
+        prometheus_file = pop_option(args, '--prometheus')
+
+        stats = [s for s in get_latency_stats() if s.command != 'stats']
+        if not stats:
+            print('No command was measured yet')
+        else:
+            print('{:<28}{:<22}{:>8}'.format('command', 'span', 'count') +
+                  ''.join('{:>12}'.format('p{}'.format(p)) for p in LATENCY_PERCENTILES))
+            for s in stats:
+                print('{:<28}{:<22}{:>8}'.format(s.command, s.span, s.count) +
+                      ''.join('{:>12}'.format('{:.2f} ms'.format(p * 1000)) for p in s.percentiles))
+        if prometheus_file is not None and write_file(prometheus_file, to_prometheus_text()):
+            print('The latency histograms were written to {}'.format(prometheus_file))
+        if reset:
+            reset_latency_stats()
+
     @staticmethod
     def do_cls(args):
         """
@@ -236,6 +734,8 @@ class GeekStellarCmd(Cmd):
         """
         Quits the program.
         """
+        wipe_cryptographic_keys()
+        forget_seed_addresses()
         print("Quitting.")
         raise SystemExit
 
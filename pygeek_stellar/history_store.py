@@ -0,0 +1,281 @@
+# System imports
+import json
+import sqlite3
+# Local imports
+from .constants import *
+from .stellar_queries import *
+
+HISTORY_STORE_SCHEMA_VERSION = 1
+HISTORY_STORE_TIMEOUT_SECONDS = 30  # Time waited for a lock held by another connection (e.g. a concurrent sync)
+HISTORY_PAYMENTS = 'payments'
+HISTORY_TRANSACTIONS = 'transactions'
+HISTORY_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'  # Horizon created_at format, which sorts chronologically
+
+HISTORY_STORE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS payments (
+    account TEXT NOT NULL,
+    paging_token INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    type TEXT,
+    asset_code TEXT,
+    asset_issuer TEXT,
+    amount TEXT,
+    counterparty TEXT,
+    record TEXT NOT NULL,
+    PRIMARY KEY (account, paging_token)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS payments_by_date ON payments (account, created_at);
+CREATE INDEX IF NOT EXISTS payments_by_asset ON payments (account, asset_code, created_at);
+CREATE INDEX IF NOT EXISTS payments_by_counterparty ON payments (account, counterparty, created_at);
+CREATE TABLE IF NOT EXISTS transactions (
+    account TEXT NOT NULL,
+    paging_token INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    record TEXT NOT NULL,
+    PRIMARY KEY (account, paging_token)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS transactions_by_date ON transactions (account, created_at);
+CREATE TABLE IF NOT EXISTS sync_state (
+    account TEXT NOT NULL,
+    collection TEXT NOT NULL,
+    cursor TEXT NOT NULL,
+    PRIMARY KEY (account, collection)
+);
+'''
+
+
+class HistoryStore:
+    """
+    Local store of the payments and transactions history of Stellar accounts. Once a record is in a ledger
+    it never changes, so each account history only has to be fetched once from Horizon: every sync only
+    fetches the records created after the last stored one, following the stored paging token. The queries
+    are then answered locally, using indexes over the date, asset and counterparty of the records.
+
+    The store is a SQLite database. Each page of records is stored in a single database transaction
+    together with the paging token of its last record, so an interrupted sync is resumed from the last
+    stored page. The database uses write-ahead logging, so it can be read while being synced.
+
+    Attributes
+    ----------
+    filename : str
+        File where the store database is kept.
+    """
+
+    def __init__(self, filename):
+        self.filename: str = filename
+        self._connection = None
+
+    def open(self):
+        """
+        Opens the store database, creating it if it does not exist.
+        :return: Returns True in case of success and False otherwise.
+        :rtype: bool
+        """
+        try:
+            self._connection = sqlite3.connect(self.filename, timeout=HISTORY_STORE_TIMEOUT_SECONDS)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            if self._connection.execute('PRAGMA user_version').fetchone()[0] != HISTORY_STORE_SCHEMA_VERSION:
+                with self._connection:
+                    self._connection.executescript(HISTORY_STORE_SCHEMA)
+                    self._connection.execute('PRAGMA user_version = {}'.format(HISTORY_STORE_SCHEMA_VERSION))
+            return True
+        except sqlite3.Error as e:
+            print('The history store {} could not be opened: {}'.format(self.filename, e))
+            self.close()
+            return False
+
+    def close(self):
+        """
+        Closes the store database.
+        """
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def sync_payments(self, account_address):
+        """
+        Fetches from Horizon the payments of the given account created after the last stored one.
+        :param str account_address: Account address.
+        :return: Returns the number of fetched payments.
+        :rtype: int
+        :raises HorizonError: If a page could not be fetched from Horizon. The pages already fetched are kept.
+        """
+        return self._sync(account_address, HISTORY_PAYMENTS, iter_account_payments,
+                          'INSERT OR IGNORE INTO payments VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', _payment_row)
+
+    def sync_transactions(self, account_address):
+        """
+        Fetches from Horizon the transactions of the given account created after the last stored one.
+        :param str account_address: Account address.
+        :return: Returns the number of fetched transactions.
+        :rtype: int
+        :raises HorizonError: If a page could not be fetched from Horizon. The pages already fetched are kept.
+        """
+        return self._sync(account_address, HISTORY_TRANSACTIONS, iter_account_transactions,
+                          'INSERT OR IGNORE INTO transactions VALUES (?, ?, ?, ?)', _transaction_row)
+
+    def get_sync_cursor(self, account_address, collection):
+        """
+        Returns the paging token of the last stored record of an account collection.
+        :param str account_address: Account address.
+        :param str collection: Either 'payments' or 'transactions'.
+        :return: Returns the paging token or None if the collection was never synced.
+        :rtype: str or None
+        """
+        row = self._connection.execute('SELECT cursor FROM sync_state WHERE account = ? AND collection = ?',
+                                       (account_address, collection)).fetchone()
+        return row[0] if row is not None else None
+
+    def query_payments(self, account_address, limit=None, order=HORIZON_ORDER_ASC, since=None, until=None,
+                       asset=None, counterparty=None):
+        """
+        Queries the stored payments of the given account.
+        :param str account_address: Account address.
+        :param int limit: Maximum number of payments to be returned. If None all the payments are returned.
+        :param str order: Order in which the payments are returned ('asc' or 'desc').
+        :param datetime since: If specified only the payments created since this (UTC) date are returned.
+        :param datetime until: If specified only the payments created before this (UTC) date are returned.
+        :param str asset: If specified only the payments of this asset ('XLM', 'CODE' or 'CODE:ISSUER')
+        are returned.
+        :param str counterparty: If specified only the payments from or to this address are returned.
+        :return: Returns a generator of payment records, as returned by Horizon.
+        :rtype: generator of dict
+        """
+        conditions = []
+        parameters = []
+        if asset is not None:
+            asset_code, _, asset_issuer = asset.partition(CSV_BATCH_PAYMENT_ASSET_SEPARATOR)
+            conditions.append('asset_code = ?')
+            parameters.append(asset_code)
+            if asset_issuer:
+                conditions.append('asset_issuer = ?')
+                parameters.append(asset_issuer)
+        if counterparty is not None:
+            conditions.append('counterparty = ?')
+            parameters.append(counterparty)
+        return self._query(HISTORY_PAYMENTS, account_address, limit, order, since, until, conditions, parameters)
+
+    def query_transactions(self, account_address, limit=None, order=HORIZON_ORDER_ASC, since=None, until=None):
+        """
+        Queries the stored transactions of the given account.
+        :param str account_address: Account address.
+        :param int limit: Maximum number of transactions to be returned. If None all the transactions are returned.
+        :param str order: Order in which the transactions are returned ('asc' or 'desc').
+        :param datetime since: If specified only the transactions created since this (UTC) date are returned.
+        :param datetime until: If specified only the transactions created before this (UTC) date are returned.
+        :return: Returns a generator of transaction records, as returned by Horizon.
+        :rtype: generator of dict
+        """
+        return self._query(HISTORY_TRANSACTIONS, account_address, limit, order, since, until, [], [])
+
+    def _sync(self, account_address, collection, iter_records, insert_statement, to_row):
+        """
+        Fetches from Horizon the records of an account collection created after the last stored one,
+        storing them page by page along with the paging token of the last stored record.
+        :param str account_address: Account address.
+        :param str collection: Name of the collection (and of its table).
+        :param iter_records: Function iterating over the account records (e.g. iter_account_payments).
+        :param str insert_statement: SQL statement inserting a row.
+        :param to_row: Function converting a record into the inserted row.
+        :return: Returns the number of fetched records.
+        :rtype: int
+        """
+        cursor = self.get_sync_cursor(account_address, collection)
+        n_records = 0
+        page = []
+        for record in iter_records(account_address, order=HORIZON_ORDER_ASC, cursor=cursor):
+            page.append(to_row(account_address, record))
+            if len(page) == HORIZON_MAX_PAGE_SIZE:
+                n_records += self._store_page(account_address, collection, insert_statement, page)
+                page = []
+        if page:
+            n_records += self._store_page(account_address, collection, insert_statement, page)
+        return n_records
+
+    def _store_page(self, account_address, collection, insert_statement, rows):
+        """
+        Stores a page of rows of an account collection and the paging token of its last row, atomically.
+        :param str account_address: Account address.
+        :param str collection: Name of the collection.
+        :param str insert_statement: SQL statement inserting a row.
+        :param list rows: Rows to be stored, by paging token order.
+        :return: Returns the number of stored rows.
+        :rtype: int
+        """
+        with self._connection:
+            self._connection.executemany(insert_statement, rows)
+            self._connection.execute('INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?)',
+                                     (account_address, collection, str(rows[-1][1])))
+        return len(rows)
+
+    def _query(self, table, account_address, limit, order, since, until, conditions, parameters):
+        """
+        Queries the records of an account collection, by paging token order.
+        :param str table: Table of the collection.
+        :param str account_address: Account address.
+        :param int limit: Maximum number of records to be returned. If None all the records are returned.
+        :param str order: Order in which the records are returned ('asc' or 'desc').
+        :param datetime since: If specified only the records created since this (UTC) date are returned.
+        :param datetime until: If specified only the records created before this (UTC) date are returned.
+        :param list conditions: Additional SQL conditions, with placeholders for their parameters.
+        :param list parameters: Parameters of the additional conditions.
+        :return: Returns a generator of records.
+        :rtype: generator of dict
+        """
+        conditions = ['account = ?'] + conditions
+        parameters = [account_address] + parameters
+        if since is not None:
+            conditions.append('created_at >= ?')
+            parameters.append(since.strftime(HISTORY_DATETIME_FORMAT))
+        if until is not None:
+            conditions.append('created_at < ?')
+            parameters.append(until.strftime(HISTORY_DATETIME_FORMAT))
+        statement = 'SELECT record FROM {} WHERE {} ORDER BY paging_token {}'.format(
+            table, ' AND '.join(conditions), 'DESC' if order == HORIZON_ORDER_DESC else 'ASC')
+        if limit is not None:
+            statement += ' LIMIT ?'
+            parameters.append(limit)
+        for row in self._connection.execute(statement, parameters):
+            yield json.loads(row[0])
+
+
+def _payment_row(account_address, record):
+    """
+    Converts a Horizon payment record (a payment, path payment, account creation or account merge
+    operation) into a payments table row.
+    :param str account_address: Address of the account whose history is being stored.
+    :param dict record: Horizon payment record.
+    :return: Returns the table row.
+    :rtype: tuple
+    """
+    if record.get('type') == 'create_account':
+        source, destination, amount = record.get('funder'), record.get('account'), record.get('starting_balance')
+    elif record.get('type') == 'account_merge':
+        source, destination, amount = record.get('account'), record.get('into'), None
+    else:
+        source, destination, amount = record.get('from'), record.get('to'), record.get('amount')
+
+    if record.get('asset_type', STELLAR_ASSET_TYPE_XLM) == STELLAR_ASSET_TYPE_XLM:
+        asset_code, asset_issuer = 'XLM', None
+    else:
+        asset_code, asset_issuer = record.get('asset_code'), record.get('asset_issuer')
+    counterparty = destination if source == account_address else source
+    return (account_address, int(record['paging_token']), record.get('created_at', ''), record.get('type'),
+            asset_code, asset_issuer, amount, counterparty, json.dumps(record))
+
+
+def _transaction_row(account_address, record):
+    """
+    Converts a Horizon transaction record into a transactions table row.
+    :param str account_address: Address of the account whose history is being stored.
+    :param dict record: Horizon transaction record.
+    :return: Returns the table row.
+    :rtype: tuple
+    """
+    return account_address, int(record['paging_token']), record.get('created_at', ''), json.dumps(record)
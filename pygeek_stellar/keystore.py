@@ -0,0 +1,397 @@
+# System imports
+import base64
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+# Local imports
+from .constants import *
+from .utils.cryptography import *
+from .utils.file import *
+
+KEYSTORE_FORMAT = 'pygeek-stellar-keystore'
+KEYSTORE_VERSION = 1
+KEYSTORE_FORMAT_TAG = 'format'
+KEYSTORE_VERSION_TAG = 'version'
+KEYSTORE_SALT_TAG = 'salt'
+KEYSTORE_CHECK_TAG = 'check'
+KEYSTORE_PASSWORD_CHECK = b'pygeek-stellar-keystore'
+KEYSTORE_INDEX_KEY_CONTEXT = b'pygeek-stellar-keystore-index'
+KEYSTORE_NO_TAG = '-'
+KEYSTORE_TAG_SIZE = 16
+KEYSTORE_COMPACTION_MIN_DEAD_RECORDS = 64
+KEYSTORE_LOCK_FILE_SUFFIX = '.lock'
+
+
+class Keystore:
+    """
+    Encrypted store of Stellar accounts, able to hold thousands of accounts while only decrypting
+    the ones being used.
+
+    The keystore is a text file whose first line is a JSON header holding the format version and
+    the key derivation salt. Every other line is an account record made of a name tag, an address
+    tag and the account (name, address and seed) encrypted on its own. The tags are keyed hashes
+    (HMAC) of the account name and address, so the records are indexed by name and address without
+    being decrypted and without storing the names in plain text.
+
+    Records are only ever appended to the file. Storing an account with an already stored address
+    supersedes the previous record, which is dropped when the file is compacted (rewritten
+    to a temporary file which is then atomically renamed over the keystore). An interrupted append
+    can only leave an incomplete last line, which is ignored when loading and overwritten by the
+    next append. Malformed complete lines are skipped, never overwritten.
+
+    Appends and compactions hold an exclusive lock (on a lock file next to the keystore, since the
+    compaction replaces the keystore file) and first index the records appended by other processes
+    (or Keystore instances) since the keystore was opened, so no record written by them is lost.
+
+    Attributes
+    ----------
+    filename : str
+        File where the keystore is stored.
+    """
+
+    def __init__(self, filename):
+        self.filename: str = filename
+        self._header = None
+        self._fernet = None
+        self._index_key = None
+        self._names = {}  # name tag -> offsets of the records with that name
+        self._addresses = {}  # address tag -> record offset
+        self._records = {}  # record offset -> (name tag, address tag), for the live records
+        self._n_records = 0  # Live and superseded records
+        self._end_offset = 0  # End of the last complete record
+        self._file_id = None  # (device, inode) of the indexed keystore file, which changes when it is compacted
+
+    def exists(self):
+        """
+        Checks if the keystore file exists.
+        :return: Returns True if the keystore file exists and False otherwise.
+        :rtype: bool
+        """
+        return os.path.isfile(self.filename)
+
+    def create(self, password):
+        """
+        Creates a new empty keystore, protected by the given password. An existing keystore file is replaced.
+        :param str password: Encryption password.
+        :return: Returns True in case of success and False otherwise.
+        :rtype: bool
+        """
+        salt = generate_salt()
+        self._set_keys(password, salt)
+        header = {
+            KEYSTORE_FORMAT_TAG: KEYSTORE_FORMAT,
+            KEYSTORE_VERSION_TAG: KEYSTORE_VERSION,
+            KEYSTORE_SALT_TAG: base64.b64encode(salt).decode(),
+            KEYSTORE_CHECK_TAG: self._fernet.encrypt(KEYSTORE_PASSWORD_CHECK).decode()}
+        header_line = (json.dumps(header) + '\n').encode()
+        if not write_file(self.filename, header_line, write_as_binary=True):
+            return False
+
+        self._header = header_line
+        self._reset_index(len(header_line))
+        self._file_id = _get_file_id(os.stat(self.filename))
+        return True
+
+    def open(self, password):
+        """
+        Opens the keystore, indexing all of its records. No record is decrypted.
+        :param str password: Decryption password.
+        :return: Returns True in case of success and False otherwise.
+        :rtype: bool
+        """
+        from cryptography.fernet import InvalidToken
+
+        try:
+            with open(self.filename, FILE_MODE_READ_BINARY) as file:
+                header_line = file.readline()
+                header = json.loads(header_line.decode())
+                if header.get(KEYSTORE_FORMAT_TAG) != KEYSTORE_FORMAT or \
+                        header.get(KEYSTORE_VERSION_TAG) != KEYSTORE_VERSION:
+                    print("The configuration file format is not supported")
+                    return False
+
+                self._set_keys(password, base64.b64decode(header[KEYSTORE_SALT_TAG]))
+                try:
+                    self._fernet.decrypt(header[KEYSTORE_CHECK_TAG].encode())
+                except InvalidToken:
+                    print("The file could not be decrypted. Please check if the password is correct")
+                    return False
+
+                self._header = header_line
+                self._reset_index(len(header_line), file)
+                self._index_records(file)
+        except (OSError, IOError):
+            print("There was a problem opening/reading the file: {}".format(self.filename))
+            return False
+        except (ValueError, KeyError, TypeError):
+            print("The configuration file is corrupted")
+            return False
+        return True
+
+    def count(self):
+        """
+        Returns the number of accounts stored on the keystore.
+        :return: Returns the number of stored accounts.
+        :rtype: int
+        """
+        return len(self._records)
+
+    def get_account_by_name(self, name):
+        """
+        Loads the account with the given name. Only its record is read and decrypted. If several accounts
+        share the same name the most recently stored one is loaded.
+        :param str name: Name of the account.
+        :return: Returns the account (a dict with the name, address and seed tags) or None if it was not found
+        or the keystore file could not be read.
+        :rtype: dict or None
+        """
+        name_tag = self._tag('name', name)
+        accounts = self._load_records(lambda: self._names.get(name_tag, [])[-1:])
+        return accounts[0] if accounts else None
+
+    def get_account_by_address(self, address):
+        """
+        Loads the account with the given address. Only its record is read and decrypted.
+        :param str address: Address of the account.
+        :return: Returns the account (a dict with the name, address and seed tags) or None if it was not found
+        or the keystore file could not be read.
+        :rtype: dict or None
+        """
+        address_tag = self._tag('address', address)
+        accounts = self._load_records(lambda: [self._addresses[address_tag]] if address_tag in self._addresses
+                                      else [])
+        return accounts[0] if accounts else None
+
+    def get_accounts(self):
+        """
+        Loads all the accounts stored on the keystore, in the order they were stored.
+        :return: Returns a list of accounts (dicts with the name, address and seed tags) or None if the
+        keystore file could not be read.
+        :rtype: list of dict or None
+        """
+        return self._load_records(lambda: sorted(self._records))
+
+    def add_account(self, name, address, seed):
+        """
+        Stores an account on the keystore, superseding the stored account with the same address, if any.
+        :param str name: Name of the account. It can be None.
+        :param str address: Address of the account.
+        :param str seed: Seed of the account. It can be None.
+        :return: Returns True in case of success and False otherwise.
+        :rtype: bool
+        """
+        return self.add_accounts([(name, address, seed)])
+
+    def add_accounts(self, accounts):
+        """
+        Stores several accounts on the keystore with a single append to the keystore file.
+        :param accounts: Iterable of (name, address, seed) tuples. Names and seeds can be None.
+        :return: Returns True in case of success and False otherwise.
+        :rtype: bool
+        """
+        records = []
+        for name, address, seed in accounts:
+            account = {JSON_ACCOUNT_NAME_TAG: name, JSON_ACCOUNT_ADDRESS_TAG: address, JSON_ACCOUNT_SEED_TAG: seed}
+            name_tag = self._tag('name', name) if name else KEYSTORE_NO_TAG
+            address_tag = self._tag('address', address)
+            token = self._fernet.encrypt(json.dumps(account).encode()).decode()
+            records.append((name_tag, address_tag, '{} {} {}\n'.format(name_tag, address_tag, token).encode()))
+
+        try:
+            with self._lock(), open(self.filename, 'r+b') as file:
+                self._index_new_records(file)
+                file.seek(self._end_offset)
+                file.truncate()  # Drops the incomplete last line left by an interrupted append, if any
+                file.write(b''.join(record[2] for record in records))
+                file.flush()
+                os.fsync(file.fileno())
+                for name_tag, address_tag, line in records:
+                    self._index_record(self._end_offset, name_tag, address_tag)
+                    self._end_offset += len(line)
+        except (OSError, IOError, ValueError):
+            print("There was a problem opening/writing the file: {}".format(self.filename))
+            return False
+
+        if self._n_records - len(self._records) >= max(KEYSTORE_COMPACTION_MIN_DEAD_RECORDS, len(self._records)):
+            self.compact()
+        return True
+
+    def compact(self):
+        """
+        Rewrites the keystore file without the superseded records. The live records (including the ones
+        appended by other processes) are copied as they are (without being decrypted) to a temporary file
+        which is then atomically renamed over the keystore file.
+        :return: Returns True in case of success and False otherwise.
+        :rtype: bool
+        """
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        try:
+            with self._lock():
+                fd, temp_filename = tempfile.mkstemp(dir=directory, prefix='.keystore-')
+                with os.fdopen(fd, FILE_MODE_WRITE_BINARY) as temp_file, \
+                        open(self.filename, FILE_MODE_READ_BINARY) as file:
+                    self._index_new_records(file)
+                    temp_file.write(self._header)
+                    for offset in sorted(self._records):
+                        file.seek(offset)
+                        temp_file.write(file.readline())
+                    temp_file.flush()
+                    os.fsync(temp_file.fileno())
+                os.replace(temp_filename, self.filename)
+                with open(self.filename, FILE_MODE_READ_BINARY) as file:
+                    file.readline()
+                    self._reset_index(len(self._header), file)
+                    self._index_records(file)
+        except (OSError, IOError, ValueError):
+            print("There was a problem compacting the file: {}".format(self.filename))
+            return False
+        return True
+
+    @contextmanager
+    def _lock(self):
+        """
+        Context manager holding the exclusive lock of the keystore, shared by every process using it. The
+        lock is taken on a separate lock file, since the keystore file itself is replaced when compacted.
+        No lock is taken on the platforms without fcntl (i.e. Windows).
+        """
+        try:
+            import fcntl
+        except ImportError:
+            yield
+            return
+
+        with open(self.filename + KEYSTORE_LOCK_FILE_SUFFIX, 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _index_new_records(self, file):
+        """
+        Indexes the records appended to the keystore file since it was last indexed, e.g. by another process.
+        If the file was replaced (compacted by another process) all of its records are indexed again. It must
+        be called while holding the keystore lock.
+        :param file: Keystore file, opened in binary mode.
+        """
+        if _get_file_id(os.fstat(file.fileno())) != self._file_id:
+            file.seek(0)
+            if file.readline() != self._header:
+                raise ValueError('The keystore file was replaced by a different keystore')
+            self._reset_index(len(self._header), file)
+        else:
+            file.seek(self._end_offset)
+        self._index_records(file)
+
+    def _set_keys(self, password, salt):
+        """
+        Derives the record encryption key and the index key from the given password.
+        :param str password: Keystore password.
+        :param bytes salt: Key derivation salt of the keystore.
+        """
+        from cryptography.fernet import Fernet
+
+        key = password2cryptographic_key(password, salt)
+        self._fernet = Fernet(key)
+        self._index_key = hmac.new(base64.urlsafe_b64decode(key), KEYSTORE_INDEX_KEY_CONTEXT, hashlib.sha256).digest()
+
+    def _tag(self, kind, value):
+        """
+        Computes the tag under which a record is indexed.
+        :param str kind: Kind of the indexed value ('name' or 'address').
+        :param str value: Indexed value.
+        :return: Returns the tag of the value.
+        :rtype: str
+        """
+        digest = hmac.new(self._index_key, '{}:{}'.format(kind, value).encode(), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest[:KEYSTORE_TAG_SIZE]).rstrip(b'=').decode()
+
+    def _reset_index(self, end_offset, file=None):
+        """
+        Empties the index of the keystore records.
+        :param int end_offset: Offset at which the records start.
+        :param file: Keystore file about to be indexed, opened in binary mode. It can be None.
+        """
+        self._file_id = _get_file_id(os.fstat(file.fileno())) if file is not None else None
+        self._names = {}
+        self._addresses = {}
+        self._records = {}
+        self._n_records = 0
+        self._end_offset = end_offset
+
+    def _index_records(self, file):
+        """
+        Indexes the records of the keystore file, starting at the current position of the given file.
+        :param file: Keystore file, opened in binary mode and positioned after the header.
+        """
+        for line in file:
+            if not line.endswith(b'\n'):
+                break  # Incomplete last line left by an interrupted append
+            fields = line.split()
+            if len(fields) == 3:
+                self._index_record(self._end_offset, fields[0].decode(), fields[1].decode())
+            # Malformed complete lines are skipped (and kept), so they do not hide the following records
+            self._end_offset += len(line)
+
+    def _index_record(self, offset, name_tag, address_tag):
+        """
+        Adds a record to the index, dropping the record with the same address, if any.
+        :param int offset: Offset of the record on the keystore file.
+        :param str name_tag: Name tag of the record.
+        :param str address_tag: Address tag of the record.
+        """
+        superseded_offset = self._addresses.get(address_tag)
+        if superseded_offset is not None:
+            superseded_name_tag, _ = self._records.pop(superseded_offset)
+            if superseded_name_tag != KEYSTORE_NO_TAG:
+                self._names[superseded_name_tag].remove(superseded_offset)
+                if not self._names[superseded_name_tag]:
+                    del self._names[superseded_name_tag]
+
+        self._records[offset] = (name_tag, address_tag)
+        if name_tag != KEYSTORE_NO_TAG:
+            self._names.setdefault(name_tag, []).append(offset)
+        self._addresses[address_tag] = offset
+        self._n_records += 1
+
+    def _load_records(self, get_offsets):
+        """
+        Reads and decrypts records of the keystore file. The records written by other processes since the
+        keystore was last indexed are indexed first, so the offsets match the current keystore file. The
+        keystore lock is held meanwhile, so the file cannot be compacted (replaced) by another process before
+        the records are read.
+        :param get_offsets: Function returning the offsets of the records to be read, from the updated index.
+        :return: Returns the decrypted accounts, in the same order as the offsets, or None if the keystore file
+        could not be read.
+        :rtype: list of dict or None
+        """
+        from cryptography.fernet import InvalidToken
+
+        accounts = []
+        try:
+            with self._lock(), open(self.filename, FILE_MODE_READ_BINARY) as file:
+                self._index_new_records(file)
+                for offset in get_offsets():
+                    file.seek(offset)
+                    token = file.readline().split()[2]
+                    accounts.append(json.loads(self._fernet.decrypt(token).decode()))
+        except (OSError, IOError):
+            print("There was a problem opening/reading the file: {}".format(self.filename))
+            return None
+        except (ValueError, IndexError, InvalidToken):
+            print("The configuration file is corrupted")
+            return None
+        return accounts
+
+
+def _get_file_id(stat):
+    """
+    Identifies a file by its device and inode, which change when the file is replaced.
+    :param os.stat_result stat: Status of the file.
+    :return: Returns the (device, inode) tuple of the file.
+    :rtype: (int, int)
+    """
+    return stat.st_dev, stat.st_ino
@@ -0,0 +1,794 @@
+"""
+Local stand-in Horizon server, used to exercise the tool without the Stellar testnet (e.g. to measure its
+throughput and tail latency reproducibly). Run it with:
+
+    python -m pygeek_stellar.mock_horizon --port 8000 --latency 0.05 --error-rate 0.01 --rate-limit 3600
+
+and point the tool at it with --horizon-url http://127.0.0.1:8000 (or the PYGEEK_STELLAR_HORIZON_URL variable).
+"""
+# System imports
+import argparse
+import base64
+import hashlib
+import json
+import math
+import random
+import struct
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+# Local imports
+from .constants import *
+from .stellar_queries import *
+from .stellar_requests import *
+
+MOCK_HORIZON_HOST = '127.0.0.1'
+MOCK_HORIZON_FRIENDBOT_ADDRESS = 'GAIH3ULLFQ4DGSECF2AR555KZ4KNDGEKN4AFI4SU2M7B43MGK3QJZNSR'
+MOCK_HORIZON_FRIENDBOT_AMOUNT = '10000'
+MOCK_HORIZON_MIN_STARTING_BALANCE = '1'  # Minimum balance of a new account (2 base reserves)
+MOCK_HORIZON_RATE_LIMIT_WINDOW_SECONDS = 3600  # As Horizon, the rate limit is a number of requests per hour
+MOCK_HORIZON_DEFAULT_PAGE_SIZE = 10
+MOCK_HORIZON_MAX_PAGE_SIZE = 200
+MOCK_HORIZON_STREAM_RETRY_MILLISECONDS = 1000
+MOCK_HORIZON_STREAM_IDLE_SECONDS = 30  # Streams without new records for this time are closed
+MOCK_HORIZON_STREAM_POLL_SECONDS = 0.5
+MOCK_HORIZON_PROBLEM_TYPE_URL = 'https://stellar.org/horizon-errors/'
+
+# Horizon problems: (status, type, title)
+PROBLEM_NOT_FOUND = (404, 'not_found', 'Resource Missing')
+PROBLEM_BAD_REQUEST = (400, 'bad_request', 'Bad Request')
+PROBLEM_TRANSACTION_MALFORMED = (400, 'transaction_malformed', 'Transaction Malformed')
+PROBLEM_TRANSACTION_FAILED = (400, 'transaction_failed', 'Transaction Failed')
+PROBLEM_RATE_LIMIT_EXCEEDED = (429, 'rate_limit_exceeded', 'Rate Limit Exceeded')
+PROBLEM_SERVICE_UNAVAILABLE = (503, 'service_unavailable', 'Service Unavailable')
+
+# XDR codes (see StellarXDR_const) of the transaction and operation results produced by the mock
+TX_SUCCESS, TX_FAILED, TX_BAD_SEQ, TX_BAD_AUTH, TX_INSUFFICIENT_BALANCE, TX_NO_ACCOUNT, TX_INSUFFICIENT_FEE = \
+    0, -1, -5, -6, -7, -8, -9
+OP_INNER, OP_NO_ACCOUNT = 0, -2
+OP_CREATE_ACCOUNT, OP_PAYMENT, OP_SET_OPTIONS, OP_CHANGE_TRUST, OP_MANAGE_DATA = 0, 1, 5, 6, 10
+CREATE_ACCOUNT_MALFORMED, CREATE_ACCOUNT_UNDERFUNDED, CREATE_ACCOUNT_LOW_RESERVE, CREATE_ACCOUNT_ALREADY_EXIST = \
+    -1, -2, -3, -4
+PAYMENT_MALFORMED, PAYMENT_UNDERFUNDED, PAYMENT_SRC_NO_TRUST, PAYMENT_NO_DESTINATION, PAYMENT_NO_TRUST, \
+    PAYMENT_LINE_FULL, PAYMENT_NO_ISSUER = -1, -2, -3, -5, -6, -8, -9
+CHANGE_TRUST_MALFORMED, CHANGE_TRUST_NO_ISSUER, CHANGE_TRUST_INVALID_LIMIT, CHANGE_TRUST_SELF_NOT_ALLOWED = \
+    -1, -2, -3, -5
+NATIVE_ASSET = ('XLM', None)
+
+
+class MockHorizon:
+    """
+    Local stand-in of the Horizon endpoints used by the tool: accounts, payments and transactions (paged
+    and streamed), Friendbot and transaction submission. The accounts (balances, trustlines and sequence
+    numbers) are kept in memory and updated by the submitted transactions, whose signatures are verified.
+    Only the create account, payment, change trust, set options and manage data operations are supported
+    (the last two have no effect), and the minimum balances of the accounts are not enforced.
+
+    Every request can be delayed and answered with injected errors or, past the rate limit, with HTTP 429.
+    As Horizon, the rate limit is a token bucket (a burst of rate_limit requests, refilled at rate_limit
+    requests per rate_limit_window) and every response has the X-RateLimit-Limit, X-RateLimit-Remaining and
+    X-RateLimit-Reset (seconds until the bucket is full) headers. Each successful transaction closes its own
+    ledger.
+
+    Attributes
+    ----------
+    latency : float
+        Delay, in seconds, of every response.
+    latency_jitter : float
+        Maximum random delay, in seconds, added to the latency of each response.
+    error_rate : float
+        Fraction of the requests answered with HTTP 503 (without being processed).
+    rate_limit : int or None
+        Maximum number of requests per rate limit window, which can also be done in a single burst. There
+        is no limit if None.
+    rate_limit_window : float
+        Duration, in seconds, of the rate limit window.
+    request_counts : Counter
+        Number of responses by (request, status code), e.g. ('POST /transactions', 200).
+    url : str
+        Base URL of the server, once started.
+    """
+
+    def __init__(self, latency=0, latency_jitter=0, error_rate=0, rate_limit=None,
+                 rate_limit_window=MOCK_HORIZON_RATE_LIMIT_WINDOW_SECONDS, seed=None, host=MOCK_HORIZON_HOST, port=0):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.rate_limit_window = rate_limit_window
+        self.request_counts = Counter()
+        self.url = None
+        self._address = (host, port)
+        self._random = random.Random(seed)
+        self._server = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self._records_added = threading.Condition(self._lock)
+        self._accounts = {}  # address -> {'sequence': int, 'balances': {asset: [stroops, limit stroops]}}
+        self._payments = {}  # address -> payment records, by paging token order
+        self._transactions = {}  # address -> transaction records, by paging token order
+        self._ledger = 1
+        self._paging_token = 0
+        self._rate_limit_tokens = None  # Requests left on the rate limit bucket, None until the first request
+        self._rate_limit_updated = 0
+        self._keypairs = {}  # address -> Keypair, to verify the signatures
+
+    def start(self):
+        """
+        Starts serving requests on a background thread.
+        :return: Returns the base URL of the server.
+        :rtype: str
+        """
+        self._server = ThreadingHTTPServer(self._address, _MockHorizonHandler)
+        self._server.daemon_threads = True
+        self._server.horizon = self
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self.url = 'http://{}:{}'.format(*self._server.server_address[:2])
+        return self.url
+
+    def stop(self):
+        """
+        Stops the server, closing the open streams.
+        """
+        with self._lock:
+            self._closed = True
+            self._records_added.notify_all()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def fund_account(self, address, amount=MOCK_HORIZON_FRIENDBOT_AMOUNT):
+        """
+        Creates an account funded by Friendbot.
+        :param str address: Address of the account.
+        :param str amount: XLM amount of the account.
+        :return: Returns True if the account was created and False if it already existed.
+        :rtype: bool
+        """
+        with self._lock:
+            if address in self._accounts:
+                return False
+            self._create_account(self._accounts, address, amount_to_stroops(amount))
+            self._ledger += 1
+            self._add_records(_get_friendbot_transaction_hash(address), MOCK_HORIZON_FRIENDBOT_ADDRESS, 0, 0, None,
+                              [self._create_account_record(MOCK_HORIZON_FRIENDBOT_ADDRESS, address,
+                                                           amount_to_stroops(amount))])
+            return True
+
+    def get_account(self, address):
+        """
+        Returns an account as returned by the Horizon /accounts/{address} endpoint.
+        :param str address: Address of the account.
+        :return: Returns the account or None if it does not exist.
+        :rtype: dict or None
+        """
+        with self._lock:
+            account = self._accounts.get(address)
+            if account is None:
+                return None
+            balances = []
+            for (code, issuer), (stroops, limit) in account['balances'].items():
+                if issuer is None:
+                    balances.append({'balance': stroops_to_amount(stroops), 'asset_type': STELLAR_ASSET_TYPE_XLM})
+                else:
+                    balances.append({'balance': stroops_to_amount(stroops), 'limit': stroops_to_amount(limit),
+                                     'asset_type': _get_credit_asset_type(code), 'asset_code': code,
+                                     'asset_issuer': issuer})
+            return {'id': address, 'account_id': address, 'paging_token': address,
+                    'sequence': str(account['sequence']), 'subentry_count': len(balances) - 1,
+                    'thresholds': {'low_threshold': 0, 'med_threshold': 0, 'high_threshold': 0},
+                    'flags': {'auth_required': False, 'auth_revocable': False}, 'balances': balances,
+                    'signers': [{'public_key': address, 'key': address, 'weight': 1, 'type': 'ed25519_public_key'}],
+                    'data': {}}
+
+    def get_records(self, address, collection, cursor=None, order=HORIZON_ORDER_ASC, limit=None):
+        """
+        Returns a page of the payments or transactions of an account.
+        :param str address: Address of the account.
+        :param str collection: Either 'payments' or 'transactions'.
+        :param str cursor: Paging token after which the records are returned.
+        :param str order: Order in which the records are returned ('asc' or 'desc').
+        :param int limit: Maximum number of records returned. If None all the records are returned.
+        :return: Returns the records.
+        :rtype: list of dict
+        """
+        with self._lock:
+            records = (self._payments if collection == 'payments' else self._transactions).get(address, [])
+            return _get_records_page(records, cursor, order, limit)
+
+    def submit_transaction(self, envelope_xdr):
+        """
+        Applies a transaction, as done by the Horizon POST /transactions endpoint.
+        :param str envelope_xdr: Base64 encoded transaction envelope XDR.
+        :return: Returns the HTTP status code and content of the response.
+        :rtype: (int, dict)
+        """
+        from stellar_base.transaction_envelope import TransactionEnvelope
+
+        try:
+            envelope = TransactionEnvelope.from_xdr(envelope_xdr)
+            envelope = TransactionEnvelope(envelope.tx, {'signatures': envelope.signatures,
+                                                         'network_id': STELLAR_NETWORK})
+            tx_hash = envelope.hash_meta()
+        except Exception as e:
+            # Too broad exception because stellar_base raises many different exceptions on invalid XDR
+            return _problem(PROBLEM_TRANSACTION_MALFORMED, 'The envelope could not be decoded: {}'.format(e))
+        operations = [(_get_operation_type(operation), operation) for operation in envelope.tx.operations]
+        if not operations or None in [operation_type for operation_type, _ in operations]:
+            return _problem(PROBLEM_TRANSACTION_MALFORMED, 'The transaction has no operations or has operations '
+                                                           'not supported by the mock Horizon')
+
+        tx = envelope.tx
+        source = _decode_address(tx.source)
+        with self._lock:
+            account = self._accounts.get(source)
+            if account is None:
+                code, fee_charged, results = TX_NO_ACCOUNT, 0, None
+            elif tx.sequence != account['sequence'] + 1:
+                code, fee_charged, results = TX_BAD_SEQ, 0, None
+            elif tx.fee < STELLAR_BASE_FEE * len(operations):
+                code, fee_charged, results = TX_INSUFFICIENT_FEE, 0, None
+            elif not self._is_signed(envelope, tx_hash, [source] + [_decode_address(o.source)
+                                                                    for _, o in operations if o.source]):
+                code, fee_charged, results = TX_BAD_AUTH, 0, None
+            elif account['balances'][NATIVE_ASSET][0] < tx.fee:
+                code, fee_charged, results = TX_INSUFFICIENT_BALANCE, 0, None
+            else:
+                account['sequence'] = tx.sequence
+                account['balances'][NATIVE_ASSET][0] -= tx.fee
+                fee_charged = tx.fee
+                code, results, records = self._apply_operations(source, tx_hash.hex(), operations)
+                self._ledger += 1
+                if code == TX_SUCCESS:
+                    self._add_records(tx_hash.hex(), source, tx.sequence, tx.fee, tx.memo, records)
+            ledger = self._ledger
+
+        result_xdr = _pack_transaction_result(fee_charged, code, results)
+        if code == TX_SUCCESS:
+            return 200, {'hash': tx_hash.hex(), 'ledger': ledger, 'envelope_xdr': envelope_xdr,
+                         'result_xdr': result_xdr, 'result_meta_xdr': ''}
+        tx_result = decode_transaction_result(result_xdr)
+        result_codes = {'transaction': tx_result.code}
+        if tx_result.operations:
+            result_codes['operations'] = [operation.code for operation in tx_result.operations]
+        status, content = _problem(PROBLEM_TRANSACTION_FAILED, 'The transaction failed when submitted to the '
+                                                               'Stellar network')
+        content['extras'] = {'envelope_xdr': envelope_xdr, 'result_xdr': result_xdr, 'result_codes': result_codes}
+        return status, content
+
+    def _is_signed(self, envelope, tx_hash, addresses):
+        """
+        Checks if the transaction envelope has a valid signature of each one of the given accounts.
+        :param TransactionEnvelope envelope: Transaction envelope.
+        :param bytes tx_hash: Hash of the transaction (the signed data).
+        :param list addresses: Addresses of the accounts.
+        :return: Returns True if every account signed the transaction.
+        :rtype: bool
+        """
+        from stellar_base.keypair import Keypair
+
+        for address in set(addresses):
+            keypair = self._keypairs.get(address)
+            if keypair is None:
+                keypair = self._keypairs[address] = Keypair.from_address(address)
+            hint = keypair.signature_hint()
+            for signature in envelope.signatures:
+                if bytes(signature.hint) != hint:
+                    continue
+                try:
+                    keypair.verify(tx_hash, signature.signature)
+                    break
+                except Exception:
+                    # Too broad exception because the exception depends on the ed25519 package in use
+                    continue
+            else:
+                return False
+        return True
+
+    def _apply_operations(self, tx_source, tx_hash, operations):
+        """
+        Applies the operations of a transaction. Either all of them succeed and their changes are kept, or
+        none of the changes is kept.
+        :param str tx_source: Address of the source account of the transaction.
+        :param str tx_hash: Hash of the transaction.
+        :param list operations: (operation type, operation) tuples.
+        :return: Returns the transaction result code, the (outer result code, operation type, result code)
+        of each operation and the payment records of the operations.
+        :rtype: (int, list of tuple, list of dict)
+        """
+        accounts = _CopyOnWriteAccounts(self._accounts)
+        results = []
+        records = []
+        for operation_type, operation in operations:
+            source = _decode_address(operation.source) if operation.source else tx_source
+            if source not in accounts:
+                results.append((OP_NO_ACCOUNT, operation_type, None))
+                continue
+            if operation_type == OP_CREATE_ACCOUNT:
+                code, record = self._apply_create_account(accounts, source, operation)
+            elif operation_type == OP_PAYMENT:
+                code, record = self._apply_payment(accounts, source, operation)
+            elif operation_type == OP_CHANGE_TRUST:
+                code, record = self._apply_change_trust(accounts, source, operation)
+            else:
+                code, record = 0, None
+            results.append((OP_INNER, operation_type, code))
+            if record is not None:
+                record['transaction_hash'] = tx_hash
+                records.append(record)
+
+        if any(result[0] != OP_INNER or result[2] != 0 for result in results):
+            return TX_FAILED, results, []
+        accounts.commit()
+        return TX_SUCCESS, results, records
+
+    def _apply_create_account(self, accounts, source, operation):
+        """
+        Applies a create account operation.
+        :param _CopyOnWriteAccounts accounts: Accounts on which the operation is applied.
+        :param str source: Address of the source account of the operation.
+        :param Operation operation: Operation decoded by stellar_base.
+        :return: Returns the operation result code and its payment record (or None).
+        :rtype: (int, dict or None)
+        """
+        destination = _decode_address(operation.destination)
+        amount = amount_to_stroops(operation.starting_balance)
+        if amount <= 0:
+            return CREATE_ACCOUNT_MALFORMED, None
+        if destination in accounts:
+            return CREATE_ACCOUNT_ALREADY_EXIST, None
+        if amount < amount_to_stroops(MOCK_HORIZON_MIN_STARTING_BALANCE):
+            return CREATE_ACCOUNT_LOW_RESERVE, None
+        balances = accounts.get_for_update(source)['balances']
+        if balances[NATIVE_ASSET][0] < amount:
+            return CREATE_ACCOUNT_UNDERFUNDED, None
+        balances[NATIVE_ASSET][0] -= amount
+        self._create_account(accounts, destination, amount)
+        return 0, self._create_account_record(source, destination, amount)
+
+    def _apply_payment(self, accounts, source, operation):
+        """
+        Applies a payment operation.
+        :param _CopyOnWriteAccounts accounts: Accounts on which the operation is applied.
+        :param str source: Address of the source account of the operation.
+        :param Operation operation: Operation decoded by stellar_base.
+        :return: Returns the operation result code and its payment record (or None).
+        :rtype: (int, dict or None)
+        """
+        destination = _decode_address(operation.destination)
+        asset = _get_asset(operation.asset)
+        amount = amount_to_stroops(operation.amount)
+        if amount <= 0:
+            return PAYMENT_MALFORMED, None
+        if destination not in accounts:
+            return PAYMENT_NO_DESTINATION, None
+        if asset[1] is not None and asset[1] not in accounts:
+            return PAYMENT_NO_ISSUER, None
+        source_balance = accounts.get_for_update(source)['balances'].get(asset)
+        if asset[1] != source:
+            if source_balance is None:
+                return PAYMENT_SRC_NO_TRUST, None
+            if source_balance[0] < amount:
+                return PAYMENT_UNDERFUNDED, None
+        destination_balance = accounts.get_for_update(destination)['balances'].get(asset)
+        if asset[1] != destination:
+            if destination_balance is None:
+                return PAYMENT_NO_TRUST, None
+            if destination_balance[1] is not None and destination_balance[0] + amount > destination_balance[1]:
+                return PAYMENT_LINE_FULL, None
+        if asset[1] != source:
+            source_balance[0] -= amount
+        if asset[1] != destination:
+            destination_balance[0] += amount
+        record = {'type': 'payment', 'type_i': OP_PAYMENT, 'source_account': source, 'from': source,
+                  'to': destination, 'amount': stroops_to_amount(amount)}
+        record.update(_get_horizon_asset_fields(asset))
+        return 0, record
+
+    def _apply_change_trust(self, accounts, source, operation):
+        """
+        Applies a change trust operation (a limit of 0 removes the trustline).
+        :param _CopyOnWriteAccounts accounts: Accounts on which the operation is applied.
+        :param str source: Address of the source account of the operation.
+        :param Operation operation: Operation decoded by stellar_base.
+        :return: Returns the operation result code and its payment record (or None).
+        :rtype: (int, dict or None)
+        """
+        asset = _get_asset(operation.line)
+        limit = amount_to_stroops(operation.limit)
+        if asset[1] is None or limit < 0:
+            return CHANGE_TRUST_MALFORMED, None
+        if asset[1] == source:
+            return CHANGE_TRUST_SELF_NOT_ALLOWED, None
+        if asset[1] not in accounts:
+            return CHANGE_TRUST_NO_ISSUER, None
+        balances = accounts.get_for_update(source)['balances']
+        balance = balances.get(asset, [0, 0])[0]
+        if limit < balance:
+            return CHANGE_TRUST_INVALID_LIMIT, None
+        if limit == 0:
+            balances.pop(asset, None)
+        else:
+            balances[asset] = [balance, limit]
+        return 0, None
+
+    def _create_account(self, accounts, address, stroops):
+        """
+        Creates an account. As on the network, its sequence number is made of the current ledger number.
+        """
+        accounts[address] = {'sequence': self._ledger << 32, 'balances': OrderedDict([(NATIVE_ASSET, [stroops, None])])}
+
+    @staticmethod
+    def _create_account_record(funder, address, stroops):
+        """
+        Creates the payment record of an account creation.
+        """
+        return {'type': 'create_account', 'type_i': OP_CREATE_ACCOUNT, 'source_account': funder, 'funder': funder,
+                'account': address, 'starting_balance': stroops_to_amount(stroops)}
+
+    def _add_records(self, tx_hash, source, sequence, fee, memo, payment_records):
+        """
+        Adds the records of a successful transaction to the history of the accounts taking part in it, and
+        wakes up the streams.
+        """
+        created_at = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        self._paging_token += 1
+        transaction = {'id': tx_hash, 'paging_token': str(self._paging_token), 'hash': tx_hash,
+                       'ledger': self._ledger, 'created_at': created_at, 'source_account': source,
+                       'source_account_sequence': str(sequence), 'fee_paid': fee,
+                       'operation_count': max(1, len(payment_records)), 'memo_type': 'none'}
+        if memo is not None and getattr(memo, 'text', None) is not None:
+            transaction.update({'memo_type': 'text', 'memo': bytes(memo.text).decode(errors='replace')})
+        participants = {source}
+        for record in payment_records:
+            self._paging_token += 1
+            record.update({'id': str(self._paging_token), 'paging_token': str(self._paging_token),
+                           'created_at': created_at, 'transaction_hash': tx_hash})
+            accounts = {record.get('from'), record.get('to'), record.get('funder'), record.get('account')}
+            for account in accounts - {None}:
+                self._payments.setdefault(account, []).append(record)
+            participants |= accounts - {None}
+        for account in participants:
+            self._transactions.setdefault(account, []).append(transaction)
+        self._records_added.notify_all()
+
+    def _take_rate_limit(self):
+        """
+        Takes a request from the rate limit bucket, after refilling it for the time elapsed since the last request.
+        :return: Returns the rate limit headers of the response and whether the request exceeds the limit.
+        :rtype: (dict, bool)
+        """
+        if self.rate_limit is None:
+            return {}, False
+        with self._lock:
+            now = time.monotonic()
+            refill_rate = self.rate_limit / self.rate_limit_window
+            tokens = self.rate_limit if self._rate_limit_tokens is None else \
+                min(self.rate_limit, self._rate_limit_tokens + (now - self._rate_limit_updated) * refill_rate)
+            exceeded = tokens < 1
+            if not exceeded:
+                tokens -= 1
+            self._rate_limit_tokens, self._rate_limit_updated = tokens, now
+            headers = {'X-RateLimit-Limit': str(self.rate_limit),
+                       'X-RateLimit-Remaining': str(int(tokens)),
+                       'X-RateLimit-Reset': str(math.ceil((self.rate_limit - tokens) / refill_rate))}
+            if exceeded:
+                headers['Retry-After'] = str(math.ceil((1 - tokens) / refill_rate))
+        return headers, exceeded
+
+    def _count_response(self, request_name, status):
+        """
+        Counts a response on request_counts. The handler threads count their responses concurrently.
+        :param str request_name: Request, e.g. 'POST /transactions'.
+        :param int status: HTTP status code of the response.
+        """
+        with self._lock:
+            self.request_counts[(request_name, status)] += 1
+
+    def _get_injected_delay(self):
+        with self._lock:
+            return self.latency + (self._random.uniform(0, self.latency_jitter) if self.latency_jitter else 0)
+
+    def _is_error_injected(self):
+        with self._lock:
+            return self.error_rate > 0 and self._random.random() < self.error_rate
+
+
+class _CopyOnWriteAccounts:
+    """
+    View of the accounts of the mock Horizon on which the operations of a transaction are applied. The
+    accounts are copied when first changed, and the changes are only kept on commit().
+    """
+
+    def __init__(self, accounts):
+        self._accounts = accounts
+        self._changed = {}
+
+    def __contains__(self, address):
+        return address in self._changed or address in self._accounts
+
+    def __setitem__(self, address, account):
+        self._changed[address] = account
+
+    def get_for_update(self, address):
+        account = self._changed.get(address)
+        if account is None:
+            account = self._accounts[address]
+            account = self._changed[address] = {
+                'sequence': account['sequence'],
+                'balances': OrderedDict((asset, list(balance)) for asset, balance in account['balances'].items())}
+        return account
+
+    def commit(self):
+        self._accounts.update(self._changed)
+
+
+class _MockHorizonHandler(BaseHTTPRequestHandler):
+    """
+    Routes the requests to the mock Horizon of the server, injecting the configured latency, errors and
+    rate limit.
+    """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def _handle(self):
+        horizon = self.server.horizon
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if self.command == 'POST':
+            length = int(self.headers.get('Content-Length') or 0)
+            query.update({key: values[0] for key, values in parse_qs(self.rfile.read(length).decode()).items()})
+        path = url.path.rstrip('/').split('/')[1:]
+        self._rate_limit_headers, exceeded = horizon._take_rate_limit()
+        self._request_name = '{} /{}'.format(self.command, '/'.join(
+            segment if i != 1 or path[0] != 'accounts' else '{address}' for i, segment in enumerate(path)))
+
+        delay = horizon._get_injected_delay()
+        if delay > 0:
+            time.sleep(delay)
+        if exceeded:
+            self._send_json(*_problem(PROBLEM_RATE_LIMIT_EXCEEDED, 'The rate limit of the requests was exceeded'))
+        elif horizon._is_error_injected():
+            self._send_json(*_problem(PROBLEM_SERVICE_UNAVAILABLE, 'Injected error'))
+        elif self.command == 'POST' and path == ['transactions']:
+            if 'tx' not in query:
+                self._send_json(*_problem(PROBLEM_TRANSACTION_MALFORMED, 'The tx parameter is missing'))
+            else:
+                self._send_json(*horizon.submit_transaction(query['tx']))
+        elif self.command == 'GET' and path == ['friendbot']:
+            self._handle_friendbot(horizon, query.get('addr'))
+        elif self.command == 'GET' and len(path) == 2 and path[0] == 'accounts':
+            account = horizon.get_account(path[1])
+            self._send_json(*((200, account) if account is not None
+                              else _problem(PROBLEM_NOT_FOUND, 'The account does not exist')))
+        elif self.command == 'GET' and len(path) == 3 and path[0] == 'accounts' and \
+                path[2] in ('payments', 'transactions'):
+            if 'text/event-stream' in self.headers.get('Accept', ''):
+                self._stream_records(horizon, path[1], path[2], query.get('cursor'))
+            else:
+                self._send_records_page(horizon, path[1], path[2], query)
+        else:
+            self._send_json(*_problem(PROBLEM_NOT_FOUND, 'Endpoint not supported by the mock Horizon'))
+
+    def _handle_friendbot(self, horizon, address):
+        if address is None or not is_address_valid(address):
+            self._send_json(*_problem(PROBLEM_BAD_REQUEST, 'A valid addr parameter is mandatory'))
+        elif not horizon.fund_account(address):
+            status, content = _problem(PROBLEM_TRANSACTION_FAILED, 'The account was already funded')
+            content['extras'] = {'result_codes': {'transaction': 'tx_failed', 'operations': ['op_already_exists']}}
+            self._send_json(status, content)
+        else:
+            self._send_json(200, {'hash': _get_friendbot_transaction_hash(address), 'ledger': horizon._ledger})
+
+    def _send_records_page(self, horizon, address, collection, query):
+        limit = query.get('limit', str(MOCK_HORIZON_DEFAULT_PAGE_SIZE))
+        order = query.get('order', HORIZON_ORDER_ASC)
+        if not is_int_str(limit) or not is_in_range(int(limit), 1, MOCK_HORIZON_MAX_PAGE_SIZE) or \
+                order not in (HORIZON_ORDER_ASC, HORIZON_ORDER_DESC):
+            self._send_json(*_problem(PROBLEM_BAD_REQUEST, 'Invalid limit or order'))
+            return
+        records = horizon.get_records(address, collection, query.get('cursor'), order, int(limit))
+        self._send_json(200, {'_links': {}, '_embedded': {'records': records}})
+
+    def _stream_records(self, horizon, address, collection, cursor):
+        """
+        Streams the records of an account collection as server-sent events, starting after the given cursor
+        and then as they are added, until the stream is idle for MOCK_HORIZON_STREAM_IDLE_SECONDS.
+        """
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self._send_extra_headers()
+        self.end_headers()
+        self.server.horizon._count_response(self._request_name, 200)
+        try:
+            self._write_chunk('retry: {}\nevent: open\ndata: "hello"\n\n'.format(
+                MOCK_HORIZON_STREAM_RETRY_MILLISECONDS))
+            with horizon._lock:
+                records_by_account = horizon._payments if collection == 'payments' else horizon._transactions
+                if cursor == HORIZON_STREAM_CURSOR_NOW:
+                    records = records_by_account.get(address, [])
+                    cursor = records[-1]['paging_token'] if records else '0'
+            idle_since = time.monotonic()
+            while time.monotonic() - idle_since < MOCK_HORIZON_STREAM_IDLE_SECONDS:
+                with horizon._lock:
+                    records = _get_records_page(records_by_account.get(address, []), cursor, HORIZON_ORDER_ASC, None)
+                    if not records and not horizon._closed:
+                        horizon._records_added.wait(MOCK_HORIZON_STREAM_POLL_SECONDS)
+                    if horizon._closed:
+                        break
+                for record in records:
+                    self._write_chunk('id: {}\ndata: {}\n\n'.format(record['paging_token'], json.dumps(record)))
+                    cursor = record['paging_token']
+                    idle_since = time.monotonic()
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.close_connection = True
+
+    def _write_chunk(self, text):
+        data = text.encode()
+        self.wfile.write('{:x}\r\n'.format(len(data)).encode() + data + b'\r\n')
+        self.wfile.flush()
+
+    def _send_json(self, status, content):
+        body = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/hal+json' if status == 200 else 'application/problem+json')
+        self.send_header('Content-Length', str(len(body)))
+        self._send_extra_headers()
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.horizon._count_response(self._request_name, status)
+
+    def _send_extra_headers(self):
+        for name, value in self._rate_limit_headers.items():
+            self.send_header(name, value)
+
+    def log_message(self, *args):
+        pass
+
+
+def _problem(problem, detail):
+    """
+    Creates the response of a Horizon problem.
+    :param tuple problem: Problem (status, type, title).
+    :param str detail: Problem details.
+    :return: Returns the HTTP status code and content of the response.
+    :rtype: (int, dict)
+    """
+    status, problem_type, title = problem
+    return status, {'type': MOCK_HORIZON_PROBLEM_TYPE_URL + problem_type, 'title': title, 'status': status,
+                    'detail': detail}
+
+
+def _get_records_page(records, cursor, order, limit):
+    """
+    Returns the records after the given cursor (paging token), in the given order.
+    """
+    if cursor == HORIZON_STREAM_CURSOR_NOW:
+        return []
+    if order == HORIZON_ORDER_DESC:
+        records = records[::-1]
+        if cursor is not None and is_int_str(cursor):
+            records = [record for record in records if int(record['paging_token']) < int(cursor)]
+    elif cursor is not None and is_int_str(cursor):
+        records = [record for record in records if int(record['paging_token']) > int(cursor)]
+    return records[:limit] if limit is not None else list(records)
+
+
+def _pack_transaction_result(fee_charged, code, results):
+    """
+    Packs a TransactionResult XDR.
+    :param int fee_charged: Fee charged, in stroops.
+    :param int code: Transaction result code.
+    :param list results: (outer result code, operation type, result code) of each operation, or None for the
+    transactions rejected before their operations are applied.
+    :return: Returns the base64 encoded XDR.
+    :rtype: str
+    """
+    xdr = struct.pack('>qi', fee_charged, code)
+    if code in (TX_SUCCESS, TX_FAILED):
+        xdr += struct.pack('>I', len(results))
+        for outer_code, operation_type, result_code in results:
+            xdr += struct.pack('>iii', outer_code, operation_type, result_code) if outer_code == OP_INNER \
+                else struct.pack('>i', outer_code)
+    return base64.b64encode(xdr + struct.pack('>i', 0)).decode()
+
+
+def _get_operation_type(operation):
+    """
+    Returns the XDR type of a supported operation.
+    :param Operation operation: Operation decoded by stellar_base.
+    :return: Returns the operation type or None if the operation type is not supported.
+    :rtype: int or None
+    """
+    from stellar_base.operation import ChangeTrust, CreateAccount, ManageData, Payment, SetOptions
+
+    for operation_class, operation_type in [(CreateAccount, OP_CREATE_ACCOUNT), (Payment, OP_PAYMENT),
+                                            (SetOptions, OP_SET_OPTIONS), (ChangeTrust, OP_CHANGE_TRUST),
+                                            (ManageData, OP_MANAGE_DATA)]:
+        if isinstance(operation, operation_class):
+            return operation_type
+    return None
+
+
+def _get_asset(asset):
+    """
+    Returns the (code, issuer) tuple of a stellar_base asset, with a None issuer for the native asset.
+    """
+    if asset.is_native():
+        return NATIVE_ASSET
+    return asset.code, _decode_address(asset.issuer)
+
+
+def _get_horizon_asset_fields(asset):
+    """
+    Returns the fields of a Horizon record identifying an asset.
+    """
+    code, issuer = asset
+    if issuer is None:
+        return {'asset_type': STELLAR_ASSET_TYPE_XLM}
+    return {'asset_type': _get_credit_asset_type(code), 'asset_code': code, 'asset_issuer': issuer}
+
+
+def _get_credit_asset_type(code):
+    return 'credit_alphanum4' if len(code) <= 4 else 'credit_alphanum12'
+
+
+def _decode_address(address):
+    return address.decode() if isinstance(address, (bytes, bytearray)) else address
+
+
+def _get_friendbot_transaction_hash(address):
+    """
+    Returns the hash of the Friendbot transaction funding an account.
+    """
+    return hashlib.sha256(address.encode()).hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in Horizon server of the Stellar network')
+    parser.add_argument('--host', default=MOCK_HORIZON_HOST, help='Address on which the server listens')
+    parser.add_argument('--port', type=int, default=8000, help='Port on which the server listens')
+    parser.add_argument('--latency', type=float, default=0, help='Delay, in seconds, of every response')
+    parser.add_argument('--latency-jitter', type=float, default=0,
+                        help='Maximum random delay, in seconds, added to the latency of each response')
+    parser.add_argument('--error-rate', type=float, default=0, help='Fraction of requests answered with HTTP 503')
+    parser.add_argument('--rate-limit', type=int, help='Maximum number of requests per rate limit window')
+    parser.add_argument('--rate-limit-window', type=float, default=MOCK_HORIZON_RATE_LIMIT_WINDOW_SECONDS,
+                        help='Duration, in seconds, of the rate limit window')
+    parser.add_argument('--seed', type=int, help='Seed of the random latency and errors, to reproduce a run')
+    args = parser.parse_args()
+
+    horizon = MockHorizon(args.latency, args.latency_jitter, args.error_rate, args.rate_limit,
+                          args.rate_limit_window, args.seed, args.host, args.port)
+    print('Mock Horizon listening on {} (stop it with ctrl+c)'.format(horizon.start()))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        horizon.stop()
+    for (request, status), count in sorted(horizon.request_counts.items()):
+        print('  {} {}: {}'.format(request, status, count))
+
+
+if __name__ == '__main__':
+    main()
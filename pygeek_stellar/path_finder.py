@@ -0,0 +1,424 @@
+# System imports
+import itertools
+import json
+import operator
+import threading
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+# Local imports
+from .constants import *
+from .stellar_queries import *
+from .utils.file import *
+
+STELLAR_MAX_PATH_LENGTH = 5  # Maximum number of intermediate assets of a path payment
+ORDER_BOOK_DEPTH = 200  # Offers fetched on each side of an order book (Horizon maximum)
+ORDER_BOOK_MAX_AGE_SECONDS = 30  # Age after which the order book of an asset pair is fetched again on refresh
+DEFAULT_ORDER_BOOKS_CONCURRENCY = 16
+DEFAULT_PAYMENT_PATHS_LIMIT = 5
+DEFAULT_DISCOVERED_ASSETS = 4  # Intermediate assets discovered by find_payment_paths
+OFFERS_PAGE_SIZE = 200  # Offers fetched on each side of an asset to discover the assets traded against it
+ORDER_BOOKS_SNAPSHOT_TAG = 'order_books'
+ORDER_BOOK_FETCHED_AT_TAG = 'fetched_at'
+
+# Offer selling an amount (in stroops) of an asset at a price of price_n / price_d units of the bought asset
+# per unit of the sold asset
+Offer = namedtuple('Offer', ['amount', 'price_n', 'price_d'])
+# Path payment found on the order books. The assets are (code, issuer) tuples, the amounts are in stroops and
+# path is the list of intermediate assets, as expected by create_path_payment_op()
+PaymentPath = namedtuple('PaymentPath', ['source_asset', 'source_amount', 'destination_asset',
+                                         'destination_amount', 'path'])
+
+
+class OrderBookGraph:
+    """
+    In-memory graph of the order books of the Stellar decentralized exchange, used to find the paths of
+    path payments locally instead of asking Horizon for them. Each asset is a node and each side of an
+    order book is an edge, holding its offers by best price first, so the amount obtained through an
+    edge takes the depth of the order book into account.
+
+    The order books are snapshots fetched from Horizon, which can be saved to and loaded from a file (so
+    paths can be found offline). Refreshing the graph only fetches the order books older than max_age,
+    replacing their edges in place.
+
+    Attributes
+    ----------
+    max_age : float
+        Age, in seconds, after which the order book of an asset pair is fetched again by refresh().
+    """
+
+    def __init__(self, max_age=ORDER_BOOK_MAX_AGE_SECONDS):
+        self.max_age = max_age
+        self._order_books = {}  # (base, counter) -> (fetch time, order book as returned by Horizon)
+        self._received = {}  # received asset -> {sent asset: offers selling the received asset for the sent one}
+        self._sent = {}  # sent asset -> {received asset: same offers as above}
+        self._lock = threading.Lock()
+
+    def get_asset_pairs(self):
+        """
+        Returns the asset pairs whose order books are on the graph.
+        :return: Returns a list of (base, counter) asset pairs.
+        :rtype: list of (tuple, tuple)
+        """
+        with self._lock:
+            return list(self._order_books)
+
+    def update_order_book(self, order_book, fetched_at=None):
+        """
+        Adds an order book to the graph, replacing the previous snapshot of the same asset pair.
+        :param dict order_book: Order book as returned by the Horizon /order_book endpoint. Its asks are
+        offers selling the base asset for the counter one, with their amount in the base asset. Its bids
+        are offers selling the counter asset for the base one, with their amount in the counter asset.
+        The prices are always given in units of the counter asset per unit of the base asset.
+        :param float fetched_at: Time (as returned by time.time()) at which the order book was fetched. If
+        None it is the current time.
+        :raises ValueError: If the order book is malformed.
+        """
+        try:
+            base = _get_horizon_asset(order_book['base'])
+            counter = _get_horizon_asset(order_book['counter'])
+            asks = [Offer(amount_to_stroops(ask['amount']), int(ask['price_r']['n']), int(ask['price_r']['d']))
+                    for ask in order_book.get('asks', [])]
+            bids = [Offer(amount_to_stroops(bid['amount']), int(bid['price_r']['d']), int(bid['price_r']['n']))
+                    for bid in order_book.get('bids', [])]
+        except (KeyError, TypeError) as e:
+            raise ValueError('Malformed order book: {}'.format(e))
+        if any(offer.price_n <= 0 or offer.price_d <= 0 for offer in itertools.chain(asks, bids)):
+            raise ValueError('Malformed order book: non positive price')
+
+        by_price = (lambda offer: offer.price_n / offer.price_d)
+        with self._lock:
+            self._order_books[(base, counter)] = (fetched_at if fetched_at is not None else time.time(), order_book)
+            self._set_offers(counter, base, sorted(asks, key=by_price))
+            self._set_offers(base, counter, sorted(bids, key=by_price))
+
+    def refresh(self, asset_pairs=None, concurrency=DEFAULT_ORDER_BOOKS_CONCURRENCY):
+        """
+        Fetches from Horizon the order books of the given asset pairs which are not on the graph or are
+        older than max_age. Several order books are fetched at the same time, up to the given concurrency.
+        The order books which could not be fetched keep their previous snapshot.
+        :param list asset_pairs: Asset pairs (base, counter) to be refreshed. If None all the asset pairs on
+        the graph are refreshed.
+        :param int concurrency: Maximum number of order books being fetched at the same time.
+        :return: Returns the number of fetched order books.
+        :rtype: int
+        """
+        now = time.time()
+        with self._lock:
+            asset_pairs = list(self._order_books) if asset_pairs is None else asset_pairs
+            stale_pairs = [pair for pair in asset_pairs if pair not in self._order_books
+                           or now - self._order_books[pair][0] > self.max_age]
+        if not stale_pairs:
+            return 0
+
+        n_fetched = 0
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, HORIZON_CONNECTION_POOL_SIZE))) as executor:
+            for (base, counter), (order_book, error) in zip(stale_pairs, executor.map(
+                    lambda pair: fetch_order_book(*pair), stale_pairs)):
+                if order_book is None:
+                    print('The {}/{} order book could not be fetched: {}'.format(format_asset(base),
+                                                                                 format_asset(counter), error))
+                    continue
+                try:
+                    self.update_order_book(order_book, now)
+                    n_fetched += 1
+                except ValueError as e:
+                    print('The {}/{} order book is invalid: {}'.format(format_asset(base), format_asset(counter), e))
+        return n_fetched
+
+    def add_assets(self, assets, concurrency=DEFAULT_ORDER_BOOKS_CONCURRENCY):
+        """
+        Fetches from Horizon the order books between every pair of the given assets which are not on the
+        graph or are older than max_age.
+        :param list assets: Assets (code, issuer) to be connected.
+        :param int concurrency: Maximum number of order books being fetched at the same time.
+        :return: Returns the number of fetched order books.
+        :rtype: int
+        """
+        with self._lock:
+            known_pairs = set(self._order_books)
+        asset_pairs = [(base, counter) if (counter, base) not in known_pairs else (counter, base)
+                       for base, counter in itertools.combinations(dict.fromkeys(assets), 2)]
+        return self.refresh(asset_pairs, concurrency)
+
+    def save(self, filename):
+        """
+        Saves the order books of the graph to a snapshot file.
+        :param str filename: File to which the snapshot is written.
+        :return: Returns True in case of success and False otherwise.
+        :rtype: bool
+        """
+        with self._lock:
+            order_books = [dict(order_book, **{ORDER_BOOK_FETCHED_AT_TAG: fetched_at})
+                           for fetched_at, order_book in self._order_books.values()]
+        return write_file(filename, json.dumps({ORDER_BOOKS_SNAPSHOT_TAG: order_books}))
+
+    def load(self, filename):
+        """
+        Loads the order books of a snapshot file (as written by save()) into the graph.
+        :param str filename: Snapshot file.
+        :return: Returns True in case of success and False otherwise.
+        :rtype: bool
+        """
+        content = decode_json_content(load_file(filename))
+        if not isinstance(content, dict) or not isinstance(content.get(ORDER_BOOKS_SNAPSHOT_TAG), list):
+            print('The order books file {} could not be read'.format(filename))
+            return False
+        try:
+            for order_book in content[ORDER_BOOKS_SNAPSHOT_TAG]:
+                self.update_order_book(order_book, order_book.get(ORDER_BOOK_FETCHED_AT_TAG))
+        except (AttributeError, ValueError) as e:
+            print('The order books file {} is invalid: {}'.format(filename, e))
+            return False
+        return True
+
+    def find_strict_receive_paths(self, source_asset, destination_asset, destination_amount,
+                                  max_path_length=STELLAR_MAX_PATH_LENGTH, limit=DEFAULT_PAYMENT_PATHS_LIMIT):
+        """
+        Finds the paths through which the given destination amount can be received for the least source
+        amount (the paths of a path payment operation, which has a fixed destination amount). The search
+        walks the graph backwards from the destination asset, computing at each asset the amount needed to
+        buy the amount needed by the following asset, and stops following an asset which was already
+        reached, with fewer intermediate assets, for a smaller or equal amount.
+        :param tuple source_asset: Asset (code, issuer) to be sent.
+        :param tuple destination_asset: Asset (code, issuer) to be received.
+        :param int destination_amount: Amount, in stroops, to be received.
+        :param int max_path_length: Maximum number of intermediate assets.
+        :param int limit: Maximum number of paths to be returned.
+        :return: Returns the found paths, by ascending source amount.
+        :rtype: list of PaymentPath
+        """
+        with self._lock:
+            paths = _find_paths(self._received, destination_asset, source_asset, destination_amount,
+                                _get_amount_to_send, max_path_length, is_better=operator.lt)
+        paths = [PaymentPath(source_asset, amount, destination_asset, destination_amount, path[::-1])
+                 for amount, path in paths]
+        return sorted(paths, key=lambda p: (p.source_amount, len(p.path)))[:limit]
+
+    def find_strict_send_paths(self, source_asset, source_amount, destination_asset,
+                               max_path_length=STELLAR_MAX_PATH_LENGTH, limit=DEFAULT_PAYMENT_PATHS_LIMIT):
+        """
+        Finds the paths through which the most destination amount is received for the given source amount.
+        The search walks the graph forwards from the source asset, computing at each asset the amount
+        bought with the amount obtained on the previous asset, and stops following an asset which was
+        already reached, with fewer intermediate assets, for a greater or equal amount.
+        :param tuple source_asset: Asset (code, issuer) to be sent.
+        :param int source_amount: Amount, in stroops, to be sent.
+        :param tuple destination_asset: Asset (code, issuer) to be received.
+        :param int max_path_length: Maximum number of intermediate assets.
+        :param int limit: Maximum number of paths to be returned.
+        :return: Returns the found paths, by descending destination amount.
+        :rtype: list of PaymentPath
+        """
+        with self._lock:
+            paths = _find_paths(self._sent, source_asset, destination_asset, source_amount,
+                                _get_amount_received, max_path_length, is_better=operator.gt)
+        paths = [PaymentPath(source_asset, source_amount, destination_asset, amount, path)
+                 for amount, path in paths]
+        return sorted(paths, key=lambda p: (-p.destination_amount, len(p.path)))[:limit]
+
+    def _set_offers(self, sent_asset, received_asset, offers):
+        """
+        Replaces the offers through which the received asset is bought with the sent asset.
+        :param tuple sent_asset: Asset (code, issuer) sent to the offers owners.
+        :param tuple received_asset: Asset (code, issuer) sold by the offers.
+        :param list offers: Offers by best price first. If empty the edge is removed.
+        """
+        if offers:
+            self._received.setdefault(received_asset, {})[sent_asset] = offers
+            self._sent.setdefault(sent_asset, {})[received_asset] = offers
+        else:
+            self._received.get(received_asset, {}).pop(sent_asset, None)
+            self._sent.get(sent_asset, {}).pop(received_asset, None)
+
+
+def fetch_order_book(base_asset, counter_asset):
+    """
+    Fetches from Horizon the order book of an asset pair.
+    :param tuple base_asset: Base asset (code, issuer).
+    :param tuple counter_asset: Counter asset (code, issuer).
+    :return: Returns the order book, as returned by Horizon, and None, or None and a description of the problem.
+    :rtype: (dict, None) or (None, str)
+    """
+    from stellar_base.exceptions import HorizonError
+
+    params = dict(_get_horizon_asset_params('selling', base_asset), **_get_horizon_asset_params('buying',
+                                                                                               counter_asset))
+    params['limit'] = ORDER_BOOK_DEPTH
+    try:
+        order_book = get_horizon().order_book(params=params)
+    except HorizonError as e:
+        return None, str(e)
+    if 'base' not in order_book:
+        return None, order_book.get('detail') or order_book.get('title') or 'Unexpected Horizon response'
+    return order_book, None
+
+
+def discover_traded_assets(assets, limit=DEFAULT_DISCOVERED_ASSETS, concurrency=DEFAULT_ORDER_BOOKS_CONCURRENCY):
+    """
+    Discovers the assets traded against the given ones on the Stellar decentralized exchange, as candidate
+    intermediate assets of the paths between them. A page of the offers selling and of the offers buying
+    each given asset is fetched from Horizon and the assets on the other side of the offers are ranked by
+    number of offers. Adding them to an OrderBookGraph along with the given assets connects the given
+    assets through up to two intermediate assets (one traded against each end of the path).
+    :param list assets: Assets (code, issuer) whose traded assets are discovered.
+    :param int limit: Maximum number of discovered assets.
+    :param int concurrency: Maximum number of offer pages being fetched at the same time.
+    :return: Returns the most offered assets, excluding the given ones.
+    :rtype: list of tuple
+    """
+    queries = [(side, asset) for asset in dict.fromkeys(assets) for side in ('selling', 'buying')]
+    counts = Counter()
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, HORIZON_CONNECTION_POOL_SIZE))) as executor:
+        for (side, asset), (offers, error) in zip(queries, executor.map(lambda query: fetch_offers(*query),
+                                                                         queries)):
+            if offers is None:
+                print('The offers {} {} could not be fetched: {}'.format(side, format_asset(asset), error))
+                continue
+            other_side = 'buying' if side == 'selling' else 'selling'
+            for offer in offers:
+                try:
+                    counts[_get_horizon_asset(offer[other_side])] += 1
+                except (KeyError, TypeError):
+                    continue
+    for asset in assets:
+        counts.pop(asset, None)
+    return [asset for asset, _ in counts.most_common(limit)]
+
+
+def fetch_offers(side, asset):
+    """
+    Fetches from Horizon a page of the offers selling or buying an asset.
+    :param str side: 'selling' to fetch the offers selling the asset or 'buying' to fetch the ones buying it.
+    :param tuple asset: Asset (code, issuer).
+    :return: Returns the offer records, as returned by Horizon, and None, or None and a description of the
+    problem.
+    :rtype: (list, None) or (None, str)
+    """
+    import requests
+
+    code, issuer = asset
+    params = {side: STELLAR_ASSET_TYPE_XLM if issuer is None else '{}:{}'.format(code, issuer),
+              'limit': OFFERS_PAGE_SIZE}
+    try:
+        response = get_horizon_session().get('{}/offers'.format(get_horizon_url()), params=params)
+        content = response.json()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        return None, str(e)
+    if response.status_code != 200 or not isinstance(content.get('_embedded', {}).get('records'), list):
+        return None, content.get('detail') or content.get('title') or 'Unexpected Horizon response'
+    return content['_embedded']['records'], None
+
+
+def _find_paths(edges, start_asset, end_asset, amount, get_next_amount, max_path_length, is_better):
+    """
+    Finds the paths between two assets, walking the graph breadth first, one asset of the path at a time.
+    Since the amount obtained through an edge only grows with the given amount, a walk reaching an asset
+    with an amount which is not better than the amount of a shorter walk through it cannot lead to a
+    better path, so it is not followed.
+    :param dict edges: Graph edges: asset -> {next asset: offers}.
+    :param tuple start_asset: Asset where the walk starts.
+    :param tuple end_asset: Asset where the walk ends.
+    :param int amount: Amount of the start asset.
+    :param get_next_amount: Function computing the amount of the next asset from the offers and the amount of
+    the current asset. It returns None if the offers cannot cover the amount.
+    :param int max_path_length: Maximum number of intermediate assets.
+    :param is_better: Function telling whether an amount is better than another.
+    :return: Returns a list of (end asset amount, intermediate assets from the start asset) tuples.
+    :rtype: list of (int, list)
+    """
+    if start_asset == end_asset:
+        return [(amount, [])]
+
+    paths = []
+    best_amounts = {start_asset: amount}
+    walks = [(start_asset, amount, [])]
+    for path_length in range(max_path_length + 1):
+        next_walks = {}  # asset -> (amount, path)
+        for asset, asset_amount, path in walks:
+            for next_asset, offers in edges.get(asset, {}).items():
+                if next_asset == start_asset or next_asset in path:
+                    continue
+                next_amount = get_next_amount(offers, asset_amount)
+                if next_amount is None:
+                    continue
+                if next_asset == end_asset:
+                    paths.append((next_amount, path))
+                elif path_length < max_path_length and \
+                        (next_asset not in best_amounts or is_better(next_amount, best_amounts[next_asset])) and \
+                        (next_asset not in next_walks or is_better(next_amount, next_walks[next_asset][0])):
+                    next_walks[next_asset] = (next_amount, path + [next_asset])
+        for next_asset, (next_amount, _) in next_walks.items():
+            best_amounts[next_asset] = next_amount
+        walks = [(next_asset, next_amount, path) for next_asset, (next_amount, path) in next_walks.items()]
+    return paths
+
+
+def _get_amount_to_send(offers, amount_to_receive):
+    """
+    Computes the amount to be sent to buy the given amount from the offers, taking the best priced first.
+    The amount paid to each offer is rounded up, in favour of the offer owner.
+    :param list offers: Offers by best price first.
+    :param int amount_to_receive: Amount, in stroops, to be bought.
+    :return: Returns the amount, in stroops, to be sent or None if the offers do not sell enough.
+    :rtype: int or None
+    """
+    remaining = amount_to_receive
+    amount_to_send = 0
+    for offer in offers:
+        bought = min(remaining, offer.amount)
+        amount_to_send += -(-bought * offer.price_n // offer.price_d)
+        remaining -= bought
+        if remaining == 0:
+            return amount_to_send
+    return None
+
+
+def _get_amount_received(offers, amount_to_send):
+    """
+    Computes the amount bought from the offers with the given amount, taking the best priced first. The
+    amount bought from each offer is rounded down, in favour of the offer owner.
+    :param list offers: Offers by best price first.
+    :param int amount_to_send: Amount, in stroops, to be sold.
+    :return: Returns the amount, in stroops, received or None if the offers do not buy the whole amount (or
+    if nothing is received).
+    :rtype: int or None
+    """
+    remaining = amount_to_send
+    amount_received = 0
+    for offer in offers:
+        offer_cost = -(-offer.amount * offer.price_n // offer.price_d)
+        if remaining < offer_cost:
+            return (amount_received + remaining * offer.price_d // offer.price_n) or None
+        amount_received += offer.amount
+        remaining -= offer_cost
+        if remaining == 0:
+            return amount_received
+    return None
+
+
+def _get_horizon_asset(record):
+    """
+    Returns the asset of a Horizon asset record.
+    :param dict record: Horizon asset record (with asset_type, asset_code and asset_issuer).
+    :return: Returns the asset (code, issuer).
+    :rtype: tuple
+    """
+    if record['asset_type'] == STELLAR_ASSET_TYPE_XLM:
+        return 'XLM', None
+    return record['asset_code'], record['asset_issuer']
+
+
+def _get_horizon_asset_params(prefix, asset):
+    """
+    Returns the Horizon query parameters identifying an asset.
+    :param str prefix: Parameters prefix (e.g. 'selling').
+    :param tuple asset: Asset (code, issuer).
+    :return: Returns the query parameters.
+    :rtype: dict
+    """
+    code, issuer = asset
+    if issuer is None:
+        return {prefix + '_asset_type': STELLAR_ASSET_TYPE_XLM}
+    return {prefix + '_asset_type': 'credit_alphanum4' if len(code) <= 4 else 'credit_alphanum12',
+            prefix + '_asset_code': code, prefix + '_asset_issuer': issuer}
@@ -1,6 +1,13 @@
+# System imports
+import argparse
+import os
+import sys
 # Local imports
 from .geek_stellar_cmd import GeekStellarCmd
 from .cli_session import *
+from .script import run_script
+from .utils.horizon import set_horizon_url
+from .utils.stellar import configure_address_details_cache
 
 
 def main():
@@ -8,19 +15,93 @@ def main():
     Entry point of pygeek-stellar tool. Prints the banner, initializes a
     CLI session and starts the pygeek-stellar CMD interpreter.
     """
+    args = parse_arguments()
+    if args.horizon_url is not None:
+        set_horizon_url(args.horizon_url)
+    if args.account_cache_ttl is not None:
+        configure_address_details_cache(args.account_cache_ttl)
+
+    if args.script is not None:
+        if args.account is None:
+            print("An account must be given (--account) to run a script")
+            sys.exit(1)
+        session = init_cli_session_from_account(args.account, os.environ.get(CONFIG_FILE_PASSWORD_ENV_VAR))
+        if not session:
+            sys.exit(1)
+        run_script_file(GeekStellarCmd(session, args.metrics_file), args.script, args.script_concurrency)
+        return
+
     print_banner()
 
-    session = init_cli_session()
+    if args.account is not None:
+        password = os.environ.get(CONFIG_FILE_PASSWORD_ENV_VAR)
+        if password is None and os.path.isfile(DEFAULT_KEYSTORE_FILE):
+            password = password_input("Please insert the configuration file decryption password")
+        session = init_cli_session_from_account(args.account, password)
+    else:
+        session = init_cli_session()
     if not session:
         print("No session could be initialized. Exiting..")
         return
 
-    cmd = GeekStellarCmd(session)
+    cmd = GeekStellarCmd(session, args.metrics_file)
     print_current_session_details(session)
     cmd.do_help(None)
     cmd.cmdloop()
 
 
+def parse_arguments():
+    """
+    Parses the pygeek-stellar command line arguments.
+    :return: Returns the parsed arguments.
+    :rtype: argparse.Namespace
+    """
+    parser = argparse.ArgumentParser(prog='pygeek-stellar', description='A Python CLI to interact with the '
+                                                                        'Stellar network.')
+    parser.add_argument('--horizon-url', help='Base URL of the Horizon server to be used. It can also be set with '
+                                              'the {} environment variable. Defaults to the Stellar Testnet '
+                                              'Horizon server.'.format(STELLAR_HORIZON_URL_ENV_VAR))
+    parser.add_argument('--account-cache-ttl', type=float, metavar='SECONDS',
+                        help='Time during which the fetched account details are reused by the following queries '
+                             'regarding the same account. Defaults to {} seconds.'
+                        .format(ACCOUNT_DETAILS_CACHE_TTL_SECONDS))
+    parser.add_argument('--account', metavar='NAME',
+                        help='Name or address of the account to be used, skipping the account selection prompts. '
+                             'The configuration file password is read from the {} environment variable, if set.'
+                        .format(CONFIG_FILE_PASSWORD_ENV_VAR))
+    parser.add_argument('--script', metavar='FILE',
+                        help='Runs the commands of the given file ({} for the standard input) with the prompts '
+                             'disabled, instead of starting the interactive interpreter. Requires --account.'
+                        .format(SCRIPT_STDIN))
+    parser.add_argument('--script-concurrency', type=int, default=DEFAULT_SCRIPT_CONCURRENCY, metavar='N',
+                        help='Maximum number of read-only script commands running at the same time. '
+                             'Defaults to {}.'.format(DEFAULT_SCRIPT_CONCURRENCY))
+    parser.add_argument('--metrics-file', metavar='FILE',
+                        help='Prometheus text file (e.g. on the node exporter textfile collector directory) to which '
+                             'the latency histograms of the commands are written after each command.')
+    return parser.parse_args()
+
+
+def run_script_file(cmd, script_file, concurrency):
+    """
+    Runs the commands of a script file.
+    :param GeekStellarCmd cmd: Command interpreter running the commands.
+    :param str script_file: Script file or SCRIPT_STDIN to read the script from the standard input.
+    :param int concurrency: Maximum number of read-only commands running at the same time.
+    """
+    if script_file == SCRIPT_STDIN:
+        run_script(cmd, sys.stdin, concurrency)
+        return
+
+    try:
+        file = open(script_file, FILE_MODE_READ)
+    except (OSError, IOError):
+        print("There was a problem opening/reading the file: {}".format(script_file))
+        sys.exit(1)
+    with file:
+        run_script(cmd, file, concurrency)
+
+
 def print_banner():
     """
     Prints the a pygeek-stellar banner in the Command Line Interface.
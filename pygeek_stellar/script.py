@@ -0,0 +1,146 @@
+# System imports
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+# Local imports
+from .constants import *
+from .utils.user_input import *
+
+
+class _ThreadCapturedOutput:
+    """
+    Replacement of sys.stdout which lets each thread capture its own output on a buffer. The output of
+    the threads not capturing it is written to the wrapped stream.
+
+    Attributes
+    ----------
+    stream : file
+        Stream to which the output not being captured is written.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._local = threading.local()
+
+    def start_capture(self):
+        """
+        Starts capturing the output of the current thread.
+        """
+        self._local.buffer = StringIO()
+
+    def stop_capture(self):
+        """
+        Stops capturing the output of the current thread.
+        :return: Returns the captured output.
+        :rtype: str
+        """
+        output = self._local.buffer.getvalue()
+        self._local.buffer = None
+        return output
+
+    def write(self, text):
+        buffer = getattr(self._local, 'buffer', None)
+        return (buffer if buffer is not None else self.stream).write(text)
+
+    def flush(self):
+        if getattr(self._local, 'buffer', None) is None:
+            self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def run_script(cmd, lines, concurrency=DEFAULT_SCRIPT_CONCURRENCY):
+    """
+    Runs the commands of a script without prompting the user: Yes/No questions are answered affirmatively
+    and commands requiring any other input are aborted. Consecutive read-only commands are run concurrently,
+    while any other command only runs after all the previous commands finished (and the following commands
+    only run after it). The output of each command is printed as a whole, in the script order, so the
+    output of concurrent commands is kept in memory until it is printed.
+    :param GeekStellarCmd cmd: Command interpreter running the commands.
+    :param lines: Iterable of script lines. Empty lines and lines starting with '#' are ignored.
+    :param int concurrency: Maximum number of read-only commands running at the same time.
+    """
+    set_prompts_enabled(False)
+    output = _ThreadCapturedOutput(sys.stdout)
+    sys.stdout = output
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            pending = []  # Outputs of the read-only commands not yet printed, in the script order
+            for line in lines:
+                line = line.strip()
+                if not line or line.startswith(SCRIPT_COMMENT_PREFIX):
+                    continue
+
+                if _is_read_only_command(cmd, line):
+                    pending.append(executor.submit(_run_captured_command, cmd, output, line))
+                    continue
+
+                _print_outputs(output, pending)
+                pending = []
+                if not _run_command(cmd, line):
+                    break
+            _print_outputs(output, pending)
+    finally:
+        sys.stdout = output.stream
+        set_prompts_enabled(True)
+
+
+def _is_read_only_command(cmd, line):
+    """
+    Checks if a script command is read-only, so it can run concurrently with the surrounding read-only commands.
+    :param GeekStellarCmd cmd: Command interpreter running the command.
+    :param str line: Command line.
+    :return: Returns True if the command is read-only and False otherwise.
+    :rtype: bool
+    """
+    command, *args = line.split()
+    if command in cmd.READ_ONLY_COMMANDS:
+        return True
+    return any(flag in args for flag in cmd.READ_ONLY_WITH_FLAGS_COMMANDS.get(command, []))
+
+
+def _run_command(cmd, line):
+    """
+    Runs a script command.
+    :param GeekStellarCmd cmd: Command interpreter running the command.
+    :param str line: Command line.
+    :return: Returns False if the script must be stopped (the command quits the program) and True otherwise.
+    :rtype: bool
+    """
+    try:
+        cmd.onecmd(line)
+    except PromptsDisabledError as e:
+        print("The command '{}' was aborted since it requires user input: {}".format(line, e))
+    except SystemExit:
+        return False
+    return True
+
+
+def _run_captured_command(cmd, output, line):
+    """
+    Runs a script command capturing its output.
+    :param GeekStellarCmd cmd: Command interpreter running the command.
+    :param _ThreadCapturedOutput output: Output capturing the command output.
+    :param str line: Command line.
+    :return: Returns the command output.
+    :rtype: str
+    """
+    output.start_capture()
+    try:
+        _run_command(cmd, line)
+    except Exception as e:
+        print("The command '{}' failed: {}".format(line, e))
+    return output.stop_capture()
+
+
+def _print_outputs(output, futures):
+    """
+    Waits for the given commands and prints their outputs.
+    :param _ThreadCapturedOutput output: Output of the script.
+    :param list futures: Futures of the captured outputs of the commands, in the script order.
+    """
+    for future in futures:
+        output.stream.write(future.result())
+    output.stream.flush()
@@ -0,0 +1,62 @@
+# System imports
+import threading
+
+
+class SequenceAllocator:
+    """
+    Hands out the sequence numbers of the transactions of several source accounts. The sequence
+    number of an account is only fetched from the network for its first transaction (or after a
+    resync), and then incremented locally for each following transaction. This allows building
+    and submitting several transactions back to back without querying the network before each one.
+    It is safe to be used from several threads.
+
+    Attributes
+    ----------
+    fetch_sequence : function
+        Function receiving an account address and returning its current sequence number (int),
+        or None if it could not be fetched.
+    """
+
+    def __init__(self, fetch_sequence):
+        self.fetch_sequence = fetch_sequence
+        self._sequences = {}  # address -> sequence number of the last allocated transaction
+        self._account_locks = {}  # address -> lock serializing the allocations of the account
+        self._lock = threading.Lock()
+
+    def allocate(self, address):
+        """
+        Allocates the sequence number of a new transaction of the given account.
+        :param str address: Address of the source account of the transaction.
+        :return: Returns the sequence number preceding the one of the new transaction (which is the value
+        expected by the stellar_base Builder), or None if the account sequence number could not be fetched.
+        :rtype: int or None
+        """
+        with self._get_account_lock(address):
+            sequence = self._sequences.get(address)
+            if sequence is None:
+                sequence = self.fetch_sequence(address)
+                if sequence is None:
+                    return None
+            self._sequences[address] = sequence + 1
+            return sequence
+
+    def resync(self, address):
+        """
+        Forgets the locally tracked sequence number of the given account, so it is fetched again from the
+        network on the next allocation. It must be called whenever an allocated sequence number was not
+        consumed by the network (e.g. the transaction was rejected with tx_bad_seq or never reached the
+        network).
+        :param str address: Address of the account.
+        """
+        with self._get_account_lock(address):
+            self._sequences.pop(address, None)
+
+    def _get_account_lock(self, address):
+        """
+        Returns the lock serializing the allocations of the given account.
+        :param str address: Address of the account.
+        :return: Returns the lock of the account.
+        :rtype: threading.Lock
+        """
+        with self._lock:
+            return self._account_locks.setdefault(address, threading.Lock())
@@ -1,5 +1,4 @@
-# 3rd party imports
-from stellar_base.operation import *
+# stellar_base is imported by each function, on first use, to keep the CLI startup fast
 
 
 def create_account_creation_op(destination, starting_balance, source=None):
@@ -12,6 +11,8 @@ def create_account_creation_op(destination, starting_balance, source=None):
         :return: Returns the newly created operation.
         :rtype: CreateAccount
         """
+        from stellar_base.operation import CreateAccount
+
         return CreateAccount(opts={
             'source': source,
             'destination': destination,
@@ -31,6 +32,9 @@ def create_payment_op(destination, amount, asset_code='XLM', asset_issuer=None,
     :return: Returns the newly created operation.
     :rtype: Payment
     """
+    from stellar_base.asset import Asset
+    from stellar_base.operation import Payment
+
     return Payment(opts={
         'source': source,
         'destination': destination,
@@ -58,6 +62,9 @@ def create_path_payment_op(destination, send_code, send_issuer, send_max, dest_c
         :return: Returns the newly created operation.
         :rtype: PathPayment
         """
+        from stellar_base.asset import Asset
+        from stellar_base.operation import PathPayment
+
         assets = []
         for p in path:
             assets.append(Asset(p[0], p[1]))
@@ -85,6 +92,9 @@ def create_trust_op(destination, code, limit=None, source=None):
     :return: Returns the newly created operation.
     :rtype: ChangeTrust
     """
+    from stellar_base.asset import Asset
+    from stellar_base.operation import ChangeTrust
+
     return ChangeTrust(opts={
         'source': source,
         'asset': Asset(code, destination),
@@ -1,51 +1,311 @@
-# 3rd party imports
+# System imports
+import json
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 # Local imports
+from .utils.generic import *
+from .utils.horizon import *
+from .utils.metrics import with_current_command
+from .utils.sse import *
 from .utils.stellar import *
 
+HORIZON_MAX_PAGE_SIZE = 200
+HORIZON_ORDER_ASC = 'asc'
+HORIZON_ORDER_DESC = 'desc'
+DEFAULT_BALANCES_CONCURRENCY = 16
+# Balances of several accounts: account addresses, assets (code, issuer), int64 matrix (a list of rows if NumPy is not
+# installed) with the stroops of each account (row) and asset (column), and the total stroops and number of holders
+# (accounts trusting it) of each asset
+BalancesAggregation = namedtuple('BalancesAggregation', ['accounts', 'assets', 'balances', 'totals', 'holders'])
+HORIZON_STREAM_CURSOR_NOW = 'now'  # Streams only the records created from now on
+HORIZON_STREAM_READ_TIMEOUT_SECONDS = 60  # An idle stream is reconnected after this time without any data
+HORIZON_STREAM_RETRY_SECONDS = 1  # Reconnection delay, unless Horizon specifies another one
+HORIZON_STREAM_MAX_RETRY_SECONDS = 30
+HORIZON_STREAM_MAX_FAILED_CONNECTIONS = 10
 
-def get_account_balances(account_address):
+
+def get_account_balances(account_address, fresh=False):
     """
     This method is used to fetch all the balances from the given account address.
     :param str account_address: Account address to be evaluated.
-    :return: Returns a list containing the account balances structured in the following manner
-    : [['token1', amount], ['token2', amount]]
-    :rtype: list of (str, str)
+    :param bool fresh: If True the account details cache is bypassed.
+    :return: Returns the exact balance, in stroops, of each asset held by the account, keyed by the asset
+    (code, issuer) and in the order given by Horizon, or None if the account could not be fetched. The issuer
+    of the native asset (XLM) is None: {('XLM', None): stroops, ('token', 'issuer'): stroops}
+    :rtype: OrderedDict or None
     """
-    address = get_address_details_from_network(account_address)
+    address = get_address_details_from_network(account_address, use_cache=not fresh)
     if address is None:
         return None
+    return _get_address_balances(address)
+
+
+def get_balances_many(account_addresses, concurrency=DEFAULT_BALANCES_CONCURRENCY, fresh=False):
+    """
+    This method is used to fetch the balances of several account addresses. The accounts are fetched
+    concurrently by a bounded number of workers, sharing the pooled Horizon connections. A failure to
+    fetch an account does not abort the fetching of the others.
+    :param list account_addresses: Account addresses to be evaluated.
+    :param int concurrency: Maximum number of accounts being fetched at the same time. It is bounded by the
+    size of the Horizon connection pool.
+    :param bool fresh: If True the account details cache is bypassed.
+    :return: Returns a list with an (address, balances, error) tuple for each account, in the same order as the
+    given addresses. The balances are structured as in get_account_balances(). In case of failure the balances
+    are None and the error describes the failure, otherwise the error is None.
+    :rtype: list of (str, OrderedDict or None, str or None)
+    """
+    concurrency = max(1, min(concurrency, HORIZON_CONNECTION_POOL_SIZE))
+
+    def get_balances(account_address):
+        address, error = query_address_details(account_address, use_cache=not fresh)
+        if address is None:
+            return account_address, None, error
+        return account_address, _get_address_balances(address), None
 
-    balances = []
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(with_current_command(get_balances), account_addresses))
+
+
+def _get_address_balances(address):
+    """
+    Extracts the balances of the given account details. The amounts are converted to stroops (instead of
+    floats, which cannot represent every 7 decimal places amount).
+    :param Address address: Account details fetched from the network.
+    :return: Returns the balance, in stroops, of each asset keyed by the asset (code, issuer).
+    :rtype: OrderedDict
+    """
+    balances = OrderedDict()
     for balance in address.balances:
-        token_code = balance.get('asset_code', 'XLM')
-        token_balance = float(balance.get('balance'))
-        balances.append([token_code, token_balance])
+        if balance.get('asset_type') == STELLAR_ASSET_TYPE_XLM:
+            asset = ('XLM', None)
+        else:
+            asset = (balance.get('asset_code'), balance.get('asset_issuer'))
+        balances[asset] = amount_to_stroops(balance.get('balance'))
     return balances
 
 
-def get_account_payments(account_address):
+def aggregate_balances(accounts_balances):
+    """
+    Aggregates the balances of several accounts (e.g. as fetched by get_balances_many()) into an accounts
+    by assets matrix of stroops, from which the total and number of holders of each asset are computed
+    with NumPy array operations. NumPy is optional: without it the matrix is a list of rows summed in Python.
+    :param accounts_balances: Iterable of (address, balances) pairs, with the balances structured as in
+    get_account_balances().
+    :return: Returns the aggregated balances.
+    :rtype: BalancesAggregation
+    """
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+
+    accounts = []
+    assets = OrderedDict()  # asset -> column
+    rows, columns, stroops = [], [], []
+    for address, balances in accounts_balances:
+        for asset, asset_stroops in balances.items():
+            rows.append(len(accounts))
+            columns.append(assets.setdefault(asset, len(assets)))
+            stroops.append(asset_stroops)
+        accounts.append(address)
+
+    if numpy is None:
+        matrix = [[0] * len(assets) for _ in accounts]
+        held = [0] * len(assets)
+        for row, column, value in zip(rows, columns, stroops):
+            matrix[row][column] = value
+            held[column] += 1
+        totals = [sum(values) for values in zip(*matrix)] if accounts else [0] * len(assets)
+        return BalancesAggregation(accounts, list(assets), matrix, totals, held)
+
+    matrix = numpy.zeros((len(accounts), len(assets)), dtype=numpy.int64)
+    matrix[rows, columns] = stroops
+    held = numpy.zeros(matrix.shape, dtype=bool)
+    held[rows, columns] = True
+
+    # Each balance fits in an int64, but the total of an asset may not: those are summed as Python integers
+    overflowing = matrix.max(axis=0, initial=0).astype(object) * len(accounts) > STELLAR_AMOUNT_MAX_STROOPS
+    totals = [int(total) for total in matrix.sum(axis=0)]
+    for column in numpy.flatnonzero(overflowing):
+        totals[column] = sum(int(value) for value in matrix[:, column])
+    return BalancesAggregation(accounts, list(assets), matrix, totals, held.sum(axis=0).tolist())
+
+
+def iter_account_payments(account_address, limit=None, order=HORIZON_ORDER_ASC, since=None, cursor=None):
     """
-    This method is used to fetch all the payments from the given account address.
+    This method is used to iterate over the payments of the given account address. The payments are fetched
+    page by page, following the paging token of the last received payment, so the whole payments history
+    can be walked through while only keeping a single page in memory.
     :param str account_address: Account address to be evaluated.
-    :return: Returns a JSON string with the payments. TODO: The string must be parsed
-    :rtype: str
+    :param int limit: Maximum number of payments to be returned. If None all the payments are returned.
+    :param str order: Order in which the payments are returned ('asc' or 'desc').
+    :param datetime since: If specified only the payments created since this (UTC) date are returned.
+    :param str cursor: Paging token after which the payments are returned.
+    :return: Returns a generator of payment records, as returned by Horizon.
+    :rtype: generator of dict
+    :raises HorizonError: If a page could not be fetched from Horizon.
     """
-    address = get_address_details_from_network(account_address)
-    if address is None:
-        return None
+    return _iter_account_records(get_horizon().account_payments, account_address, limit, order, since, cursor)
+
+
+def iter_account_transactions(account_address, limit=None, order=HORIZON_ORDER_ASC, since=None, cursor=None):
+    """
+    This method is used to iterate over the transactions of the given account address. The transactions are
+    fetched page by page, following the paging token of the last received transaction, so the whole
+    transactions history can be walked through while only keeping a single page in memory.
+    :param str account_address: Account address to be evaluated.
+    :param int limit: Maximum number of transactions to be returned. If None all the transactions are returned.
+    :param str order: Order in which the transactions are returned ('asc' or 'desc').
+    :param datetime since: If specified only the transactions created since this (UTC) date are returned.
+    :param str cursor: Paging token after which the transactions are returned.
+    :return: Returns a generator of transaction records, as returned by Horizon.
+    :rtype: generator of dict
+    :raises HorizonError: If a page could not be fetched from Horizon.
+    """
+    return _iter_account_records(get_horizon().account_transactions, account_address, limit, order, since, cursor)
 
-    return address.payments()
 
+def _iter_account_records(fetch_page, account_address, limit, order, since, cursor):
+    """
+    Iterates over the records of a Horizon account collection endpoint, following the paging tokens.
+    When iterating in ascending order with a 'since' date the older records still have to be walked
+    through (and are skipped) since Horizon cannot be queried by date. In descending order the iteration
+    stops at the first record older than the 'since' date.
+    :param fetch_page: Horizon client method fetching a page of the collection.
+    :param str account_address: Account address to be evaluated.
+    :param int limit: Maximum number of records to be returned. If None all the records are returned.
+    :param str order: Order in which the records are returned ('asc' or 'desc').
+    :param datetime since: If specified only the records created since this (UTC) date are returned.
+    :param str cursor: Paging token after which the records are returned.
+    :return: Returns a generator of records.
+    :rtype: generator of dict
+    """
+    from stellar_base.exceptions import HorizonError
 
-def get_account_transactions(account_address):
+    n_records = 0
+    while limit is None or n_records < limit:
+        page_size = HORIZON_MAX_PAGE_SIZE if limit is None else min(HORIZON_MAX_PAGE_SIZE, limit - n_records)
+        params = {'order': order, 'limit': page_size}
+        if cursor is not None:
+            params['cursor'] = cursor
+        page = fetch_page(account_address, params=params)
+        records = page.get('_embedded', {}).get('records')
+        if records is None:
+            raise HorizonError(page.get('detail') or page.get('title') or 'Unexpected Horizon response')
+
+        for record in records:
+            cursor = record.get('paging_token')
+            created_at = parse_iso_datetime(record.get('created_at'))
+            if since is not None and created_at is not None and created_at < since:
+                if order == HORIZON_ORDER_DESC:
+                    return
+                continue
+            yield record
+            n_records += 1
+            if limit is not None and n_records >= limit:
+                return
+
+        if len(records) < page_size:
+            return
+
+
+def watch_account_payments(account_address, cursor=HORIZON_STREAM_CURSOR_NOW, limit=None):
     """
-    This method is used to fetch all the transactions from the given account address.
+    This method is used to watch the payments of the given account address as they happen. Instead of
+    polling, the payments are received through the Horizon server-sent events stream, so each payment is
+    yielded as soon as Horizon sees it. Whenever the stream is closed it is reconnected from the paging
+    token of the last received payment, so no payment is lost or received twice.
     :param str account_address: Account address to be evaluated.
-    :return: Returns a JSON string with the transactions. TODO: The string must be parsed
-    :rtype: str
+    :param str cursor: Paging token after which the payments are returned. By default only the payments
+    created from now on are returned.
+    :param int limit: Maximum number of payments to be returned. If None the payments are watched forever.
+    :return: Returns a generator of payment records, as returned by Horizon.
+    :rtype: generator of dict
+    :raises HorizonError: If Horizon rejects the stream request or could not be reached after several
+    consecutive attempts.
     """
-    address = get_address_details_from_network(account_address)
-    if address is None:
-        return None
+    url = '{}/accounts/{}/payments'.format(get_horizon_url(), account_address)
+    return _watch_records(url, cursor, limit)
+
+
+def _watch_records(url, cursor, limit):
+    """
+    Watches the records of a Horizon streaming endpoint, reconnecting the stream from the paging token
+    of the last received record whenever it is closed. Every reconnection waits at least the retry delay
+    suggested by Horizon. Failed connections, and streams closed (or dropped) without delivering any record,
+    are retried with an exponential backoff starting at that delay and count towards the limit of consecutive
+    failures, so a server closing every stream right away is not reconnected to in a tight loop. Streams idle
+    for the whole read timeout are not failures, since the account may just have no new records.
+    :param str url: URL of the Horizon streaming endpoint.
+    :param str cursor: Paging token after which the records are returned.
+    :param int limit: Maximum number of records to be returned. If None the records are watched forever.
+    :return: Returns a generator of records.
+    :rtype: generator of dict
+    """
+    import requests
+    from stellar_base.exceptions import HorizonError
+
+    n_records = 0
+    n_failed_connections = 0
+    retry_seconds = HORIZON_STREAM_RETRY_SECONDS
+    while limit is None or n_records < limit:
+        error = None
+        established = False
+        n_connection_records = 0
+        try:
+            with get_horizon_session().get(url, params={'cursor': cursor}, headers={'Accept': 'text/event-stream'},
+                                           stream=True,
+                                           timeout=(HORIZON_TIMEOUT_SECONDS[0],
+                                                    HORIZON_STREAM_READ_TIMEOUT_SECONDS)) as response:
+                if response.status_code != 200:
+                    if response.status_code not in HORIZON_TRANSIENT_HTTP_STATUS_CODES:
+                        raise HorizonError('Horizon responded with HTTP status code {}'.format(response.status_code))
+                    error = 'HTTP status code {}'.format(response.status_code)
+                else:
+                    established = True
+                    # Chunks are yielded as soon as they are received, instead of filling a buffer of a given size
+                    for event in iter_server_sent_events(response.iter_content(chunk_size=None)):
+                        if event.retry is not None:
+                            retry_seconds = event.retry / 1000
+                        if event.data is None or not event.data.startswith('{'):  # e.g. the initial "hello"
+                            continue
+                        record = json.loads(event.data)
+                        cursor = record.get('paging_token') or event.id or cursor
+                        yield record
+                        n_records += 1
+                        n_connection_records += 1
+                        if limit is not None and n_records >= limit:
+                            return
+                    error = 'The stream was closed by Horizon'
+        except requests.exceptions.RequestException as e:
+            if established and n_connection_records == 0 and _is_read_timeout(e):
+                time.sleep(retry_seconds)  # Idle for the whole read timeout, which is not a failure
+                continue
+            error = str(e) if not established else 'The stream connection was lost: {}'.format(e)
+        except ValueError as e:
+            error = 'Invalid event received: {}'.format(e)
+
+        if n_connection_records > 0:
+            n_failed_connections = 0
+            time.sleep(retry_seconds)
+            continue
+        n_failed_connections += 1
+        if n_failed_connections >= HORIZON_STREAM_MAX_FAILED_CONNECTIONS:
+            raise HorizonError('The Horizon stream could not be established: {}'.format(error))
+        time.sleep(min(HORIZON_STREAM_MAX_RETRY_SECONDS, retry_seconds * 2 ** (n_failed_connections - 1)))
+
+
+def _is_read_timeout(exception):
+    """
+    Checks if a requests exception was raised by a read timeout. While the content of a response is being
+    streamed, requests reports read timeouts as connection errors wrapping the urllib3 read timeout.
+    :param RequestException exception: Exception to be evaluated.
+    :return: Returns True if the exception was raised by a read timeout and False otherwise.
+    :rtype: bool
+    """
+    import requests
+    from urllib3.exceptions import ReadTimeoutError
 
-    return address.transactions()
+    return isinstance(exception, requests.exceptions.ReadTimeout) or \
+        any(isinstance(arg, ReadTimeoutError) for arg in exception.args)
@@ -1,18 +1,54 @@
 # System imports
-import requests
 import base64
-# 3rd party imports
-from stellar_base.operation import *
-from stellar_base.builder import Builder
-from stellar_base.stellarxdr import Xdr
-from stellar_base.stellarxdr import StellarXDR_const
-from xdrlib import Error as XDRError
+import itertools
+import os
+import struct
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+# 3rd party imports are done on first use (requests, stellar_base and its XDR modules take longer to
+# import than the CLI takes to start)
 # Local imports
+from .utils.metrics import *
 from .utils.stellar import *
 from .utils.user_input import *
 from .constants import *
 from .utils.generic import *
+from .utils.file import *
 from .stellar_operations import *
+from .sequence_allocator import SequenceAllocator
+
+BatchPayment = namedtuple('BatchPayment', ['line_number', 'destination', 'asset_code', 'asset_issuer',
+                                           'amount', 'memo'])
+# Decoded transaction result: Horizon result code (e.g. 'tx_failed'), whether it succeeded, fee charged in stroops
+# and the OperationResultDetails of each operation
+TransactionResultDetails = namedtuple('TransactionResultDetails', ['code', 'successful', 'fee_charged', 'operations'])
+# Decoded operation result: position on the transaction, operation type (e.g. 'payment'), Horizon result code
+# (e.g. 'op_underfunded'), whether it succeeded and the unpacked XDR result of the operation type (only for the
+# operation types whose result has fields other than the result code, e.g. path payments, and None otherwise)
+OperationResultDetails = namedtuple('OperationResultDetails', ['index', 'type', 'code', 'successful', 'result'])
+STELLAR_TX_SUCCESS_RESULT_CODE = 'tx_success'
+STELLAR_TX_FAILED_RESULT_CODE = 'tx_failed'
+STELLAR_TX_BAD_SEQ_RESULT_CODE = 'tx_bad_seq'
+SEQUENCE_CONSUMING_RESULT_CODES = [STELLAR_TX_SUCCESS_RESULT_CODE, STELLAR_TX_FAILED_RESULT_CODE]
+SUBMIT_BAD_SEQUENCE_ATTEMPTS = 2
+MAX_CHANNEL_ACCOUNTS = HORIZON_CONNECTION_POOL_SIZE  # One transaction in flight per channel, each on its own connection
+# XDR operation type, attribute of its result on the OperationResult, prefix of its result codes and whether
+# its result is made only of the result code
+_OPERATION_RESULT_TYPES = [('CREATE_ACCOUNT', 'createAccountResult', 'CREATE_ACCOUNT_', True),
+                           ('PAYMENT', 'paymentResult', 'PAYMENT_', True),
+                           ('PATH_PAYMENT', 'pathPaymentResult', 'PATH_PAYMENT_', False),
+                           ('MANAGE_OFFER', 'manageOfferResult', 'MANAGE_OFFER_', False),
+                           ('CREATE_PASSIVE_OFFER', 'createPassiveOfferResult', 'MANAGE_OFFER_', False),
+                           ('SET_OPTIONS', 'setOptionsResult', 'SET_OPTIONS_', True),
+                           ('CHANGE_TRUST', 'changeTrustResult', 'CHANGE_TRUST_', True),
+                           ('ALLOW_TRUST', 'allowTrustResult', 'ALLOW_TRUST_', True),
+                           ('ACCOUNT_MERGE', 'accountMergeResult', 'ACCOUNT_MERGE_', False),
+                           ('INFLATION', 'inflationResult', 'INFLATION_', False),
+                           ('MANAGE_DATA', 'manageDataResult', 'MANAGE_DATA_', True)]
+_xdr_result_codes = None  # Built on first use by _get_xdr_result_codes()
+_xdr_unpackers = threading.local()  # XDR unpacker of each thread, see _get_xdr_unpacker()
 
 
 def create_new_account(source_account_address, source_account_seed, new_account_address, amount, transaction_memo=''):
@@ -41,11 +77,100 @@ def create_new_account(source_account_address, source_account_seed, new_account_
                        .format(amount, new_account_address)) == USER_INPUT_NO:
         return
 
-    op = create_account_creation_op(new_account_address, amount, source_account_address)
-    response = submit_operations(source_account_seed, op, transaction_memo)
+    operations = [create_account_creation_op(new_account_address, amount, source_account_address)]
+    response = submit_operations(source_account_seed, operations, transaction_memo)
     # process_server_payment_response(response) # TODO: Parse response
 
 
+def create_channel_accounts(source_account_address, source_account_seed, channel_addresses, starting_balance):
+    """
+    This method creates the channel accounts used to submit transactions in parallel on behalf of the
+    source account (see submit_operations_through_channels()). All the channel accounts are created
+    and funded by the source account using a single transaction.
+    :param str source_account_address: Address of the account funding the channel accounts.
+    :param str source_account_seed: Seed of the account funding the channel accounts.
+    :param list channel_addresses: Addresses of the channel accounts to be created.
+    :param str starting_balance: XLM amount to transfer to each channel account.
+    :return: Returns True if the channel accounts were created and False otherwise.
+    :rtype: bool
+    """
+    if not is_seed_matching_address(source_account_seed, source_account_address):
+        print("The channel accounts could not be created. Either the given source account address or source "
+              "account seed are invalid or they do not match.")
+        return False
+
+    if not 0 < len(channel_addresses) <= MAX_CHANNEL_ACCOUNTS:
+        print('Between 1 and {} channel accounts can be created'.format(MAX_CHANNEL_ACCOUNTS))
+        return False
+
+    if not is_stellar_amount_valid(starting_balance):
+        print('The given starting balance is invalid')
+        return False
+
+    if yes_or_no_input('To create {} channel accounts, a payment of {} XLM will be done to each one of them. '
+                       'Are you sure you want to proceed?'
+                       .format(len(channel_addresses), starting_balance)) == USER_INPUT_NO:
+        return False
+
+    operations = [create_account_creation_op(address, starting_balance, source_account_address)
+                  for address in channel_addresses]
+    response = submit_operations(source_account_seed, operations, '')
+    if not is_successful_submit_response(response):
+        print('The channel accounts could not be created')
+        process_server_payment_response(response)
+        return False
+    return True
+
+
+def create_new_accounts(source_account_address, source_account_seed, new_account_addresses, starting_balance,
+                        channel_seeds=None):
+    """
+    This method creates several new Stellar accounts, funding each one of them with the same XLM amount.
+    The account creations are packed into transactions of up to 100 operations, which are submitted in
+    parallel if channel accounts are given.
+    :param str source_account_address: Address of the account funding the new accounts.
+    :param str source_account_seed: Seed of the account funding the new accounts.
+    :param list new_account_addresses: Addresses of the accounts to be created.
+    :param str starting_balance: XLM amount to transfer to each new account.
+    :param list channel_seeds: Seeds of the channel accounts used to submit the transactions. It can be None.
+    :return: Returns the number of created accounts or None if no account creation was attempted.
+    :rtype: int or None
+    """
+    if not is_seed_matching_address(source_account_seed, source_account_address):
+        print("The new accounts could not be created. Either the given source account address or source "
+              "account seed are invalid or they do not match.")
+        return None
+
+    if not is_stellar_amount_valid(starting_balance):
+        print('The given starting balance is invalid')
+        return None
+
+    if yes_or_no_input('To create {} new accounts, a payment of {} XLM will be done to each one of them. '
+                       'Are you sure you want to proceed?'
+                       .format(len(new_account_addresses), starting_balance)) == USER_INPUT_NO:
+        return None
+
+    groups = [new_account_addresses[i:i + STELLAR_MAX_OPERATIONS_PER_TRANSACTION]
+              for i in range(0, len(new_account_addresses), STELLAR_MAX_OPERATIONS_PER_TRANSACTION)]
+    transactions = (([create_account_creation_op(address, starting_balance, source_account_address)
+                      for address in group], '') for group in groups)
+    if channel_seeds:
+        responses = submit_operations_through_channels(source_account_seed, channel_seeds, transactions)
+    else:
+        responses = (submit_operations(source_account_seed, operations, memo) for operations, memo in transactions)
+
+    n_created = 0
+    for i, (group, response) in enumerate(zip(groups, responses)):
+        if is_successful_submit_response(response):
+            n_created += len(group)
+        else:
+            print('Transaction {}/{} (accounts {} to {}) failed'.format(
+                i + 1, len(groups), i * STELLAR_MAX_OPERATIONS_PER_TRANSACTION + 1,
+                i * STELLAR_MAX_OPERATIONS_PER_TRANSACTION + len(group)))
+            process_server_payment_response(response)
+    return n_created
+
+
 def fund_using_friendbot(account_address):
     """
     This method is used to request the Stellar Friendbot to fund the given account
@@ -54,15 +179,17 @@ def fund_using_friendbot(account_address):
     :return: Returns a string with the result of the fund request.
     :rtype: str
     """
+    import requests
+
     if not is_address_valid(account_address):
         return 'The given account address is invalid.'
 
     try:
-        r = requests.get('{}/friendbot?addr={}'.format(STELLAR_HORIZON_TESTNET_URL, account_address))
+        r = get_horizon_session().get('{}/friendbot'.format(get_horizon_url()), params={'addr': account_address})
         return 'Successful transaction request' if is_successful_http_status_code(r.status_code) \
             else 'Failed transaction request (Maybe this account was already funded by Friendbot). Status code {}'.\
             format(r.status_code)
-    except requests.exceptions.ConnectionError:
+    except requests.exceptions.RequestException:
         return "A connection error occurred (Please check your Internet connection)"
 
 
@@ -109,6 +236,240 @@ def send_payment(source_account_address, source_account_seed, destination_accoun
     process_server_payment_response(response)
 
 
+def send_batch_payments(source_account_address, source_account_seed, payments_file, channel_seeds=None):
+    """
+    This method is used to send all the payments listed on a CSV file. The file must have a header
+    line with a 'destination' and an 'amount' column, and may also have an 'asset' column (either
+    'XLM' or 'CODE:ISSUER') and a 'memo' column. Instead of submitting one transaction per payment,
+    the payments are packed into transactions of up to 100 operations. Since a memo belongs to the
+    whole transaction, only consecutive payments sharing the same memo are packed together.
+    The file is read twice (once to validate it and once to submit it) so that it never has to be
+    fully loaded to memory. Nothing is submitted if any of the rows is invalid. If channel accounts
+    are given, the transactions are submitted in parallel through them.
+    :param str source_account_address: Address of the account from which the funds will be sent.
+    :param str source_account_seed: Seed of the account from which the funds will be sent.
+    :param str payments_file: CSV file with the payments to be sent.
+    :param list channel_seeds: Seeds of the channel accounts used to submit the transactions. It can be None.
+    """
+    if not is_seed_matching_address(source_account_seed, source_account_address):
+        print("The payments could not be finalized. Either the given source account address or source"
+              "account seed are invalid or they do not match.")
+        return
+
+    if not os.path.isfile(payments_file):
+        print('The given payments file does not exist')
+        return
+
+    summary = _summarize_batch_payments(payments_file, source_account_address)
+    if summary is None:
+        return
+    n_payments, n_transactions, totals = summary
+    if n_payments == 0:
+        print('No payments were found on the given file')
+        return
+
+    totals_str = ', '.join('{} {}'.format(total, format_asset(asset)) for asset, total in totals.items())
+    if yes_or_no_input('{} payments ({}) will be done using {} transactions. Are you sure you want to proceed?'
+                       .format(n_payments, totals_str, n_transactions)) == USER_INPUT_NO:
+        return
+
+    failed_lines = []
+    payments = (payment for _, payment, _ in read_batch_payments_file(payments_file, source_account_address))
+    # The groups are consumed both to build the transactions and to report their results. The results
+    # lag behind the submitted transactions by at most one round of channels, which bounds the groups
+    # buffered by tee().
+    submitted_groups, reported_groups = itertools.tee(group_batch_payments(payments))
+    transactions = ((_create_batch_payment_operations(transaction_payments, source_account_address), memo)
+                    for memo, transaction_payments in submitted_groups)
+    if channel_seeds:
+        responses = submit_operations_through_channels(source_account_seed, channel_seeds, transactions)
+    else:
+        responses = (submit_operations(source_account_seed, operations, memo) for operations, memo in transactions)
+
+    for i, ((_, transaction_payments), response) in enumerate(zip(reported_groups, responses)):
+        lines = '{}-{}'.format(transaction_payments[0].line_number, transaction_payments[-1].line_number)
+        if is_successful_submit_response(response):
+            print('Transaction {}/{} (file lines {}) succeeded'.format(i + 1, n_transactions, lines))
+        else:
+            print('Transaction {}/{} (file lines {}) failed'.format(i + 1, n_transactions, lines))
+            process_server_payment_response(response, ['File line {}'.format(payment.line_number)
+                                                       for payment in transaction_payments])
+            failed_lines.append(lines)
+
+    print('{} of {} transactions succeeded'.format(n_transactions - len(failed_lines), n_transactions))
+    if failed_lines:
+        print('The payments on the following file lines were not done: {}'.format(', '.join(failed_lines)))
+
+
+def sign_batch_payments_offline(source_account_address, source_account_seed, payments_file, sequence, output_file):
+    """
+    This method builds and signs the transactions of a batch payments CSV file (see send_batch_payments())
+    without any network access, so it can be run on an offline signer. Since the sequence number of the
+    source account cannot be fetched, it must be given: the transactions use the following sequence numbers,
+    in the file order. The signed transaction envelopes are written as JSON lines (NDJSON) to the output file,
+    ready to be submitted later on (see submit_envelopes).
+    :param str source_account_address: Address of the account from which the funds will be sent.
+    :param str source_account_seed: Seed of the account from which the funds will be sent.
+    :param str payments_file: CSV file with the payments to be sent.
+    :param int sequence: Current sequence number of the source account.
+    :param str output_file: NDJSON file to which the signed transaction envelopes are written.
+    :return: Returns the number of signed transactions or None if they could not be signed.
+    :rtype: int or None
+    """
+    from stellar_base.keypair import Keypair
+
+    if not is_seed_matching_address(source_account_seed, source_account_address):
+        print("The payments could not be signed. Either the given source account address or source "
+              "account seed are invalid or they do not match.")
+        return None
+
+    if not os.path.isfile(payments_file):
+        print('The given payments file does not exist')
+        return None
+
+    if _summarize_batch_payments(payments_file, source_account_address) is None:
+        return None
+
+    signers = [Keypair.from_seed(source_account_seed)]
+    payments = (payment for _, payment, _ in read_batch_payments_file(payments_file, source_account_address))
+
+    def signed_envelopes():
+        for i, (memo, transaction_payments) in enumerate(group_batch_payments(payments)):
+            operations = _create_batch_payment_operations(transaction_payments, source_account_address)
+            envelope = build_transaction_envelope(source_account_address, sequence + i, operations, memo, signers)
+            yield {
+                SIGNED_ENVELOPE_LINES_TAG: '{}-{}'.format(transaction_payments[0].line_number,
+                                                          transaction_payments[-1].line_number),
+                SIGNED_ENVELOPE_SOURCE_TAG: source_account_address,
+                SIGNED_ENVELOPE_SEQUENCE_TAG: sequence + i + 1,
+                SIGNED_ENVELOPE_HASH_TAG: envelope.hash_meta().hex(),
+                SIGNED_ENVELOPE_XDR_TAG: envelope.xdr().decode()}
+
+    return write_ndjson_file(output_file, signed_envelopes())
+
+
+def _create_batch_payment_operations(payments, source_account_address):
+    """
+    Creates the payment operations of a transaction of a batch payments file.
+    :param list payments: Payments of the transaction (BatchPayment).
+    :param str source_account_address: Address of the account from which the funds will be sent.
+    :return: Returns the payment operations.
+    :rtype: list of Payment
+    """
+    return [create_payment_op(destination=payment.destination,
+                              amount=payment.amount,
+                              asset_code=payment.asset_code,
+                              asset_issuer=payment.asset_issuer,
+                              source=source_account_address) for payment in payments]
+
+
+def read_batch_payments_file(payments_file, source_account_address):
+    """
+    Lazily reads and validates the payments of a batch payments CSV file.
+    :param str payments_file: CSV file with the payments.
+    :param str source_account_address: Address of the account from which the funds will be sent. Payments
+    to this address are considered invalid.
+    :return: Returns a generator of (line_number, payment, error) tuples. For valid rows the error is None
+    while for invalid rows the payment is None and the error describes the problem.
+    :rtype: generator of (int, BatchPayment or None, str or None)
+    """
+    for line_number, row in read_csv_file(payments_file):
+        payment, error = _parse_batch_payment_row(line_number, row, source_account_address)
+        yield line_number, payment, error
+
+
+def group_batch_payments(payments, max_operations=STELLAR_MAX_OPERATIONS_PER_TRANSACTION):
+    """
+    Groups consecutive payments into transactions. A new transaction is started whenever the
+    current one reaches the maximum number of operations or the memo of the payment changes.
+    :param payments: Iterable of payments to be grouped.
+    :param int max_operations: Maximum number of payments per transaction.
+    :return: Returns a generator of (memo, payments) tuples, one for each transaction.
+    :rtype: generator of (str, list of BatchPayment)
+    """
+    group = []
+    for payment in payments:
+        if group and (len(group) >= max_operations or payment.memo != group[0].memo):
+            yield group[0].memo, group
+            group = []
+        group.append(payment)
+    if group:
+        yield group[0].memo, group
+
+
+def _summarize_batch_payments(payments_file, source_account_address):
+    """
+    Validates all the rows of a batch payments file, printing the invalid ones.
+    :param str payments_file: CSV file with the payments.
+    :param str source_account_address: Address of the account from which the funds will be sent.
+    :return: Returns the number of payments, the number of transactions and the total amount per asset
+    (code, issuer), or None if any invalid row was found.
+    :rtype: (int, int, dict) or None
+    """
+    invalid_lines = []
+
+    def valid_payments():
+        for line_number, payment, error in read_batch_payments_file(payments_file, source_account_address):
+            if error is None:
+                yield payment
+                continue
+            if len(invalid_lines) < BATCH_PAYMENTS_MAX_REPORTED_ERRORS:
+                print('Line {}: {}'.format(line_number, error))
+            invalid_lines.append(line_number)
+
+    n_payments = 0
+    n_transactions = 0
+    totals = {}
+    for _, transaction_payments in group_batch_payments(valid_payments()):
+        n_transactions += 1
+        n_payments += len(transaction_payments)
+        for payment in transaction_payments:
+            asset = (payment.asset_code, payment.asset_issuer)
+            totals[asset] = totals.get(asset, Decimal(0)) + Decimal(payment.amount)
+
+    if invalid_lines:
+        print('{} invalid rows were found on the payments file. No payment was done'.format(len(invalid_lines)))
+        return None
+    return n_payments, n_transactions, totals
+
+
+def _parse_batch_payment_row(line_number, row, source_account_address):
+    """
+    Parses and validates a single row of a batch payments CSV file.
+    :param int line_number: Line of the file where the row was found.
+    :param dict row: Row to be parsed, keyed by the CSV header column names.
+    :param str source_account_address: Address of the account from which the funds will be sent.
+    :return: Returns the parsed payment and None, or None and a description of the problem.
+    :rtype: (BatchPayment, None) or (None, str)
+    """
+    destination = (row.get(CSV_BATCH_PAYMENT_DESTINATION_TAG) or '').strip()
+    asset = (row.get(CSV_BATCH_PAYMENT_ASSET_TAG) or 'XLM').strip()
+    amount = (row.get(CSV_BATCH_PAYMENT_AMOUNT_TAG) or '').strip().replace(',', '.')
+    memo = row.get(CSV_BATCH_PAYMENT_MEMO_TAG) or ''
+
+    if not is_address_valid(destination):
+        return None, 'The destination address is invalid'
+    if destination == source_account_address:
+        return None, 'Sending payment to own address. This is not allowed'
+    if not is_stellar_amount_valid(amount):
+        return None, 'The amount must be a positive value with at most {} decimal places'\
+            .format(STELLAR_AMOUNT_MAX_DECIMAL_PLACES)
+    if not is_transaction_text_memo_valid(memo):
+        return None, 'The maximum size of the text memo is {} bytes'.format(STELLAR_MEMO_TEXT_MAX_BYTES)
+
+    asset_code, _, asset_issuer = asset.partition(CSV_BATCH_PAYMENT_ASSET_SEPARATOR)
+    asset_issuer = asset_issuer or None
+    if not STELLAR_ASSET_CODE_REGEX.match(asset_code):
+        return None, 'The asset code is invalid'
+    if asset_issuer is None and asset_code.upper() != 'XLM':
+        return None, 'An asset issuer must be given for non native assets (use CODE{}ISSUER)'\
+            .format(CSV_BATCH_PAYMENT_ASSET_SEPARATOR)
+    if asset_issuer is not None and not is_address_valid(asset_issuer):
+        return None, 'The asset issuer address is invalid'
+
+    return BatchPayment(line_number, destination, asset_code, asset_issuer, amount, memo), None
+
+
 def send_path_payment(source_account_address, source_account_seed, destination_address,
                       code_token_to_send, max_amount_to_send, issuer_token_to_send,
                       code_token_to_be_received, amount_to_be_received, issuer_token_to_be_received,
@@ -166,37 +527,193 @@ def establish_trustline(source_account_address, source_account_seed, destination
     #process_server_payment_response(response)
 
 
-def submit_operations(account_seed, operations, transaction_memo):
+def submit_operations(account_seed, operations, transaction_memo, channel_seed=None):
     """
-    This method signs the given operations and submits them to the Stellar network
+    This method signs the given operations and submits them to the Stellar network. The sequence number
+    of the transaction is allocated locally, so only the first transaction of an account requires its
+    sequence number to be fetched from the network. If the transaction is rejected due to a bad sequence
+    number, the sequence number is fetched again and the transaction is submitted once more.
+    When a channel account is given, it is the source of the transaction (it pays the fee and provides
+    the sequence number) while the operations keep their own source account. The transaction is then
+    signed by both accounts.
     :param str account_seed: Seed of the account submitting the operations. It is required to sign the transactions.
     :param Operation operations: Operations to be submitted.
     :param str transaction_memo: Text memo to be included in Stellar transaction. Maximum size of 28 bytes.
+    :param str channel_seed: Seed of the channel account used as source of the transaction. It can be None.
     :return: Returns a string containing the server response or None if the transaction could not be submitted.
     :rtype: str or None
     """
-    try:
-        builder = Builder(secret=account_seed)
-    except Exception:
-        # Too broad exception because no specific exception is being thrown by the stellar_base package.
-        # TODO: This should be fixed in future versions
-        print("An error occurred (Please check your Internet connection)")
-        return None
+    from stellar_base.keypair import Keypair
+
+    source_seed = channel_seed if channel_seed is not None else account_seed
+    source_address = seed_to_address(source_seed)
+    signers = [Keypair.from_seed(source_seed)]
+    if channel_seed is not None:
+        signers.append(Keypair.from_seed(account_seed))
+
+    response = None
+    for _ in range(SUBMIT_BAD_SEQUENCE_ATTEMPTS):
+        with timed_span('sequence_allocation'):
+            sequence = _sequence_allocator.allocate(source_address)
+        if sequence is None:
+            return None
+
+        envelope = build_transaction_envelope(source_address, sequence, operations, transaction_memo, signers)
+        try:
+            with timed_span('transaction_submit'):
+                response = get_horizon().submit(envelope.xdr())
+        except Exception:
+            # Too broad exception because no specific exception is being thrown by the stellar_base package.
+            # TODO: This should be fixed in future versions
+            print("An error occurred (Please check your Internet connection)")
+            response = None
+
+        result_code = get_transaction_result_code(response)
+        if result_code not in SEQUENCE_CONSUMING_RESULT_CODES:
+            _sequence_allocator.resync(source_address)
+        if result_code != STELLAR_TX_BAD_SEQ_RESULT_CODE:
+            break
+
+    # Even a failed transaction may have consumed the sequence number and fee of the source account
+    invalidate_address_details(source_address, seed_to_address(account_seed))
+    if is_successful_submit_response(response):
+        invalidate_address_details(*_get_operations_accounts(operations))
+    return response
+
+
+def build_transaction_envelope(source_address, sequence, operations, transaction_memo, signers):
+    """
+    This method builds and signs a transaction envelope. No network access is done, so the sequence
+    number of the source account must be known beforehand.
+    :param str source_address: Address of the source account of the transaction.
+    :param int sequence: Current sequence number of the source account. The transaction uses the next one.
+    :param list operations: Operations of the transaction.
+    :param str transaction_memo: Text memo to be included in Stellar transaction. Maximum size of 28 bytes.
+    :param list signers: Keypairs signing the transaction.
+    :return: Returns the signed transaction envelope.
+    :rtype: TransactionEnvelope
+    """
+    from stellar_base.memo import TextMemo
+    from stellar_base.transaction import Transaction
+    from stellar_base.transaction_envelope import TransactionEnvelope
+
+    # Unlike Builder.append_op(), the operations are not deduplicated (a batch may have two identical
+    # payments) and no Horizon client is created for each transaction.
+    transaction = Transaction(source_address, opts={
+        'sequence': sequence,
+        'memo': TextMemo(transaction_memo),
+        'fee': STELLAR_BASE_FEE * len(operations),
+        'operations': list(operations)})
+    envelope = TransactionEnvelope(transaction, opts={'network_id': STELLAR_NETWORK})
+    with timed_span('transaction_signing'):
+        for signer in signers:
+            envelope.sign(signer)
+    return envelope
+
+
+def submit_operations_through_channels(account_seed, channel_seeds, transactions):
+    """
+    This method submits several transactions in parallel using a pool of channel accounts. Each channel
+    account is the source of the transactions submitted through it, paying their fees and providing
+    their sequence numbers, so the transactions do not contend for the sequence number of the account
+    submitting the operations. The transactions are spread round-robin across the channels, each
+    channel having at most one transaction in flight so that its transactions reach the network in
+    sequence number order.
+    :param str account_seed: Seed of the account submitting the operations. It is required to sign the transactions.
+    :param list channel_seeds: Seeds of the channel accounts.
+    :param transactions: Iterable of (operations, transaction_memo) tuples. The operations must have the
+    account submitting them as source, otherwise they would be done on behalf of the channel accounts.
+    :return: Yields the server response of each transaction (or None if it could not be submitted), in the
+    same order as the given transactions.
+    :rtype: generator
+    """
+    def submit(channel_seed, transaction):
+        operations, transaction_memo = transaction
+        return submit_operations(account_seed, operations, transaction_memo, channel_seed)
+
+    with ThreadPoolExecutor(max_workers=len(channel_seeds)) as executor:
+        transactions = iter(transactions)
+        while True:
+            round_transactions = list(itertools.islice(transactions, len(channel_seeds)))
+            if not round_transactions:
+                break
+            yield from executor.map(with_current_command(submit), channel_seeds, round_transactions)
+
+
+def _fetch_account_sequence(account_address):
+    """
+    Fetches the current sequence number of the given account from the network.
+    :param str account_address: Address of the account.
+    :return: Returns the sequence number of the account or None if it could not be fetched.
+    :rtype: int or None
+    """
+    address = get_address_details_from_network(account_address, use_cache=False)
+    return int(address.sequence) if address is not None else None
+
+
+_sequence_allocator = SequenceAllocator(_fetch_account_sequence)
 
-    builder.add_text_memo(transaction_memo)
+
+def forget_account_state(*addresses):
+    """
+    Forgets the locally tracked sequence numbers and cached details of the given accounts. It must be called
+    after their sequence numbers are consumed outside submit_operations() (e.g. by pre-signed transactions).
+    :param str addresses: Addresses of the accounts.
+    """
+    for address in addresses:
+        _sequence_allocator.resync(address)
+    invalidate_address_details(*addresses)
+
+
+def _get_operations_accounts(operations):
+    """
+    Returns the addresses of the accounts affected by the given operations.
+    :param list operations: Operations to be evaluated.
+    :return: Returns the source and destination addresses referred by the operations.
+    :rtype: set of str
+    """
+    accounts = set()
     for operation in operations:
-        builder.append_op(operation)
-    builder.sign()
-    try:
-        return builder.submit()
-    except Exception:
-        # Too broad exception because no specific exception is being thrown by the stellar_base package.
-        # TODO: This should be fixed in future versions
-        print("An error occurred (Please check your Internet connection)")
+        for attribute in ('source', 'destination'):
+            account = getattr(operation, attribute, None)
+            if account is not None:
+                accounts.add(account)
+    return accounts
+
+
+def is_successful_submit_response(response):
+    """
+    Checks if a given Horizon transaction submission response reports a successful transaction.
+    :param dict response: Horizon server response.
+    :return: Returns True if the transaction was included in a ledger and False otherwise.
+    :rtype: bool
+    """
+    return response is not None and response.get('ledger') is not None
+
+
+def get_transaction_result_code(response):
+    """
+    Returns the transaction result code (e.g. 'tx_success', 'tx_failed' or 'tx_bad_seq') of a given Horizon
+    transaction submission response.
+    :param dict response: Horizon server response.
+    :return: Returns the transaction result code or None if the response does not have one.
+    :rtype: str or None
+    """
+    if response is None:
         return None
+    if is_successful_submit_response(response):
+        return STELLAR_TX_SUCCESS_RESULT_CODE
+    return response.get('extras', {}).get('result_codes', {}).get('transaction')
 
 
-def process_server_payment_response(response):
+def process_server_payment_response(response, operation_labels=None):
+    """
+    Prints the relevant information of a Horizon transaction submission response, including the
+    operations of the transaction which failed.
+    :param dict response: Horizon server response. It can be None.
+    :param list operation_labels: Label of each transaction operation (e.g. the file line of a batch
+    payment), used when printing the failed operations. It can be None.
+    """
     if response is None:
         return
 
@@ -206,28 +723,255 @@ def process_server_payment_response(response):
         print("Server response title: {}".format(response.get('title')))
     if response.get('detail') is not None:
         print("Server response detail: {}".format(response.get('detail')))
-    if 'extras' in response and 'result_xdr' in response['extras']:
-        unpacked_tx_result = decode_xdr_transaction_result(response['extras']['result_xdr'])
-        print_xdr_transaction_result(unpacked_tx_result)
-    if 'result_xdr' in response:
-        unpacked_tx_result = decode_xdr_transaction_result(response.get('result_xdr'))
-        print_xdr_transaction_result(unpacked_tx_result)
+    tx_result = get_submit_response_transaction_result(response)
+    if tx_result is not None:
+        print_transaction_result(tx_result, operation_labels)
+
+
+def get_submit_response_transaction_result(response):
+    """
+    Decodes the transaction result XDR of a Horizon transaction submission response, which is found
+    on the response itself for successful transactions and on its extras for the failed ones.
+    :param dict response: Horizon server response. It can be None.
+    :return: Returns the decoded transaction result or None if the response has no valid result XDR.
+    :rtype: TransactionResultDetails or None
+    """
+    if response is None:
+        return None
+    result_xdr = response.get('result_xdr') or response.get('extras', {}).get('result_xdr')
+    return decode_transaction_result(result_xdr) if result_xdr else None
+
+
+def decode_transaction_result(xdr_string):
+    """
+    Decodes a base64 encoded TransactionResult XDR (the result_xdr of Horizon) into the result code of
+    the transaction and the result of each one of its operations.
+    :param str xdr_string: Base64 encoded TransactionResult XDR.
+    :return: Returns the decoded transaction result or None if the XDR is invalid.
+    :rtype: TransactionResultDetails or None
+    """
+    from xdrlib import Error as XDRError
+
+    try:
+        return _decode_transaction_result(_get_xdr_unpacker(), xdr_string)
+    except (TypeError, ValueError):
+        print("Error during base64 decoding")
+        return None
+    except (EOFError, XDRError, KeyError):
+        print("Error during XDR unpacking procedure")
+        return None
+
+
+def decode_transaction_results(xdr_strings):
+    """
+    Decodes several base64 encoded TransactionResult XDRs, like decode_transaction_result() but without
+    reporting the invalid ones.
+    :param xdr_strings: Iterable of base64 encoded TransactionResult XDRs.
+    :return: Returns the decoded transaction results, in the same order as the given XDRs (None for the
+    invalid ones).
+    :rtype: list of TransactionResultDetails
+    """
+    from xdrlib import Error as XDRError
+
+    unpacker = _get_xdr_unpacker()
+    results = []
+    for xdr_string in xdr_strings:
+        try:
+            results.append(_decode_transaction_result(unpacker, xdr_string))
+        except (TypeError, ValueError, EOFError, XDRError, KeyError):
+            results.append(None)
+    return results
+
+
+def get_failed_operation_results(tx_result):
+    """
+    Returns the results of the operations of a transaction which failed. When a transaction fails none of
+    its operations is applied, but only the failed ones prevented it from being applied.
+    :param TransactionResultDetails tx_result: Decoded transaction result.
+    :return: Returns the results of the failed operations.
+    :rtype: list of OperationResultDetails
+    """
+    return [operation for operation in tx_result.operations if not operation.successful]
 
 
 def decode_xdr_transaction_result(xdr_string):
+    """
+    Unpacks a base64 encoded TransactionResult XDR into the stellar_base XDR objects.
+    :param str xdr_string: Base64 encoded TransactionResult XDR.
+    :return: Returns the unpacked transaction result or None if the XDR is invalid.
+    :rtype: TransactionResult or None
+    """
+    from xdrlib import Error as XDRError
+
     try:
-        xdr_bytes = base64.b64decode(xdr_string)
-        return Xdr.StellarXDRUnpacker(xdr_bytes).unpack_TransactionResult()
-    except TypeError or ValueError:
+        return _unpack_transaction_result(_get_xdr_unpacker(), base64.b64decode(xdr_string, validate=True))
+    except (TypeError, ValueError):
         print("Error during base64 decoding")
         return None
-    except XDRError:
+    except (EOFError, XDRError):
         print("Error during XDR unpacking procedure")
         return None
 
 
-def print_xdr_transaction_result(unpacked_tx_result):
-        payment_result = unpacked_tx_result.result.results[0].paymentResult
-        print("Server response operation result: {}".format(
-            'Succeeded' if unpacked_tx_result.result.code == StellarXDR_const.txSUCCESS else 'Failed'))
-        print('Server response payment result: {} (Code: {})'.format(str(payment_result), payment_result.code))
+def print_transaction_result(tx_result, operation_labels=None):
+    """
+    Prints a decoded transaction result, detailing the operations which failed.
+    :param TransactionResultDetails tx_result: Decoded transaction result.
+    :param list operation_labels: Label of each operation. If None the operations are labeled by position.
+    """
+    failed_operations = get_failed_operation_results(tx_result)
+    print("Server response transaction result: {} (fee charged: {} stroops)".format(tx_result.code,
+                                                                                  tx_result.fee_charged))
+    if tx_result.operations:
+        print("Server response operation results: {} succeeded, {} failed".format(
+            len(tx_result.operations) - len(failed_operations), len(failed_operations)))
+    for operation in failed_operations[:BATCH_PAYMENTS_MAX_REPORTED_ERRORS]:
+        label = operation_labels[operation.index] if operation_labels is not None \
+            else 'Operation {}'.format(operation.index + 1)
+        print('  {}{}: {}'.format(label, ' ({})'.format(operation.type) if operation.type else '', operation.code))
+    if len(failed_operations) > BATCH_PAYMENTS_MAX_REPORTED_ERRORS:
+        print('  ... and {} more failed operations'.format(len(failed_operations) - BATCH_PAYMENTS_MAX_REPORTED_ERRORS))
+
+
+def _get_xdr_unpacker():
+    """
+    Returns the XDR unpacker of the current thread, which is reset for each decoded XDR instead of
+    creating a new unpacker every time.
+    :return: Returns the XDR unpacker.
+    :rtype: StellarXDRUnpacker
+    """
+    unpacker = getattr(_xdr_unpackers, 'unpacker', None)
+    if unpacker is None:
+        from stellar_base.stellarxdr import Xdr
+        unpacker = _xdr_unpackers.unpacker = Xdr.StellarXDRUnpacker(b'')
+    return unpacker
+
+
+def _decode_transaction_result(unpacker, xdr_string):
+    """
+    Decodes a base64 encoded TransactionResult XDR. The results whose operations have no result fields other
+    than their code (e.g. payments and account creations) are decoded straight from the XDR bytes, which is
+    several times faster than unpacking them with the XDR unpacker, used for the remaining ones.
+    :param StellarXDRUnpacker unpacker: XDR unpacker to be used if needed.
+    :param str xdr_string: Base64 encoded TransactionResult XDR.
+    :return: Returns the decoded transaction result.
+    :rtype: TransactionResultDetails
+    :raises ValueError: If the XDR is not valid base64. EOFError or xdrlib.Error if it is not a valid
+    TransactionResult. KeyError if it has an operation type or result code missing from the lookup tables.
+    """
+    xdr_bytes = base64.b64decode(xdr_string, validate=True)
+    tx_result = _decode_codes_only_transaction_result(xdr_bytes)
+    if tx_result is None:
+        tx_result = _to_transaction_result_details(_unpack_transaction_result(unpacker, xdr_bytes))
+    return tx_result
+
+
+def _decode_codes_only_transaction_result(xdr_bytes):
+    """
+    Decodes a TransactionResult XDR made only of result codes, i.e. whose operations results have no other
+    fields. It is laid out as the fee charged (int64), the transaction result code (int32) and, for
+    successful and failed transactions, the number of operations (uint32) followed by the result code of each
+    operation (int32) and, if it was evaluated, its type and type specific result code (int32 each).
+    :param bytes xdr_bytes: TransactionResult XDR.
+    :return: Returns the decoded transaction result or None if it is not made only of result codes (or if
+    it is invalid).
+    :rtype: TransactionResultDetails or None
+    """
+    tx_result_codes, operation_result_codes, operation_types = _get_xdr_result_codes()
+    try:
+        fee_charged, code = struct.unpack_from('>qi', xdr_bytes)
+        offset = 12
+        operations = []
+        if code in (0, -1):  # txSUCCESS and txFAILED
+            n_operations, = struct.unpack_from('>I', xdr_bytes, offset)
+            offset += 4
+            for i in range(n_operations):
+                operation_code, = struct.unpack_from('>i', xdr_bytes, offset)
+                offset += 4
+                if operation_code != 0:
+                    operations.append(OperationResultDetails(i, None, operation_result_codes[None][operation_code],
+                                                             False, None))
+                    continue
+                op_type, result_code = struct.unpack_from('>ii', xdr_bytes, offset)
+                offset += 8
+                op_type_name, _, codes_only = operation_types[op_type]
+                if not codes_only:
+                    return None
+                operations.append(OperationResultDetails(i, op_type_name, operation_result_codes[op_type][result_code],
+                                                         result_code == 0, None))
+        ext, = struct.unpack_from('>i', xdr_bytes, offset)
+        if ext != 0 or offset + 4 != len(xdr_bytes):
+            return None
+        return TransactionResultDetails(tx_result_codes[code], code == 0, fee_charged, operations)
+    except (struct.error, KeyError):
+        return None
+
+
+def _unpack_transaction_result(unpacker, xdr_bytes):
+    """
+    Unpacks a TransactionResult XDR using the given unpacker.
+    :param StellarXDRUnpacker unpacker: XDR unpacker to be reset with the XDR bytes.
+    :param bytes xdr_bytes: TransactionResult XDR.
+    :return: Returns the unpacked transaction result.
+    :rtype: TransactionResult
+    :raises EOFError: If it is not a valid TransactionResult (it may also raise xdrlib.Error).
+    """
+    unpacker.reset(xdr_bytes)
+    unpacked_tx_result = unpacker.unpack_TransactionResult()
+    unpacker.done()
+    return unpacked_tx_result
+
+
+def _to_transaction_result_details(unpacked_tx_result):
+    """
+    Converts an unpacked TransactionResult into the result code of the transaction and of each operation.
+    :param TransactionResult unpacked_tx_result: Unpacked transaction result.
+    :return: Returns the decoded transaction result.
+    :rtype: TransactionResultDetails
+    """
+    tx_result_codes, operation_result_codes, operation_types = _get_xdr_result_codes()
+    operations = []
+    for i, operation_result in enumerate(getattr(unpacked_tx_result.result, 'results', [])):
+        if operation_result.code != 0:  # The operation could not even be evaluated (opINNER is 0)
+            operations.append(OperationResultDetails(i, None, operation_result_codes[None][operation_result.code],
+                                                     False, None))
+            continue
+        op_type = operation_result.tr.type
+        op_type_name, result_attribute, codes_only = operation_types[op_type]
+        result = getattr(operation_result.tr, result_attribute)
+        operations.append(OperationResultDetails(i, op_type_name, operation_result_codes[op_type][result.code],
+                                                 result.code == 0, None if codes_only else result))
+    return TransactionResultDetails(tx_result_codes[unpacked_tx_result.result.code],
+                                    unpacked_tx_result.result.code == 0, unpacked_tx_result.feeCharged, operations)
+
+
+def _get_xdr_result_codes():
+    """
+    Builds, on first use, the tables translating the XDR result codes into the result codes used by Horizon
+    (e.g. txBAD_SEQ into 'tx_bad_seq' and PAYMENT_UNDERFUNDED into 'op_underfunded').
+    :return: Returns the transaction result codes, the operation result codes by operation type (None for
+    the codes of operations which could not be evaluated) and the name, result attribute and whether the
+    result is made only of the result code of each operation type.
+    :rtype: (dict, dict, dict)
+    """
+    global _xdr_result_codes
+    if _xdr_result_codes is not None:
+        return _xdr_result_codes
+
+    from stellar_base.stellarxdr import StellarXDR_const
+
+    constants = [(name, value) for name, value in vars(StellarXDR_const).items() if isinstance(value, int)]
+    tx_result_codes = {value: 'tx_' + name[2:].lower() for name, value in constants if name.startswith('tx')}
+    operation_result_codes = {None: {value: 'op_' + name[2:].lower() for name, value in constants
+                                     if name.startswith('op') and name != 'opINNER'}}
+    operation_types = {}
+    for op_type_name, result_attribute, result_codes_prefix, codes_only in _OPERATION_RESULT_TYPES:
+        op_type = getattr(StellarXDR_const, op_type_name)
+        operation_types[op_type] = (op_type_name.lower(), result_attribute, codes_only)
+        codes = operation_result_codes[op_type] = {}
+        for name, value in constants:
+            # Result codes are zero (success) or negative, and the success comes first on each enum
+            if name.startswith(result_codes_prefix) and value <= 0:
+                codes.setdefault(value, 'op_' + name[len(result_codes_prefix):].lower())
+    _xdr_result_codes = tx_result_codes, operation_result_codes, operation_types
+    return _xdr_result_codes
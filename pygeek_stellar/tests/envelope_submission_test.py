@@ -0,0 +1,174 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from urllib.parse import parse_qs
+from pygeek_stellar.envelope_submission import *
+from pygeek_stellar.tests.horizon_stand_in import *
+
+
+class _HorizonStandInHandler(HorizonStandInHandler):
+    """
+    Serves POST /transactions and GET /transactions/{hash} (the envelopes being their own hashes). The envelopes
+    named on the server transient_errors dict are answered with HTTP 503 for the given number of times, the
+    ones named on the server rejected list and the already applied ones with tx_bad_seq and every other one is
+    applied and answered with success, or with HTTP 504 if named on the server lost_responses list, or with a
+    JSON array if named on the server non_object_responses list.
+    """
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        envelope = parse_qs(self.rfile.read(length).decode())['tx'][0]
+        with self.server.lock:
+            self.server.posts.append(envelope)
+            transient_errors = self.server.transient_errors.get(envelope, 0)
+            self.server.transient_errors[envelope] = transient_errors - 1
+            applied = envelope in self.server.applied
+            if transient_errors <= 0 and not applied and envelope not in self.server.rejected:
+                self.server.applied.add(envelope)
+        if transient_errors > 0:
+            self._send_json(503, {'status': 503, 'title': 'Service Unavailable'})
+        elif envelope in self.server.rejected or applied:
+            self._send_json(400, {'status': 400, 'extras': {'result_codes': {'transaction': 'tx_bad_seq'}}})
+        elif envelope in self.server.non_object_responses:
+            self._send_json(200, ['unexpected'])
+        elif envelope in self.server.lost_responses:
+            self.server.lost_responses.remove(envelope)
+            self._send_json(504, {'status': 504, 'title': 'Timeout'})
+        else:
+            self._send_json(200, {'hash': envelope, 'ledger': 1})
+
+    def do_GET(self):
+        transaction_hash = self.path.split('/')[-1]
+        if self.path.startswith('/transactions/') and transaction_hash in self.server.applied:
+            self._send_json(200, {'hash': transaction_hash, 'ledger': 1, 'successful': True})
+        else:
+            self._send_json(404, {'status': 404, 'title': 'Resource Missing'})
+
+
+class EnvelopeSubmissionTest(unittest.TestCase):
+
+    ADDRESS_1 = 'GB3I37MLME4LC5LVAKRTKSKE2K7X5VR4MEBVG3EVHMB2C6V6J5A3XC6L'
+    SEED_1 = 'SADGEOC6FE5KQJMC7O65HNURFZTB6SLJDM5JB665NSWOGVBEGRRGC3KK'
+    ADDRESS_2 = 'GA6S6WSZVDBJQFEGYPZO7D5HWQINTIOSCKR5PAJRGZ4ZI2H7HED6V5RX'
+
+    def setUp(self):
+        self.server = start_horizon_stand_in(self, _HorizonStandInHandler)
+        self.server.lock = threading.Lock()
+        self.server.posts = []
+        self.server.transient_errors = {}
+        self.server.rejected = []
+        self.server.applied = set()
+        self.server.lost_responses = []
+        self.server.non_object_responses = []
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.envelopes_file = os.path.join(self.directory.name, 'envelopes.ndjson')
+        self.results_file = os.path.join(self.directory.name, 'results.ndjson')
+        backoff_patch = mock.patch('pygeek_stellar.envelope_submission.SUBMIT_ENVELOPE_BACKOFF_BASE_SECONDS', 0)
+        backoff_patch.start()
+        self.addCleanup(backoff_patch.stop)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _write_envelopes_file(self, envelopes):
+        """
+        Writes an envelopes file whose envelope XDRs (and hashes) are just the first two characters
+        of the source address followed by the sequence number.
+        """
+        with open(self.envelopes_file, 'w') as file:
+            for source, sequence in envelopes:
+                file.write(json.dumps({'source': source, 'sequence': sequence, 'hash': source[:2] + str(sequence),
+                                       'envelope_xdr': source[:2] + str(sequence)}) + '\n')
+
+    def _read_results_file(self):
+        return [result for _, result in read_ndjson_file(self.results_file)]
+
+    def test_submit_envelopes(self):
+        a, b = EnvelopeSubmissionTest.ADDRESS_1, EnvelopeSubmissionTest.ADDRESS_2
+        self._write_envelopes_file([(a, 3), (b, 1), (a, 1), (b, 2), (a, 2), (b, 3)])
+        self.server.transient_errors = {'GB1': 2}
+        self.server.rejected = ['GA2']
+
+        counts = submit_envelopes(self.envelopes_file, self.results_file, concurrency=4)
+        self.assertEqual(counts, {SUBMIT_RESULT_SUCCESS: 4, SUBMIT_RESULT_REJECTED: 1, SUBMIT_RESULT_SKIPPED: 1,
+                                  ENVELOPES_ALREADY_SUBMITTED: 0})
+        self.assertEqual([p for p in self.server.posts if p.startswith('GB')], ['GB1', 'GB1', 'GB1', 'GB2', 'GB3'])
+        self.assertEqual([p for p in self.server.posts if p.startswith('GA')], ['GA1', 'GA2'])
+
+        results = {result['hash']: result for result in self._read_results_file()}
+        self.assertEqual(results['GB1']['attempts'], 3)
+        self.assertEqual(results['GB1']['status'], SUBMIT_RESULT_SUCCESS)
+        self.assertEqual(results['GA2']['result_code'], 'tx_bad_seq')
+        self.assertEqual(results['GA3']['status'], SUBMIT_RESULT_SKIPPED)
+
+    def test_submit_envelopes_resumes_from_results_file(self):
+        a, b = EnvelopeSubmissionTest.ADDRESS_1, EnvelopeSubmissionTest.ADDRESS_2
+        self._write_envelopes_file([(a, 1), (a, 2), (b, 1)])
+        self.server.rejected = ['GB2']
+        submit_envelopes(self.envelopes_file, self.results_file)
+
+        self.server.posts = []
+        self.server.rejected = []
+        counts = submit_envelopes(self.envelopes_file, self.results_file)
+        self.assertEqual(counts, {SUBMIT_RESULT_SUCCESS: 1, ENVELOPES_ALREADY_SUBMITTED: 2})
+        self.assertEqual(self.server.posts, ['GB2'])
+        self.assertEqual(sorted((result['hash'], result['status']) for result in self._read_results_file()),
+                         [('GA1', SUBMIT_RESULT_SUCCESS), ('GB1', SUBMIT_RESULT_SUCCESS),
+                          ('GB2', SUBMIT_RESULT_REJECTED), ('GB2', SUBMIT_RESULT_SUCCESS)])
+
+    def test_applied_transaction_with_lost_response(self):
+        a = EnvelopeSubmissionTest.ADDRESS_1
+        self._write_envelopes_file([(a, 1), (a, 2)])
+        self.server.lost_responses = ['GB1']  # Applied, but answered with HTTP 504
+
+        counts = submit_envelopes(self.envelopes_file, self.results_file)
+        self.assertEqual(counts, {SUBMIT_RESULT_SUCCESS: 2, ENVELOPES_ALREADY_SUBMITTED: 0})
+        self.assertEqual(self.server.posts, ['GB1', 'GB1', 'GB2'])  # The retry of GB1 got tx_bad_seq
+        self.assertEqual([(r['hash'], r['status'], r['ledger']) for r in self._read_results_file()],
+                         [('GB1', SUBMIT_RESULT_SUCCESS, 1), ('GB2', SUBMIT_RESULT_SUCCESS, 1)])
+
+    def test_non_object_responses_and_results(self):
+        a, b = EnvelopeSubmissionTest.ADDRESS_1, EnvelopeSubmissionTest.ADDRESS_2
+        self._write_envelopes_file([(a, 1), (a, 2), (b, 1)])
+        self.server.non_object_responses = ['GB1']
+        with open(self.results_file, 'w') as file:  # A hand-edited results file
+            file.write(json.dumps({'status': SUBMIT_RESULT_SUCCESS}) + '\n')
+
+        counts = submit_envelopes(self.envelopes_file, self.results_file)
+        self.assertEqual(counts, {SUBMIT_RESULT_SUCCESS: 1, SUBMIT_RESULT_ERROR: 1, SUBMIT_RESULT_SKIPPED: 1,
+                                  ENVELOPES_ALREADY_SUBMITTED: 0})
+        results = {result.get('hash'): result for result in self._read_results_file()}
+        self.assertEqual(results['GB1']['error'], 'Horizon responded with an invalid JSON document')
+
+    def test_submit_envelope_gives_up_on_transient_errors(self):
+        self.server.transient_errors = {'xdr': SUBMIT_ENVELOPE_MAX_ATTEMPTS}
+        response, error, attempts = submit_envelope('xdr')
+        self.assertIsNone(response)
+        self.assertIn('503', error)
+        self.assertEqual(attempts, SUBMIT_ENVELOPE_MAX_ATTEMPTS)
+
+    def test_read_envelopes_file_decodes_envelopes(self):
+        payments_file = os.path.join(self.directory.name, 'payments.csv')
+        with open(payments_file, 'w') as file:
+            file.write('destination,asset,amount,memo\n{},XLM,1,\n'.format(EnvelopeSubmissionTest.ADDRESS_2))
+        sign_batch_payments_offline(EnvelopeSubmissionTest.ADDRESS_1, EnvelopeSubmissionTest.SEED_1,
+                                    payments_file, 41, self.envelopes_file)
+        signed = [record for _, record in read_ndjson_file(self.envelopes_file)]
+        with open(self.envelopes_file, 'w') as file:
+            file.write(json.dumps({'envelope_xdr': signed[0]['envelope_xdr']}) + '\n')
+
+        envelopes = read_envelopes_file(self.envelopes_file)
+        self.assertEqual([(e['source'], e['sequence'], e['hash']) for e in envelopes],
+                         [(signed[0]['source'], signed[0]['sequence'], signed[0]['hash'])])
+
+        with open(self.envelopes_file, 'a') as file:
+            file.write('{"envelope_xdr": "invalid"}\nnot json\n')
+        self.assertIsNone(read_envelopes_file(self.envelopes_file))
+
+
+if __name__ == '__main__':
+    unittest.main()
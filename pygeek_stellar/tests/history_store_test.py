@@ -0,0 +1,111 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from pygeek_stellar.history_store import *
+from pygeek_stellar.tests.horizon_stand_in import *
+
+ADDRESS = 'GB3I37MLME4LC5LVAKRTKSKE2K7X5VR4MEBVG3EVHMB2C6V6J5A3XC6L'
+COUNTERPARTY_1 = 'GA6S6WSZVDBJQFEGYPZO7D5HWQINTIOSCKR5PAJRGZ4ZI2H7HED6V5RX'
+COUNTERPARTY_2 = 'GBLHVU7EJMSUW72PINTRBRIHT55ZQ7HXFAXELG2JG53X4VAZSHZKLEY6'
+
+
+def _payment(i):
+    """
+    Creates the i-th payment record of a fixture history with one payment per day of 28 days months. Every
+    third payment is sent to COUNTERPARTY_2 in EUR, the others are received from COUNTERPARTY_1 in XLM.
+    """
+    record = {'paging_token': str(i * 4096), 'type': 'payment',
+              'created_at': '2019-{:02d}-{:02d}T12:00:00Z'.format((i - 1) // 28 + 1, (i - 1) % 28 + 1)}
+    if i % 3 == 0:
+        record.update({'from': ADDRESS, 'to': COUNTERPARTY_2, 'asset_type': 'credit_alphanum4', 'asset_code': 'EUR',
+                       'asset_issuer': COUNTERPARTY_2, 'amount': '1.0000000'})
+    else:
+        record.update({'from': COUNTERPARTY_1, 'to': ADDRESS, 'asset_type': 'native', 'amount': '2.0000000'})
+    return record
+
+
+class _HorizonStandInHandler(HorizonStandInHandler):
+    """
+    Serves the /accounts/{address}/payments and /accounts/{address}/transactions pages out of the server
+    payments and transactions lists. The pages after the server fail_after_cursor cursor are answered
+    with HTTP 500.
+    """
+
+    def do_GET(self):
+        path, query = self._get_query()
+        self.server.queries.append((path.split('/')[-1], query.get('cursor')))
+        records = self.server.payments if path.endswith('/payments') else self.server.transactions
+        if 'cursor' in query:
+            if self.server.fail_after_cursor is not None and int(query['cursor']) >= self.server.fail_after_cursor:
+                self._send_json(500, {'status': 500, 'title': 'Internal Server Error'})
+                return
+            records = [r for r in records if int(r['paging_token']) > int(query['cursor'])]
+        self._send_json(200, {'_embedded': {'records': records[:int(query['limit'])]}})
+
+
+class HistoryStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = start_horizon_stand_in(self, _HorizonStandInHandler)
+        self.server.queries = []
+        self.server.payments = [_payment(i) for i in range(1, 301)]
+        self.server.transactions = [{'paging_token': str(i), 'created_at': '2019-01-01T00:00:00Z'} for i in range(5)]
+        self.server.fail_after_cursor = None
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = HistoryStore(os.path.join(self.directory.name, 'history.sqlite'))
+        self.assertTrue(self.store.open())
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def test_incremental_sync(self):
+        self.assertEqual(self.store.sync_payments(ADDRESS), 300)
+        self.assertEqual(self.store.sync_payments(ADDRESS), 0)
+        self.server.payments += [_payment(i) for i in range(301, 311)]
+        self.assertEqual(self.store.sync_payments(ADDRESS), 10)
+        # Only the first sync pages through the whole history, the following ones start at the last payment
+        self.assertEqual(self.server.queries, [('payments', None), ('payments', '819200'), ('payments', '1228800'),
+                                               ('payments', '1228800')])
+        self.assertEqual(len(list(self.store.query_payments(ADDRESS))), 310)
+
+        self.assertEqual(self.store.sync_transactions(ADDRESS), 5)
+        self.assertEqual([t['paging_token'] for t in self.store.query_transactions(ADDRESS, order='desc')],
+                         ['4', '3', '2', '1', '0'])
+
+    def test_interrupted_sync_is_resumed(self):
+        from stellar_base.exceptions import HorizonError
+
+        self.server.fail_after_cursor = 200 * 4096
+        with self.assertRaises(HorizonError):
+            self.store.sync_payments(ADDRESS)
+        self.assertEqual(self.store.get_sync_cursor(ADDRESS, HISTORY_PAYMENTS), str(200 * 4096))
+
+        self.server.fail_after_cursor = None
+        self.assertEqual(self.store.sync_payments(ADDRESS), 100)
+        self.assertEqual(len(list(self.store.query_payments(ADDRESS))), 300)
+
+    def test_query_payments(self):
+        self.store.sync_payments(ADDRESS)
+        # A "last 30 days of payments" report run on 2019-10-23 (on the fixture 28 days months)
+        payments = list(self.store.query_payments(ADDRESS, since=datetime(2019, 9, 23), until=datetime(2019, 10, 23)))
+        self.assertEqual([p['paging_token'] for p in payments], [str(i * 4096) for i in range(247, 275)])
+
+        payments = list(self.store.query_payments(ADDRESS, asset='EUR:' + COUNTERPARTY_2, order='desc', limit=2))
+        self.assertEqual([p['paging_token'] for p in payments], [str(300 * 4096), str(297 * 4096)])
+        self.assertEqual(len(list(self.store.query_payments(ADDRESS, asset='EUR'))), 100)
+        self.assertEqual(len(list(self.store.query_payments(ADDRESS, asset='XLM', counterparty=COUNTERPARTY_1))), 200)
+        self.assertEqual(list(self.store.query_payments(ADDRESS, counterparty=ADDRESS)), [])
+        self.assertEqual(list(self.store.query_payments(COUNTERPARTY_1)), [])
+
+    def test_queries_use_indexes(self):
+        plan = ' '.join(row[3] for row in self.store._connection.execute(
+            'EXPLAIN QUERY PLAN SELECT record FROM payments WHERE account = ? AND counterparty = ? '
+            'AND created_at >= ?', (ADDRESS, COUNTERPARTY_1, '2019-01-01')))
+        self.assertIn('payments_by_counterparty', plan)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from pygeek_stellar.utils.horizon import set_horizon_url
+
+
+class HorizonStandInHandler(BaseHTTPRequestHandler):
+    """
+    Base handler of the local servers standing in for Horizon on the tests. Subclasses implement the do_GET
+    and do_POST methods of the endpoints they serve, keeping their state on the server attributes.
+    """
+
+    disable_nagle_algorithm = True  # Small responses are not delayed on keep-alive (HTTP/1.1) connections
+
+    def _get_query(self):
+        """
+        Returns the path and the query parameters (the first value of each one) of the request URL.
+        """
+        url = urlparse(self.path)
+        return url.path, {key: values[0] for key, values in parse_qs(url.query).items()}
+
+    def _send_json(self, status, content):
+        body = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_horizon_stand_in(test_case, handler_class):
+    """
+    Starts a local server with the given handler and uses it as Horizon server until the end of the test,
+    when the server is stopped and the default Horizon server is used again.
+    :param unittest.TestCase test_case: Test using the server.
+    :param handler_class: HorizonStandInHandler subclass serving the requests.
+    :return: Returns the started server.
+    :rtype: ThreadingHTTPServer
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler_class)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    test_case.addCleanup(server.server_close)
+    test_case.addCleanup(server.shutdown)
+    test_case.addCleanup(set_horizon_url, None)
+    set_horizon_url('http://127.0.0.1:{}'.format(server.server_port))
+    return server
@@ -0,0 +1,132 @@
+import os
+import tempfile
+import unittest
+from pygeek_stellar.keystore import *
+
+
+class KeystoreTest(unittest.TestCase):
+
+    PASSWORD = 'password'
+    ADDRESS_1 = 'GB3I37MLME4LC5LVAKRTKSKE2K7X5VR4MEBVG3EVHMB2C6V6J5A3XC6L'
+    SEED_1 = 'SADGEOC6FE5KQJMC7O65HNURFZTB6SLJDM5JB665NSWOGVBEGRRGC3KK'
+    ADDRESS_2 = 'GA6S6WSZVDBJQFEGYPZO7D5HWQINTIOSCKR5PAJRGZ4ZI2H7HED6V5RX'
+    SEED_2 = 'SDNYPEIU5OOKMPZESV3S7NCJDF32UCUTPTXOOXWYWAGOQVKRCSEPC7PR'
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, 'keystore')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _reopen(self):
+        keystore = Keystore(self.filename)
+        self.assertTrue(keystore.open(KeystoreTest.PASSWORD))
+        return keystore
+
+    def test_add_and_get_accounts(self):
+        keystore = Keystore(self.filename)
+        self.assertFalse(keystore.exists())
+        self.assertTrue(keystore.create(KeystoreTest.PASSWORD))
+        self.assertTrue(keystore.add_account('first', KeystoreTest.ADDRESS_1, KeystoreTest.SEED_1))
+        self.assertTrue(keystore.add_account(None, KeystoreTest.ADDRESS_2, None))
+
+        keystore = self._reopen()
+        self.assertEqual(keystore.count(), 2)
+        self.assertEqual(keystore.get_account_by_name('first'), {
+            JSON_ACCOUNT_NAME_TAG: 'first',
+            JSON_ACCOUNT_ADDRESS_TAG: KeystoreTest.ADDRESS_1,
+            JSON_ACCOUNT_SEED_TAG: KeystoreTest.SEED_1})
+        self.assertEqual(keystore.get_account_by_address(KeystoreTest.ADDRESS_2)[JSON_ACCOUNT_SEED_TAG], None)
+        self.assertIsNone(keystore.get_account_by_name('unknown'))
+        self.assertEqual([a[JSON_ACCOUNT_ADDRESS_TAG] for a in keystore.get_accounts()],
+                         [KeystoreTest.ADDRESS_1, KeystoreTest.ADDRESS_2])
+
+        with open(self.filename, 'rb') as file:
+            content = file.read()
+        self.assertNotIn(b'first', content)
+        self.assertNotIn(KeystoreTest.SEED_1.encode(), content)
+
+    def test_wrong_password(self):
+        self.assertTrue(Keystore(self.filename).create(KeystoreTest.PASSWORD))
+        self.assertFalse(Keystore(self.filename).open('wrong password'))
+
+    def test_account_with_same_address_is_superseded(self):
+        keystore = Keystore(self.filename)
+        keystore.create(KeystoreTest.PASSWORD)
+        keystore.add_account('first', KeystoreTest.ADDRESS_1, None)
+        keystore.add_account('second', KeystoreTest.ADDRESS_2, None)
+        keystore.add_account('renamed', KeystoreTest.ADDRESS_1, KeystoreTest.SEED_1)
+
+        for keystore in [keystore, self._reopen()]:
+            self.assertEqual(keystore.count(), 2)
+            self.assertIsNone(keystore.get_account_by_name('first'))
+            self.assertEqual(keystore.get_account_by_name('renamed')[JSON_ACCOUNT_SEED_TAG], KeystoreTest.SEED_1)
+            self.assertEqual([a[JSON_ACCOUNT_NAME_TAG] for a in keystore.get_accounts()], ['second', 'renamed'])
+
+    def test_interrupted_append_is_ignored(self):
+        keystore = Keystore(self.filename)
+        keystore.create(KeystoreTest.PASSWORD)
+        keystore.add_account('first', KeystoreTest.ADDRESS_1, None)
+        with open(self.filename, 'ab') as file:
+            file.write(b'incomplete record')
+
+        keystore = self._reopen()
+        self.assertEqual(keystore.count(), 1)
+        keystore.add_account('second', KeystoreTest.ADDRESS_2, None)
+        self.assertEqual([a[JSON_ACCOUNT_NAME_TAG] for a in self._reopen().get_accounts()], ['first', 'second'])
+
+    def test_compaction(self):
+        keystore = Keystore(self.filename)
+        keystore.create(KeystoreTest.PASSWORD)
+        for i in range(KEYSTORE_COMPACTION_MIN_DEAD_RECORDS + 1):
+            keystore.add_account('name {}'.format(i), KeystoreTest.ADDRESS_1, None)
+
+        with open(self.filename, 'rb') as file:
+            self.assertEqual(len(file.readlines()), 2)  # Header and a single record
+        keystore.add_account('second', KeystoreTest.ADDRESS_2, None)
+        self.assertEqual([a[JSON_ACCOUNT_NAME_TAG] for a in self._reopen().get_accounts()],
+                         ['name {}'.format(KEYSTORE_COMPACTION_MIN_DEAD_RECORDS), 'second'])
+
+    def test_concurrent_instances_do_not_lose_records(self):
+        Keystore(self.filename).create(KeystoreTest.PASSWORD)
+        keystore_1, keystore_2 = self._reopen(), self._reopen()
+        self.assertTrue(keystore_1.add_account('first', KeystoreTest.ADDRESS_1, KeystoreTest.SEED_1))
+        self.assertTrue(keystore_2.add_account('second', KeystoreTest.ADDRESS_2, KeystoreTest.SEED_2))
+        self.assertEqual(keystore_2.get_account_by_name('first')[JSON_ACCOUNT_SEED_TAG], KeystoreTest.SEED_1)
+
+        # A compaction replaces the file under the other instance, which must index it again before appending
+        self.assertTrue(keystore_1.add_account('third', 'ADDRESS-3', None))
+        self.assertTrue(keystore_2.compact())
+        self.assertTrue(keystore_1.add_account('fourth', 'ADDRESS-4', None))
+        self.assertEqual(keystore_2.get_account_by_name('fourth')[JSON_ACCOUNT_ADDRESS_TAG], 'ADDRESS-4')
+        self.assertEqual([a[JSON_ACCOUNT_NAME_TAG] for a in self._reopen().get_accounts()],
+                         ['first', 'second', 'third', 'fourth'])
+
+    def test_keystore_replaced_by_a_different_one(self):
+        Keystore(self.filename).create(KeystoreTest.PASSWORD)
+        keystore = self._reopen()
+        self.assertTrue(keystore.add_account('first', KeystoreTest.ADDRESS_1, KeystoreTest.SEED_1))
+        Keystore(self.filename).create(KeystoreTest.PASSWORD)  # Same password, but another salt
+        self.assertIsNone(keystore.get_account_by_name('first'))
+        self.assertIsNone(keystore.get_account_by_address(KeystoreTest.ADDRESS_1))
+        self.assertIsNone(keystore.get_accounts())
+        os.remove(self.filename)
+        self.assertIsNone(keystore.get_accounts())
+
+    def test_malformed_record_does_not_hide_the_following_ones(self):
+        keystore = Keystore(self.filename)
+        keystore.create(KeystoreTest.PASSWORD)
+        keystore.add_account('first', KeystoreTest.ADDRESS_1, None)
+        with open(self.filename, 'ab') as file:
+            file.write(b'malformed record\n')
+        keystore = self._reopen()
+        keystore.add_account('second', KeystoreTest.ADDRESS_2, None)
+        keystore = self._reopen()
+        self.assertEqual([a[JSON_ACCOUNT_NAME_TAG] for a in keystore.get_accounts()], ['first', 'second'])
+        with open(self.filename, 'rb') as file:
+            self.assertIn(b'malformed record\n', file.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import threading
+import unittest
+from pygeek_stellar.mock_horizon import *
+
+
+class MockHorizonTest(unittest.TestCase):
+
+    def setUp(self):
+        self.horizon = MockHorizon(seed=1)
+        set_horizon_url(self.horizon.start())
+        (self.address_1, self.seed_1), (self.address_2, self.seed_2) = generate_keypairs(2)
+        self.horizon.fund_account(self.address_1)
+
+    def tearDown(self):
+        set_horizon_url(None)
+        self.horizon.stop()
+        forget_account_state(self.address_1, self.address_2)
+
+    def test_payments(self):
+        response = submit_operations(self.seed_1, [create_account_creation_op(self.address_2, '100')], '')
+        self.assertTrue(is_successful_submit_response(response))
+        response = submit_operations(self.seed_2, [create_payment_op(self.address_1, '200')], '')
+        self.assertEqual(response['extras']['result_codes'], {'transaction': 'tx_failed',
+                                                              'operations': ['op_underfunded']})
+        response = submit_operations(self.seed_2, [create_payment_op(self.address_1, '10.5')], 'memo')
+        self.assertEqual(get_submit_response_transaction_result(response).code, 'tx_success')
+
+        # The failed transaction consumed its sequence number and fee
+        self.assertEqual(get_account_balances(self.address_2, fresh=True), {('XLM', None): 895000000 - 200})
+        self.assertEqual(get_account_balances(self.address_1, fresh=True), {('XLM', None): 99105000000 - 100})
+        self.assertEqual([(p['type'], p.get('amount')) for p in iter_account_payments(self.address_2)],
+                         [('create_account', None), ('payment', '10.5000000')])
+        self.assertEqual([t.get('memo') for t in iter_account_transactions(self.address_2)], ['', 'memo'])
+
+    def test_payment_spans(self):
+        self.horizon.fund_account(self.address_2)
+        reset_latency_stats()
+        set_prompts_enabled(False)  # The confirmation is accepted
+        try:
+            with command_span('send_xlm_payment'):
+                send_payment(self.address_1, self.seed_1, self.address_2, 'XLM', '1', None, '')
+        finally:
+            set_prompts_enabled(True)
+        spans = {s.span: s.count for s in get_latency_stats() if s.command == 'send_xlm_payment'}
+        reset_latency_stats()
+        self.assertEqual(spans[COMMAND_SPAN], 1)
+        self.assertTrue(spans['account_query'] >= 1)  # At least the sequence number fetch
+        self.assertEqual([spans.get(span) for span in ['sequence_allocation', 'transaction_signing',
+                                                       'transaction_submit']], [1, 1, 1])
+
+    def test_transactions_are_checked(self):
+        from stellar_base.keypair import Keypair
+
+        operations = [create_payment_op(self.address_2, '1')]
+        sequence = int(self.horizon.get_account(self.address_1)['sequence'])
+        envelope = build_transaction_envelope(self.address_1, sequence + 1, operations, '', [Keypair.from_seed(
+            self.seed_1)])
+        status, response = self.horizon.submit_transaction(envelope.xdr().decode())
+        self.assertEqual((status, response['extras']['result_codes']), (400, {'transaction': 'tx_bad_seq'}))
+
+        envelope = build_transaction_envelope(self.address_1, sequence, operations, '', [Keypair.from_seed(
+            self.seed_2)])
+        status, response = self.horizon.submit_transaction(envelope.xdr().decode())
+        self.assertEqual((status, response['extras']['result_codes']), (400, {'transaction': 'tx_bad_auth'}))
+        self.assertEqual(self.horizon.get_account(self.address_1)['sequence'], str(sequence))
+
+    def test_watch_payments(self):
+        payments = []
+        watcher = threading.Thread(target=lambda: payments.extend(
+            watch_account_payments(self.address_2, cursor='0', limit=2)))
+        watcher.start()
+        for operation in [create_account_creation_op(self.address_2, '100'), create_payment_op(self.address_2, '5')]:
+            self.assertTrue(is_successful_submit_response(submit_operations(self.seed_1, [operation], '')))
+        watcher.join(10)
+        self.assertEqual([p['type'] for p in payments], ['create_account', 'payment'])
+
+    def test_error_and_rate_limit_injection(self):
+        import requests
+
+        self.horizon.rate_limit = 5
+        self.horizon.error_rate = 0.5
+        responses = [requests.get('{}/accounts/{}'.format(self.horizon.url, self.address_1)) for _ in range(8)]
+        statuses = [response.status_code for response in responses]
+        self.assertEqual(statuses[5:], [429] * 3)
+        self.assertEqual(set(statuses[:5]), {200, 503})
+        self.assertEqual([response.headers['X-RateLimit-Remaining'] for response in responses],
+                         ['4', '3', '2', '1', '0', '0', '0', '0'])
+        self.assertEqual(self.horizon.request_counts[('GET /accounts/{address}', 429)], 3)
+
+    def test_requests_are_scheduled_within_the_rate_limit(self):
+        import time
+
+        addresses = [address for address, _ in generate_keypairs(30)]
+        for address in addresses:
+            self.horizon.fund_account(address)
+        self.horizon.rate_limit = 10
+        self.horizon.rate_limit_window = 1  # A burst of 10 requests, then 10 requests per second
+        start = time.monotonic()
+        balances = get_balances_many(addresses, fresh=True)
+        elapsed = time.monotonic() - start
+        self.assertEqual([error for _, _, error in balances], [None] * len(addresses))
+        self.assertEqual(self.horizon.request_counts[('GET /accounts/{address}', 429)], 0)
+        self.assertTrue(1.8 < elapsed < 4, elapsed)
+
+
+if __name__ == '__main__':
+    unittest.main()
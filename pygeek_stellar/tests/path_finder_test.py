@@ -0,0 +1,174 @@
+import os
+import tempfile
+import time
+import unittest
+from pygeek_stellar.path_finder import *
+from pygeek_stellar.tests.horizon_stand_in import *
+
+ISSUER = 'GB3I37MLME4LC5LVAKRTKSKE2K7X5VR4MEBVG3EVHMB2C6V6J5A3XC6L'
+XLM = ('XLM', None)
+USD = ('USD', ISSUER)
+EUR = ('EUR', ISSUER)
+BTC = ('BTC', ISSUER)
+
+
+def _horizon_asset(asset):
+    if asset == XLM:
+        return {'asset_type': 'native'}
+    return {'asset_type': 'credit_alphanum4', 'asset_code': asset[0], 'asset_issuer': asset[1]}
+
+
+def _order_book(base, counter, asks=(), bids=()):
+    """
+    Creates a Horizon order book of the base/counter pair with the given (amount, price_n, price_d) asks and bids.
+    """
+    def offers(entries):
+        return [{'amount': amount, 'price_r': {'n': n, 'd': d}, 'price': str(n / d)} for amount, n, d in entries]
+    return {'base': _horizon_asset(base), 'counter': _horizon_asset(counter), 'asks': offers(asks),
+            'bids': offers(bids)}
+
+
+def _invert_order_book(order_book):
+    """
+    Creates the order book of the counter/base pair of a Horizon order book: its asks are the bids of the
+    base/counter pair and its bids are the asks, at inverted prices.
+    """
+    def offers(entries):
+        return [dict(offer, price_r={'n': offer['price_r']['d'], 'd': offer['price_r']['n']},
+                     price=str(offer['price_r']['d'] / offer['price_r']['n'])) for offer in entries]
+    return {'base': order_book['counter'], 'counter': order_book['base'], 'asks': offers(order_book['bids']),
+            'bids': offers(order_book['asks'])}
+
+
+# Fixture order books: XLM is sold for EUR directly at 1 EUR (10 XLM) and 2 EUR (5 XLM) per XLM. Through USD,
+# 1000 XLM are sold at 1.25 USD per XLM and 2000 USD at 1.02 EUR per USD (1.275 EUR per XLM)
+FIXTURE_ORDER_BOOKS = [
+    _order_book(XLM, EUR, asks=[('10.0000000', 1, 1), ('5.0000000', 2, 1)]),
+    _order_book(XLM, USD, asks=[('1000.0000000', 5, 4)], bids=[('800.0000000', 1, 1)]),
+    _order_book(USD, EUR, asks=[('2000.0000000', 51, 50)]),
+    _order_book(BTC, EUR, asks=[('1.0000000', 10000, 1)]),
+]
+
+
+class OrderBookGraphTest(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = OrderBookGraph()
+        for order_book in FIXTURE_ORDER_BOOKS:
+            self.graph.update_order_book(order_book)
+
+    def test_find_strict_receive_paths(self):
+        # The direct order book is the cheapest for small amounts
+        paths = self.graph.find_strict_receive_paths(EUR, XLM, amount_to_stroops('10'))
+        self.assertEqual(paths[0], PaymentPath(EUR, amount_to_stroops('10'), XLM, amount_to_stroops('10'), []))
+        # But it is not deep enough for 100 XLM: 125 USD at 1.02 EUR per USD
+        paths = self.graph.find_strict_receive_paths(EUR, XLM, amount_to_stroops('100'))
+        self.assertEqual(paths, [PaymentPath(EUR, amount_to_stroops('127.5'), XLM, amount_to_stroops('100'), [USD])])
+        self.assertEqual(self.graph.find_strict_receive_paths(EUR, XLM, amount_to_stroops('100'), max_path_length=0),
+                         [])
+        self.assertEqual(self.graph.find_strict_receive_paths(EUR, XLM, amount_to_stroops('2000')), [])
+        self.assertEqual(self.graph.find_strict_receive_paths(XLM, BTC, 1), [])
+
+    def test_find_strict_send_paths(self):
+        # 20 EUR buy 10 XLM at 1 EUR and 5 XLM at 2 EUR directly, but 15.6862744 XLM through USD
+        paths = self.graph.find_strict_send_paths(EUR, amount_to_stroops('20'), XLM)
+        self.assertEqual([(p.destination_amount, p.path) for p in paths],
+                         [(amount_to_stroops('15.6862744'), [USD]), (amount_to_stroops('15'), [])])
+        # The direct order book cannot buy 25 EUR
+        paths = self.graph.find_strict_send_paths(EUR, amount_to_stroops('25'), XLM)
+        self.assertEqual([p.path for p in paths], [[USD]])
+        # The USD bids buy XLM at 1 USD per XLM
+        paths = self.graph.find_strict_send_paths(XLM, amount_to_stroops('3'), USD)
+        self.assertEqual(paths, [PaymentPath(XLM, amount_to_stroops('3'), USD, amount_to_stroops('3'), [])])
+
+    def test_update_order_book_replaces_edges(self):
+        self.graph.update_order_book(_order_book(XLM, EUR, asks=[('1000.0000000', 1, 2)]))
+        paths = self.graph.find_strict_receive_paths(EUR, XLM, amount_to_stroops('100'))
+        self.assertEqual(paths[0], PaymentPath(EUR, amount_to_stroops('50'), XLM, amount_to_stroops('100'), []))
+        self.assertEqual(len(self.graph.get_asset_pairs()), len(FIXTURE_ORDER_BOOKS))
+        with self.assertRaises(ValueError):
+            self.graph.update_order_book({'base': _horizon_asset(XLM)})
+
+    def test_snapshot(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'order_books.json')
+            self.assertTrue(self.graph.save(filename))
+            graph = OrderBookGraph()
+            self.assertTrue(graph.load(filename))
+        self.assertEqual(sorted(graph.get_asset_pairs()), sorted(self.graph.get_asset_pairs()))
+        self.assertEqual(graph.find_strict_receive_paths(EUR, XLM, amount_to_stroops('100')),
+                         self.graph.find_strict_receive_paths(EUR, XLM, amount_to_stroops('100')))
+
+
+def _canonical_asset(record):
+    if record['asset_type'] == 'native':
+        return 'native'
+    return '{}:{}'.format(record['asset_code'], record['asset_issuer'])
+
+
+class _HorizonStandInHandler(HorizonStandInHandler):
+    """
+    Serves /order_book (of either orientation of the fixture pairs) and /offers out of the fixture order books,
+    recording the requested order book pairs on the server queries.
+    """
+
+    def do_GET(self):
+        path, query = self._get_query()
+        if path == '/offers':
+            self._send_json(200, {'_embedded': {'records': [
+                offer for offer in self._get_offers() if all(
+                    _canonical_asset(offer[side]) == query[side]
+                    for side in ('selling', 'buying') if side in query)]}})
+            return
+        pair = (query.get('selling_asset_code', 'XLM'), query.get('buying_asset_code', 'XLM'))
+        self.server.queries.append(pair)
+        for order_book in FIXTURE_ORDER_BOOKS:
+            if (order_book['base'].get('asset_code', 'XLM'), order_book['counter'].get('asset_code', 'XLM')) == pair:
+                self._send_json(200, order_book)
+                return
+            if (order_book['counter'].get('asset_code', 'XLM'), order_book['base'].get('asset_code', 'XLM')) == pair:
+                self._send_json(200, _invert_order_book(order_book))
+                return
+        self._send_json(404, {'status': 404, 'title': 'Resource Missing'})
+
+    @staticmethod
+    def _get_offers():
+        offers = []
+        for order_book in FIXTURE_ORDER_BOOKS:
+            offers += [{'selling': order_book['base'], 'buying': order_book['counter']}] * len(order_book['asks'])
+            offers += [{'selling': order_book['counter'], 'buying': order_book['base']}] * len(order_book['bids'])
+        return offers
+
+
+class OrderBookGraphRefreshTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = start_horizon_stand_in(self, _HorizonStandInHandler)
+        self.server.queries = []
+
+    def test_only_stale_order_books_are_fetched(self):
+        graph = OrderBookGraph(max_age=60)
+        self.assertEqual(graph.add_assets([XLM, USD, EUR]), 3)
+        self.assertEqual(sorted(self.server.queries), [('USD', 'EUR'), ('XLM', 'EUR'), ('XLM', 'USD')])
+        self.assertEqual(graph.find_strict_receive_paths(EUR, XLM, amount_to_stroops('100'))[0].path, [USD])
+
+        self.server.queries = []
+        graph.update_order_book(FIXTURE_ORDER_BOOKS[0], fetched_at=time.time() - 120)
+        self.assertEqual(graph.add_assets([EUR, XLM, USD]), 1)
+        self.assertEqual(self.server.queries, [('XLM', 'EUR')])
+
+    def test_discover_traded_assets(self):
+        # USD is offered for XLM (twice) and for EUR, BTC only for EUR
+        self.assertEqual(discover_traded_assets([EUR, XLM]), [USD, BTC])
+        self.assertEqual(discover_traded_assets([EUR, XLM], limit=1), [USD])
+        self.assertEqual(discover_traded_assets([BTC]), [EUR])
+
+        graph = OrderBookGraph()
+        graph.add_assets([EUR, XLM])
+        self.assertEqual(graph.find_strict_receive_paths(EUR, XLM, amount_to_stroops('100')), [])
+        graph.add_assets([EUR, XLM] + discover_traded_assets([EUR, XLM], limit=1))
+        self.assertEqual(graph.find_strict_receive_paths(EUR, XLM, amount_to_stroops('100'))[0].path, [USD])
+
+
+if __name__ == '__main__':
+    unittest.main()
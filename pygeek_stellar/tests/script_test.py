@@ -0,0 +1,113 @@
+import io
+import os
+import tempfile
+import threading
+import unittest
+from cmd import Cmd
+from contextlib import redirect_stdout
+from unittest import mock
+from pygeek_stellar.cli_session import *
+from pygeek_stellar.geek_stellar_cmd import GeekStellarCmd
+from pygeek_stellar.keystore import Keystore
+from pygeek_stellar.mock_horizon import *
+from pygeek_stellar.script import *
+
+
+class _RecordingCmd(Cmd):
+    """
+    Command interpreter whose read-only 'query' commands wait for each other, so they only finish if
+    they run concurrently, and whose 'send' commands record the queries finished before them. Its 'sync'
+    commands are only read-only with --local.
+    """
+
+    READ_ONLY_COMMANDS = ['query']
+    READ_ONLY_WITH_FLAGS_COMMANDS = {'sync': ['--local']}
+
+    def __init__(self, n_concurrent_queries):
+        super(_RecordingCmd, self).__init__()
+        self.barrier = threading.Barrier(n_concurrent_queries, timeout=5)
+        self.finished_queries = []
+
+    def do_query(self, args):
+        self.barrier.wait()
+        print('query {}'.format(args))
+        self.finished_queries.append(args)
+
+    def do_send(self, args):
+        print('send after {}'.format(','.join(sorted(self.finished_queries))))
+
+    def do_sync(self, args):
+        print('sync {} on {} thread'.format(args, 'main' if threading.current_thread() is threading.main_thread()
+                                            else 'worker'))
+
+    def do_ask(self, args):
+        if yes_or_no_input('Proceed?') == USER_INPUT_YES:
+            safe_input('Value')
+
+    def do_quit(self, args):
+        raise SystemExit
+
+
+class ScriptTest(unittest.TestCase):
+
+    def _run(self, cmd, script):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            run_script(cmd, script.splitlines(), concurrency=4)
+        return output.getvalue().splitlines()
+
+    def test_read_only_commands_run_concurrently_in_order(self):
+        cmd = _RecordingCmd(3)
+        lines = self._run(cmd, '# comment\nquery 1\n\nquery 2\nquery 3\nsend\nquery 4\nquery 5\nquery 6\nsend\n')
+        self.assertEqual(lines, ['query 1', 'query 2', 'query 3', 'send after 1,2,3',
+                                 'query 4', 'query 5', 'query 6', 'send after 1,2,3,4,5,6'])
+
+    def test_commands_read_only_with_flags(self):
+        lines = self._run(_RecordingCmd(1), 'sync a\nsync --local b\nsync c\n')
+        self.assertEqual(lines, ['sync a on main thread', 'sync --local b on worker thread', 'sync c on main thread'])
+
+    def test_prompts_are_disabled(self):
+        lines = self._run(_RecordingCmd(1), 'ask\nquit\nsend\n')
+        self.assertEqual(lines, ["The command 'ask' was aborted since it requires user input: Value"])
+        self.assertTrue(are_prompts_enabled())
+
+
+class ScriptKeystoreTest(unittest.TestCase):
+    """
+    Runs scripts whose commands reopen the configuration file, on a temporary keystore and a mock Horizon.
+    """
+
+    PASSWORD = 'script password'
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.keystore_file = os.path.join(self.directory.name, 'keystore')
+        for name, filename in [('DEFAULT_KEYSTORE_FILE', self.keystore_file),
+                               ('DEFAULT_CONFIG_FILE', os.path.join(self.directory.name, 'config'))]:
+            file_patch = mock.patch('pygeek_stellar.cli_session.' + name, filename)
+            file_patch.start()
+            self.addCleanup(file_patch.stop)
+        self.assertTrue(Keystore(self.keystore_file).create(ScriptKeystoreTest.PASSWORD))
+
+        self.horizon = MockHorizon(seed=1)
+        set_horizon_url(self.horizon.start())
+        self.addCleanup(self.horizon.stop)
+        self.addCleanup(set_horizon_url, None)
+        ((self.address, self.seed),) = generate_keypairs(1)
+        self.horizon.fund_account(self.address)
+
+    def test_commands_reopening_the_keystore_use_the_password_variable(self):
+        cmd = GeekStellarCmd(CliSession('main', self.address, self.seed))
+        with mock.patch.dict(os.environ, {CONFIG_FILE_PASSWORD_ENV_VAR: ScriptKeystoreTest.PASSWORD}):
+            with redirect_stdout(io.StringIO()):
+                run_script(cmd, ['generate_accounts 2 1 --name-prefix script'])
+
+        keystore = Keystore(self.keystore_file)
+        self.assertTrue(keystore.open(ScriptKeystoreTest.PASSWORD))
+        addresses = [keystore.get_account_by_name('script-{}'.format(i))[JSON_ACCOUNT_ADDRESS_TAG] for i in (1, 2)]
+        self.assertEqual([self.horizon.get_account(address) is not None for address in addresses], [True, True])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import threading
+import unittest
+from pygeek_stellar.sequence_allocator import *
+
+
+class SequenceAllocatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fetches = []
+        self.network_sequences = {'A': 100, 'B': 200}
+
+    def _fetch_sequence(self, address):
+        self.fetches.append(address)
+        return self.network_sequences.get(address)
+
+    def test_allocate(self):
+        allocator = SequenceAllocator(self._fetch_sequence)
+        self.assertEqual([allocator.allocate('A') for _ in range(3)], [100, 101, 102])
+        self.assertEqual(allocator.allocate('B'), 200)
+        self.assertEqual(allocator.allocate('A'), 103)
+        self.assertEqual(self.fetches, ['A', 'B'])
+
+    def test_resync(self):
+        allocator = SequenceAllocator(self._fetch_sequence)
+        allocator.allocate('A')
+        allocator.allocate('A')
+        self.network_sequences['A'] = 101  # Only the first transaction was consumed by the network
+        allocator.resync('A')
+        self.assertEqual(allocator.allocate('A'), 101)
+        self.assertEqual(self.fetches, ['A', 'A'])
+
+    def test_failed_fetch(self):
+        allocator = SequenceAllocator(self._fetch_sequence)
+        self.assertIsNone(allocator.allocate('C'))
+        self.assertIsNone(allocator.allocate('C'))
+        self.assertEqual(self.fetches, ['C', 'C'])
+
+    def test_concurrent_allocations_are_unique(self):
+        allocator = SequenceAllocator(self._fetch_sequence)
+        sequences = []
+        threads = [threading.Thread(target=lambda: sequences.extend(allocator.allocate('A') for _ in range(100)))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(sequences), list(range(100, 900)))
+        self.assertEqual(self.fetches, ['A'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import os
+import subprocess
+import sys
+import unittest
+
+import pygeek_stellar
+
+
+class StartupTest(unittest.TestCase):
+    """
+    Tracks the time taken to import pygeek_stellar, as reported by 'python -X importtime', which is
+    paid on every invocation of the CLI (e.g. on every script run).
+    """
+
+    # Dependencies which must only be imported when first used
+    LAZY_MODULES = ['stellar_base', 'cryptography', 'requests', 'urllib3', 'numpy']
+    # Before the heavy dependencies were imported lazily importing pygeek_stellar took ~270 ms
+    IMPORT_TIME_THRESHOLD_US = 100000
+    RUNS = 3
+
+    @staticmethod
+    def _import_times():
+        """
+        Imports pygeek_stellar on a new interpreter.
+        :return: Returns the cumulative import time, in microseconds, of each imported module.
+        :rtype: dict
+        """
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.path.dirname(os.path.dirname(os.path.abspath(pygeek_stellar.__file__)))
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import pygeek_stellar'],
+                                env=env, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+        times = {}
+        for line in result.stderr.splitlines():
+            fields = line.split('|')
+            if len(fields) == 3 and fields[1].strip().isdigit():
+                times[fields[2].strip()] = int(fields[1])
+        return times
+
+    def test_heavy_dependencies_are_imported_lazily(self):
+        imported = [module.split('.')[0] for module in StartupTest._import_times()]
+        for module in StartupTest.LAZY_MODULES:
+            self.assertNotIn(module, imported)
+
+    def test_import_time(self):
+        import_time = min(StartupTest._import_times()['pygeek_stellar'] for _ in range(StartupTest.RUNS))
+        self.assertLess(import_time, StartupTest.IMPORT_TIME_THRESHOLD_US,
+                        'Importing pygeek_stellar took {} ms'.format(import_time / 1000))
+
+
+if __name__ == '__main__':
+    unittest.main()
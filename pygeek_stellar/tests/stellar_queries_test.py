@@ -0,0 +1,183 @@
+import json
+import sys
+import unittest
+from datetime import datetime
+from unittest import mock
+from pygeek_stellar.stellar_queries import *
+from pygeek_stellar.tests.horizon_stand_in import *
+
+
+class _HorizonStandInHandler(HorizonStandInHandler):
+    """
+    Serves /accounts/{address} for a single existent account and /accounts/{address}/payments pages out of
+    a list of 300 payments, one per day of 28 days months.
+    """
+
+    EXISTENT_ADDRESS = 'GB3I37MLME4LC5LVAKRTKSKE2K7X5VR4MEBVG3EVHMB2C6V6J5A3XC6L'
+
+    RECORDS = [{'paging_token': str(i), 'created_at': '2019-{:02d}-{:02d}T00:00:00Z'.format(i // 28 + 1, i % 28 + 1)}
+               for i in range(1, 301)]
+
+    def do_GET(self):
+        path, query = self._get_query()
+        if not path.endswith('/payments'):
+            if path.endswith(_HorizonStandInHandler.EXISTENT_ADDRESS):
+                self._send_json(200, {'sequence': '1', 'balances': [{'asset_type': 'native', 'balance': '10.5'}]})
+            else:
+                self._send_json(404, {'status': 404, 'title': 'Resource Missing'})
+            return
+
+        self.server.queries.append(query)
+        descending = query.get('order') == 'desc'
+        records = list(reversed(_HorizonStandInHandler.RECORDS)) if descending else _HorizonStandInHandler.RECORDS
+        if 'cursor' in query:
+            cursor = int(query['cursor'])
+            records = [r for r in records if (int(r['paging_token']) < cursor if descending
+                                              else int(r['paging_token']) > cursor)]
+        self._send_json(200, {'_embedded': {'records': records[:int(query['limit'])]}})
+
+
+class StellarQueriesTest(unittest.TestCase):
+
+    ADDRESS = 'GB3I37MLME4LC5LVAKRTKSKE2K7X5VR4MEBVG3EVHMB2C6V6J5A3XC6L'
+
+    def setUp(self):
+        self.server = start_horizon_stand_in(self, _HorizonStandInHandler)
+        self.server.queries = []
+
+    def test_iter_account_payments_follows_cursors(self):
+        payments = list(iter_account_payments(StellarQueriesTest.ADDRESS))
+        self.assertEqual([p['paging_token'] for p in payments], [str(i) for i in range(1, 301)])
+        self.assertEqual([q.get('cursor') for q in self.server.queries], [None, '200'])
+
+    def test_iter_account_payments_limit(self):
+        payments = list(iter_account_payments(StellarQueriesTest.ADDRESS, limit=250))
+        self.assertEqual(len(payments), 250)
+        self.assertEqual([q['limit'] for q in self.server.queries], ['200', '50'])
+
+    def test_iter_account_payments_since(self):
+        since = datetime(2019, 10, 1)
+        payments = list(iter_account_payments(StellarQueriesTest.ADDRESS, order='desc', since=since))
+        self.assertEqual([p['paging_token'] for p in payments], [str(i) for i in range(300, 251, -1)])
+        self.assertEqual(len(self.server.queries), 1)
+        payments = list(iter_account_payments(StellarQueriesTest.ADDRESS, order='asc', since=since))
+        self.assertEqual([p['paging_token'] for p in payments], [str(i) for i in range(252, 301)])
+
+    def test_get_balances_many(self):
+        missing_address = 'GA6S6WSZVDBJQFEGYPZO7D5HWQINTIOSCKR5PAJRGZ4ZI2H7HED6V5RX'
+        addresses = [StellarQueriesTest.ADDRESS, missing_address, 'invalid_address', StellarQueriesTest.ADDRESS]
+        results = get_balances_many(addresses, concurrency=4, fresh=True)
+        self.assertEqual([result[0] for result in results], addresses)
+        self.assertEqual(results[0], (StellarQueriesTest.ADDRESS, {('XLM', None): 105000000}, None))
+        self.assertEqual(results[3], results[0])
+        for _, balances, error in results[1:3]:
+            self.assertIsNone(balances)
+            self.assertIsNotNone(error)
+
+    def test_aggregate_balances(self):
+        eur = ('EUR', StellarQueriesTest.ADDRESS)
+        accounts_balances = [
+            ('A1', {('XLM', None): 105000000, eur: 1}),
+            ('A2', {('XLM', None): 20000000}),
+            ('A3', {('XLM', None): 1, eur: 0}),
+            ('A4', {eur: STELLAR_AMOUNT_MAX_STROOPS})]
+        with mock.patch.dict(sys.modules, {'numpy': None}):  # Makes importing NumPy fail
+            fallback_aggregation = aggregate_balances(accounts_balances)
+        for aggregation in [aggregate_balances(accounts_balances), fallback_aggregation]:
+            self.assertEqual(aggregation.accounts, ['A1', 'A2', 'A3', 'A4'])
+            self.assertEqual(aggregation.assets, [('XLM', None), eur])
+            self.assertEqual(list(map(list, aggregation.balances)), [[105000000, 1], [20000000, 0], [1, 0],
+                                                                     [0, STELLAR_AMOUNT_MAX_STROOPS]])
+            # The EUR total does not fit in an int64
+            self.assertEqual(aggregation.totals, [125000001, STELLAR_AMOUNT_MAX_STROOPS + 1])
+            self.assertEqual(aggregation.holders, [3, 3])
+        self.assertIsInstance(fallback_aggregation.balances, list)
+
+        aggregation = aggregate_balances([])
+        self.assertEqual((aggregation.accounts, aggregation.totals, aggregation.holders), ([], [], []))
+        with mock.patch.dict(sys.modules, {'numpy': None}):
+            aggregation = aggregate_balances([])
+        self.assertEqual((aggregation.accounts, aggregation.totals, aggregation.holders), ([], [], []))
+
+
+class _HorizonStreamStandInHandler(HorizonStandInHandler):
+    """
+    Serves the /accounts/{address}/payments server-sent events stream. Each connection is answered with
+    the next response of the server responses list: an HTTP error status code or a list of payment paging
+    tokens, streamed in chunked encoding (as Horizon does) after the initial "hello" message.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.cursors.append(self._get_query()[1]['cursor'])
+        response = self.server.responses.pop(0)
+        if isinstance(response, int):
+            self.send_response(response)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        self._send_chunk('retry: 10\nevent: open\ndata: "hello"\n\n')
+        for paging_token in response:
+            event = 'id: {}\ndata: {}\n\n'.format(paging_token, json.dumps({'paging_token': paging_token}))
+            # Events split across chunks
+            self._send_chunk(event[:10])
+            self._send_chunk(event[10:])
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _send_chunk(self, data):
+        data = data.encode()
+        self.wfile.write('{:x}\r\n'.format(len(data)).encode() + data + b'\r\n')
+        self.wfile.flush()
+
+
+class WatchPaymentsTest(unittest.TestCase):
+
+    ADDRESS = 'GB3I37MLME4LC5LVAKRTKSKE2K7X5VR4MEBVG3EVHMB2C6V6J5A3XC6L'
+
+    def setUp(self):
+        self.server = start_horizon_stand_in(self, _HorizonStreamStandInHandler)
+        self.server.cursors = []
+
+    def test_watch_account_payments_reconnects_from_last_paging_token(self):
+        self.server.responses = [['4', '5'], 503, ['6'], ['7', '8']]
+        with mock.patch('time.sleep') as sleep:
+            payments = list(watch_account_payments(WatchPaymentsTest.ADDRESS, limit=4))
+        self.assertEqual([p['paging_token'] for p in payments], ['4', '5', '6', '7'])
+        self.assertEqual(self.server.cursors, [HORIZON_STREAM_CURSOR_NOW, '5', '5', '6'])
+        # Every reconnection waits the retry delay sent by the stream (10 ms)
+        self.assertEqual([c.args[0] for c in sleep.call_args_list], [0.01, 0.01, 0.01])
+
+    def test_watch_account_payments_backs_off_streams_closed_without_records(self):
+        from stellar_base.exceptions import HorizonError
+
+        self.server.responses = [[]] * HORIZON_STREAM_MAX_FAILED_CONNECTIONS
+        with mock.patch('time.sleep') as sleep:
+            with self.assertRaises(HorizonError):
+                next(watch_account_payments(WatchPaymentsTest.ADDRESS, cursor='3'))
+        self.assertEqual(self.server.cursors, ['3'] * HORIZON_STREAM_MAX_FAILED_CONNECTIONS)
+        self.assertEqual([c.args[0] for c in sleep.call_args_list],
+                         [min(HORIZON_STREAM_MAX_RETRY_SECONDS, 0.01 * 2 ** i)
+                          for i in range(HORIZON_STREAM_MAX_FAILED_CONNECTIONS - 1)])
+
+    def test_watch_account_payments_errors(self):
+        from stellar_base.exceptions import HorizonError
+
+        self.server.responses = [404]
+        with self.assertRaises(HorizonError):
+            next(watch_account_payments(WatchPaymentsTest.ADDRESS))
+
+        self.server.responses = [503] * HORIZON_STREAM_MAX_FAILED_CONNECTIONS
+        with mock.patch('pygeek_stellar.stellar_queries.HORIZON_STREAM_RETRY_SECONDS', 0):
+            with self.assertRaises(HorizonError):
+                next(watch_account_payments(WatchPaymentsTest.ADDRESS, cursor='3'))
+        self.assertEqual(self.server.cursors[1:], ['3'] * HORIZON_STREAM_MAX_FAILED_CONNECTIONS)
+
+
+if __name__ == '__main__':
+    unittest.main()
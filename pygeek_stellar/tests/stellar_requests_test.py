@@ -0,0 +1,178 @@
+import base64
+import json
+import os
+import struct
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from pygeek_stellar.stellar_requests import *
+
+
+class StellarRequestsTest(unittest.TestCase):
+
+    ADDRESS_1 = 'GB3I37MLME4LC5LVAKRTKSKE2K7X5VR4MEBVG3EVHMB2C6V6J5A3XC6L'
+    SEED_1 = 'SADGEOC6FE5KQJMC7O65HNURFZTB6SLJDM5JB665NSWOGVBEGRRGC3KK'
+    ADDRESS_2 = 'GA6S6WSZVDBJQFEGYPZO7D5HWQINTIOSCKR5PAJRGZ4ZI2H7HED6V5RX'
+
+    def setUp(self):
+        fd, self.payments_file = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.payments_file)
+
+    def _write_payments_file(self, lines):
+        with open(self.payments_file, 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+
+    def test_read_batch_payments_file(self):
+        self._write_payments_file([
+            'destination,asset,amount,memo',
+            '{},XLM,10.5,salary'.format(StellarRequestsTest.ADDRESS_2),
+            '{},EUR:{},3,'.format(StellarRequestsTest.ADDRESS_2, StellarRequestsTest.ADDRESS_2),
+            '{},XLM,10,'.format(StellarRequestsTest.ADDRESS_1),
+            '{},XLM,0.00000001,'.format(StellarRequestsTest.ADDRESS_2),
+            '{},EUR,1,'.format(StellarRequestsTest.ADDRESS_2),
+            'invalid_address,XLM,1,'])
+
+        rows = list(read_batch_payments_file(self.payments_file, StellarRequestsTest.ADDRESS_1))
+        self.assertEqual([row[0] for row in rows], [2, 3, 4, 5, 6, 7])
+        self.assertEqual(rows[0][1], BatchPayment(2, StellarRequestsTest.ADDRESS_2, 'XLM', None, '10.5', 'salary'))
+        self.assertEqual(rows[1][1], BatchPayment(3, StellarRequestsTest.ADDRESS_2, 'EUR',
+                                                  StellarRequestsTest.ADDRESS_2, '3', ''))
+        self.assertIsNone(rows[0][2])
+        self.assertIsNone(rows[1][2])
+        for _, payment, error in rows[2:]:
+            self.assertIsNone(payment)
+            self.assertIsNotNone(error)
+
+    def test_batch_payments_summary_totals_per_issuer(self):
+        self._write_payments_file([
+            'destination,asset,amount,memo',
+            '{},USD:{},3,'.format(StellarRequestsTest.ADDRESS_2, StellarRequestsTest.ADDRESS_1),
+            '{},USD:{},2,'.format(StellarRequestsTest.ADDRESS_2, StellarRequestsTest.ADDRESS_2),
+            '{},USD:{},1.5,'.format(StellarRequestsTest.ADDRESS_2, StellarRequestsTest.ADDRESS_1),
+            '{},XLM,10,'.format(StellarRequestsTest.ADDRESS_2)])
+        with mock.patch('pygeek_stellar.stellar_requests.yes_or_no_input', return_value=USER_INPUT_NO) as question:
+            send_batch_payments(StellarRequestsTest.ADDRESS_1, StellarRequestsTest.SEED_1, self.payments_file)
+        self.assertIn('4 payments (4.5 USD:{}, 2 USD:{}, 10 XLM)'.format(StellarRequestsTest.ADDRESS_1,
+                                                                         StellarRequestsTest.ADDRESS_2),
+                      question.call_args.args[0])
+
+    def test_group_batch_payments(self):
+        payments = [BatchPayment(i, StellarRequestsTest.ADDRESS_2, 'XLM', None, '1', 'a') for i in range(250)]
+        payments += [BatchPayment(250, StellarRequestsTest.ADDRESS_2, 'XLM', None, '1', 'b')]
+        groups = list(group_batch_payments(iter(payments)))
+        self.assertEqual([len(group[1]) for group in groups], [100, 100, 50, 1])
+        self.assertEqual([group[0] for group in groups], ['a', 'a', 'a', 'b'])
+        self.assertEqual(list(group_batch_payments([])), [])
+
+    def test_submit_operations_through_channels(self):
+        in_flight = {}
+        submissions = []
+        lock = threading.Lock()
+
+        def submit(account_seed, operations, transaction_memo, channel_seed):
+            with lock:
+                self.assertFalse(in_flight.get(channel_seed), 'Two transactions in flight on the same channel')
+                in_flight[channel_seed] = True
+                submissions.append((transaction_memo, channel_seed))
+            time.sleep(0.01)
+            with lock:
+                in_flight[channel_seed] = False
+            return {'ledger': 1, 'memo': transaction_memo}
+
+        transactions = (([], str(i)) for i in range(7))
+        with mock.patch('pygeek_stellar.stellar_requests.submit_operations', side_effect=submit):
+            responses = list(submit_operations_through_channels('seed', ['channel 1', 'channel 2', 'channel 3'],
+                                                                transactions))
+
+        self.assertEqual([response['memo'] for response in responses], [str(i) for i in range(7)])
+        self.assertEqual(sorted(submissions), sorted((str(i), 'channel {}'.format(i % 3 + 1)) for i in range(7)))
+
+    def test_sign_batch_payments_offline(self):
+        from stellar_base.transaction_envelope import TransactionEnvelope
+
+        self._write_payments_file(['destination,amount,memo'] +
+                                  ['{},1,first'.format(StellarRequestsTest.ADDRESS_2)] * 150 +
+                                  ['{},2,second'.format(StellarRequestsTest.ADDRESS_2)])
+        fd, output_file = tempfile.mkstemp(suffix='.ndjson')
+        os.close(fd)
+        self.addCleanup(os.remove, output_file)
+
+        with mock.patch('pygeek_stellar.stellar_requests.get_horizon', side_effect=AssertionError('Network access')):
+            n_envelopes = sign_batch_payments_offline(StellarRequestsTest.ADDRESS_1, StellarRequestsTest.SEED_1,
+                                                      self.payments_file, 41, output_file)
+        self.assertEqual(n_envelopes, 3)
+
+        with open(output_file) as file:
+            records = [json.loads(line) for line in file]
+        self.assertEqual([record[SIGNED_ENVELOPE_LINES_TAG] for record in records], ['2-101', '102-151', '152-152'])
+        self.assertEqual([record[SIGNED_ENVELOPE_SEQUENCE_TAG] for record in records], [42, 43, 44])
+        for record in records:
+            envelope = TransactionEnvelope.from_xdr(record[SIGNED_ENVELOPE_XDR_TAG])
+            self.assertEqual(envelope.tx.source.decode(), StellarRequestsTest.ADDRESS_1)
+            self.assertEqual(envelope.tx.sequence, record[SIGNED_ENVELOPE_SEQUENCE_TAG])
+            self.assertEqual(len(envelope.signatures), 1)
+            self.assertEqual(envelope.hash_meta().hex(), record[SIGNED_ENVELOPE_HASH_TAG])
+        self.assertEqual(len(TransactionEnvelope.from_xdr(records[0][SIGNED_ENVELOPE_XDR_TAG]).tx.operations), 100)
+
+    @staticmethod
+    def _transaction_result_xdr(fee_charged, code, operations):
+        """
+        Packs a TransactionResult XDR whose operations are given as (operation result code, operation type,
+        operation type result code) tuples, for operation types whose result has no further fields.
+        """
+        xdr = struct.pack('>qi', fee_charged, code) + struct.pack('>I', len(operations))
+        for operation in operations:
+            xdr += struct.pack('>' + 'i' * len(operation), *operation)
+        return base64.b64encode(xdr + struct.pack('>i', 0)).decode()
+
+    def test_decode_transaction_result(self):
+        # A failed transaction with a successful create account, an underfunded payment, a change trust
+        # without issuer and an operation without a valid signature
+        xdr = StellarRequestsTest._transaction_result_xdr(400, -1, [(0, 0, 0), (0, 1, -2), (0, 6, -2), (-1,)])
+        tx_result = decode_transaction_result(xdr)
+        self.assertEqual((tx_result.code, tx_result.successful, tx_result.fee_charged), ('tx_failed', False, 400))
+        self.assertEqual([(o.index, o.type, o.code, o.successful) for o in tx_result.operations],
+                         [(0, 'create_account', 'op_success', True), (1, 'payment', 'op_underfunded', False),
+                          (2, 'change_trust', 'op_no_issuer', False), (3, None, 'op_bad_auth', False)])
+        self.assertEqual([o.index for o in get_failed_operation_results(tx_result)], [1, 2, 3])
+
+    def test_decode_transaction_result_with_result_fields(self):
+        # An account merge result also has the merged balance (int64), so the XDR unpacker is needed
+        xdr = StellarRequestsTest._transaction_result_xdr(200, 0, [(0, 1, 0), (0, 8, 0, 0, 5000)])
+        tx_result = decode_transaction_result(xdr)
+        self.assertEqual([(o.type, o.code) for o in tx_result.operations],
+                         [('payment', 'op_success'), ('account_merge', 'op_success')])
+        self.assertIsNone(tx_result.operations[0].result)
+        self.assertEqual(tx_result.operations[1].result.sourceAccountBalance, 5000)
+
+    def test_decode_transaction_result_with_unknown_operation_type(self):
+        import pygeek_stellar.stellar_requests as stellar_requests
+
+        # The account merge type is dropped from the lookup tables, as an operation type added after them
+        tx_result_codes, operation_result_codes, operation_types = stellar_requests._get_xdr_result_codes()
+        operation_types = {op_type: value for op_type, value in operation_types.items()
+                           if value[0] != 'account_merge'}
+        xdr = StellarRequestsTest._transaction_result_xdr(200, 0, [(0, 1, 0), (0, 8, 0, 0, 5000)])
+        with mock.patch('pygeek_stellar.stellar_requests._get_xdr_result_codes',
+                        return_value=(tx_result_codes, operation_result_codes, operation_types)):
+            self.assertIsNone(decode_transaction_result(xdr))
+            self.assertEqual(decode_transaction_results([xdr]), [None])
+
+    def test_decode_transaction_results(self):
+        successful_xdr = StellarRequestsTest._transaction_result_xdr(200, 0, [(0, 1, 0)] * 2)
+        bad_seq_xdr = base64.b64encode(struct.pack('>qii', 100, -5, 0)).decode()
+        tx_results = decode_transaction_results([successful_xdr, 'invalid', bad_seq_xdr, successful_xdr[:-8]])
+        self.assertEqual([r.code if r is not None else None for r in tx_results],
+                         ['tx_success', None, 'tx_bad_seq', None])
+        self.assertEqual([o.code for o in tx_results[0].operations], ['op_success'] * 2)
+        self.assertEqual(tx_results[2].operations, [])
+        self.assertEqual(get_submit_response_transaction_result({'extras': {'result_xdr': bad_seq_xdr}}), tx_results[2])
+
+
+if __name__ == '__main__':
+    unittest.main()
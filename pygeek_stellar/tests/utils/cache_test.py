@@ -0,0 +1,54 @@
+import time
+import unittest
+from pygeek_stellar.utils.cache import *
+
+
+class CacheTest(unittest.TestCase):
+
+    def test_get_and_put(self):
+        cache = TtlLruCache(ttl=None, max_size=10)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('a', 1), 1)
+        cache.put('a', 2)
+        self.assertEqual(cache.get('a'), 2)
+        cache.put('a', 3)
+        self.assertEqual(cache.get('a'), 3)
+        self.assertEqual(len(cache), 1)
+
+    def test_lru_eviction(self):
+        cache = TtlLruCache(ttl=None, max_size=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')  # 'b' becomes the least recently used entry
+        cache.put('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_ttl_expiration(self):
+        cache = TtlLruCache(ttl=0.05, max_size=10)
+        cache.put('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        time.sleep(0.06)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+    def test_invalidate_and_clear(self):
+        cache = TtlLruCache(ttl=60, max_size=10)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.invalidate('a')
+        cache.invalidate('unknown')
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('b'), 2)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+    def test_disabled_cache(self):
+        cache = TtlLruCache(ttl=60, max_size=0)
+        cache.put('a', 1)
+        self.assertIsNone(cache.get('a'))
+
+
+if __name__ == '__main__':
+    unittest.main()
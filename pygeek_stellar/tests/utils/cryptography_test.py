@@ -0,0 +1,45 @@
+import unittest
+from pygeek_stellar.utils.cryptography import *
+
+
+class CryptographyTest(unittest.TestCase):
+
+    PASSWORD = 'password'
+
+    def tearDown(self):
+        wipe_cryptographic_keys()
+
+    def test_encrypt_and_decrypt(self):
+        salt = generate_salt()
+        encrypted = encrypt(b'content', CryptographyTest.PASSWORD, salt)
+        self.assertEqual(decrypt(encrypted, CryptographyTest.PASSWORD, salt), b'content')
+        self.assertIsNone(decrypt(encrypted, 'wrong password', salt))
+        self.assertIsNone(decrypt(encrypted, CryptographyTest.PASSWORD, generate_salt()))
+
+    def test_encrypt_and_decrypt_with_header(self):
+        salt = generate_salt()
+        encrypted = encrypt_with_header(b'content', CryptographyTest.PASSWORD, salt)
+        self.assertEqual(get_content_salt(encrypted), salt)
+        self.assertEqual(decrypt_with_header(encrypted, CryptographyTest.PASSWORD), b'content')
+        self.assertIsNone(decrypt_with_header(encrypted, 'wrong password'))
+
+    def test_decrypt_legacy_content(self):
+        encrypted = encrypt(b'content', CryptographyTest.PASSWORD)
+        self.assertIsNone(get_content_salt(encrypted))
+        self.assertEqual(decrypt_with_header(encrypted, CryptographyTest.PASSWORD), b'content')
+
+    def test_derived_keys_are_cached_per_salt(self):
+        salt_1 = generate_salt()
+        salt_2 = generate_salt()
+        key = password2cryptographic_key(CryptographyTest.PASSWORD, salt_1)
+        self.assertIs(password2cryptographic_key(CryptographyTest.PASSWORD, salt_1), key)
+        self.assertNotEqual(password2cryptographic_key(CryptographyTest.PASSWORD, salt_2), key)
+        self.assertNotEqual(password2cryptographic_key('other password', salt_1), key)
+
+        wipe_cryptographic_keys()
+        self.assertIsNot(password2cryptographic_key(CryptographyTest.PASSWORD, salt_1), key)
+        self.assertEqual(password2cryptographic_key(CryptographyTest.PASSWORD, salt_1), key)
+
+
+if __name__ == '__main__':
+    unittest.main()
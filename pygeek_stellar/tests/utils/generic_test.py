@@ -46,6 +46,28 @@ class GenericTest(unittest.TestCase):
         self.assertFalse(is_successful_http_status_code(300))
         self.assertFalse(is_successful_http_status_code(400))
 
+    def test_pop_flag(self):
+        args = ['--fresh', 'address', '--fresh']
+        self.assertTrue(pop_flag(args, '--fresh'))
+        self.assertEqual(args, ['address'])
+        self.assertFalse(pop_flag(args, '--fresh'))
+        self.assertEqual(args, ['address'])
+
+    def test_pop_option(self):
+        args = ['address', '--limit', '10', '--order=desc', '--since']
+        self.assertEqual(pop_option(args, '--limit'), '10')
+        self.assertEqual(pop_option(args, '--order'), 'desc')
+        self.assertEqual(pop_option(args, '--output', 'default'), 'default')
+        self.assertEqual(pop_option(args, '--since'), '')
+        self.assertEqual(args, ['address'])
+
+    def test_parse_iso_datetime(self):
+        self.assertEqual(parse_iso_datetime('2019-01-31'), datetime(2019, 1, 31))
+        self.assertEqual(parse_iso_datetime('2019-01-31T10:20:30Z'), datetime(2019, 1, 31, 10, 20, 30))
+        self.assertEqual(parse_iso_datetime('2019-01-31T10:20:30'), datetime(2019, 1, 31, 10, 20, 30))
+        self.assertIsNone(parse_iso_datetime('31/01/2019'))
+        self.assertIsNone(parse_iso_datetime(None))
+
     def test_decode_json_content(self):
         pass
         # TODO
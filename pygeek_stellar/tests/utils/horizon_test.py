@@ -0,0 +1,37 @@
+import unittest
+from pygeek_stellar.tests.horizon_stand_in import *
+from pygeek_stellar.utils.horizon import *
+
+
+class _HorizonStandInHandler(HorizonStandInHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive connections
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.client_address))
+        self._send_json(200, {'id': self.path.split('/')[-1], 'sequence': '1'})
+
+
+class HorizonTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = start_horizon_stand_in(self, _HorizonStandInHandler)
+        self.server.requests = []
+        set_horizon_url(get_horizon_url() + '/')
+
+    def test_get_horizon_url(self):
+        self.assertEqual(get_horizon_url(), 'http://127.0.0.1:{}'.format(self.server.server_port))
+        set_horizon_url(None)
+        self.assertEqual(get_horizon_url(), os.environ.get(STELLAR_HORIZON_URL_ENV_VAR, STELLAR_HORIZON_TESTNET_URL))
+
+    def test_shared_client_reuses_connections(self):
+        self.assertIs(get_horizon(), get_horizon())
+        self.assertEqual(get_horizon().account('GA1')['id'], 'GA1')
+        self.assertEqual(get_horizon().account('GA2')['id'], 'GA2')
+        self.assertEqual(get_horizon_session().get(get_horizon_url() + '/friendbot').status_code, 200)
+        self.assertEqual([request[0] for request in self.server.requests],
+                         ['/accounts/GA1', '/accounts/GA2', '/friendbot'])
+        self.assertEqual(len(set(request[1] for request in self.server.requests)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import threading
+import unittest
+from pygeek_stellar.utils.metrics import *
+
+
+class MetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        reset_latency_stats()
+
+    def tearDown(self):
+        reset_latency_stats()
+
+    def test_histogram_percentiles(self):
+        histogram = LatencyHistogram(buckets=(0.01, 0.1, 1))
+        self.assertIsNone(histogram.get_percentile(50))
+        for seconds in [0.005] * 50 + [0.05] * 45 + [0.5] * 4 + [3]:
+            histogram.observe(seconds)
+        self.assertEqual(histogram.counts, [50, 45, 4, 1])
+        self.assertAlmostEqual(histogram.get_percentile(50), 0.01)
+        self.assertAlmostEqual(histogram.get_percentile(95), 0.1)
+        self.assertAlmostEqual(histogram.get_percentile(97), 0.55)
+        self.assertAlmostEqual(histogram.get_percentile(100), 3)  # The +Inf bucket is bounded by the longest duration
+
+    def test_spans_are_attributed_to_commands(self):
+        with timed_span('key_derivation'):
+            pass
+        with command_span('send_xlm_payment'):
+            with timed_span('transaction_signing'):
+                pass
+            thread = threading.Thread(target=with_current_command(lambda: record_span(get_current_command(),
+                                                                                      'transaction_submit', 0.2)))
+            thread.start()
+            thread.join()
+        self.assertEqual(get_current_command(), NO_COMMAND)
+        self.assertEqual([(s.command, s.span, s.count) for s in get_latency_stats()],
+                         [(NO_COMMAND, 'key_derivation', 1), ('send_xlm_payment', COMMAND_SPAN, 1),
+                          ('send_xlm_payment', 'transaction_signing', 1),
+                          ('send_xlm_payment', 'transaction_submit', 1)])
+
+    def test_prometheus_text(self):
+        record_span('send_xlm_payment', 'transaction_submit', 0.2)
+        record_span('send_xlm_payment', 'transaction_submit', 120)
+        lines = to_prometheus_text().splitlines()
+        self.assertEqual(lines[1], '# TYPE {} histogram'.format(PROMETHEUS_METRIC_NAME))
+        labels = 'command="send_xlm_payment",span="transaction_submit"'
+        self.assertIn('{}_bucket{{{},le="0.1"}} 0'.format(PROMETHEUS_METRIC_NAME, labels), lines)
+        self.assertIn('{}_bucket{{{},le="0.25"}} 1'.format(PROMETHEUS_METRIC_NAME, labels), lines)
+        self.assertIn('{}_bucket{{{},le="+Inf"}} 2'.format(PROMETHEUS_METRIC_NAME, labels), lines)
+        self.assertIn('{}_sum{{{}}} 120.2'.format(PROMETHEUS_METRIC_NAME, labels), lines)
+        self.assertEqual(lines[-1], '{}_count{{{}}} 2'.format(PROMETHEUS_METRIC_NAME, labels))
+
+
+if __name__ == '__main__':
+    unittest.main()
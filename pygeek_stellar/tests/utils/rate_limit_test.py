@@ -0,0 +1,64 @@
+import threading
+import time
+import unittest
+from pygeek_stellar.utils.rate_limit import *
+
+
+def _headers(limit, remaining, reset):
+    return {RATE_LIMIT_LIMIT_HEADER: str(limit), RATE_LIMIT_REMAINING_HEADER: str(remaining),
+            RATE_LIMIT_RESET_HEADER: str(reset)}
+
+
+class RateLimitSchedulerTest(unittest.TestCase):
+
+    def test_submits_go_first(self):
+        scheduler = RateLimitScheduler()
+        scheduler.acquire()
+        scheduler.on_response(200, _headers(10, 0, 1))  # Empty bucket, refilled at 10 requests per second
+        order = []
+
+        def request(name, priority):
+            scheduler.acquire(priority)
+            order.append(name)
+            scheduler.on_response(200, {})
+
+        threads = [threading.Thread(target=request, args=('query', QUERY_PRIORITY)),
+                   threading.Thread(target=request, args=('submit', SUBMIT_PRIORITY))]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.02)
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(order, ['submit', 'query'])
+
+    def test_requests_are_delayed_past_the_limit(self):
+        scheduler = RateLimitScheduler()
+        scheduler.acquire()
+        scheduler.on_response(200, _headers(20, 2, 1))
+        start = time.monotonic()
+        for _ in range(4):  # 2 remaining requests, then 2 refilled at 18 requests per second
+            scheduler.acquire()
+        self.assertTrue(0.08 < time.monotonic() - start < 0.5)
+
+    def test_rate_limited_response_blocks_the_requests(self):
+        scheduler = RateLimitScheduler()
+        scheduler.acquire()
+        scheduler.on_response(429, dict(_headers(10, 0, 1), **{RETRY_AFTER_HEADER: '1'}))
+        start = time.monotonic()
+        scheduler.acquire()
+        self.assertTrue(time.monotonic() - start >= 0.95)
+
+    def test_requests_are_not_delayed_without_headers(self):
+        scheduler = RateLimitScheduler()
+        scheduler.acquire()
+        scheduler.on_failure()  # The token of a request without response is given back
+        scheduler.acquire()
+        scheduler.on_response(200, {})
+        start = time.monotonic()
+        for _ in range(100):
+            scheduler.acquire()
+        self.assertTrue(time.monotonic() - start < 0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,24 @@
+import unittest
+from pygeek_stellar.utils.sse import *
+
+
+class SseTest(unittest.TestCase):
+
+    STREAM = (b': keep-alive\r\nretry: 1000\r\nevent: open\r\ndata: "hello"\r\n\r\n'
+              b'id: 1\ndata: {"a":\ndata: 1}\n\n\n'
+              b'id: 2\rdata: caf\xc3\xa9\r\r')
+
+    def test_iter_server_sent_events(self):
+        expected = [ServerSentEvent('open', '"hello"', None, 1000), ServerSentEvent(None, '{"a":\n1}', '1', None),
+                    ServerSentEvent(None, 'café', '2', None)]
+        self.assertEqual(list(iter_server_sent_events([SseTest.STREAM])), expected)
+        # One byte at a time, splitting the line endings and the UTF-8 characters
+        chunks = [SseTest.STREAM[i:i + 1] for i in range(len(SseTest.STREAM))]
+        self.assertEqual(list(iter_server_sent_events(chunks)), expected)
+
+    def test_incomplete_event_is_not_yielded(self):
+        self.assertEqual(list(iter_server_sent_events([b'id: 1\ndata: x\n'])), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,6 @@
 import unittest
+from unittest import mock
+from stellar_base.keypair import Keypair
 from pygeek_stellar.utils.stellar import *
 
 
@@ -33,6 +35,37 @@ class StellarTest(unittest.TestCase):
         self.assertFalse(is_transaction_text_memo_valid('x' * 29))
         self.assertFalse(is_transaction_text_memo_valid(None))
 
+    def test_is_stellar_amount_valid(self):
+        self.assertTrue(is_stellar_amount_valid('10'))
+        self.assertTrue(is_stellar_amount_valid('0.0000001'))
+        self.assertTrue(is_stellar_amount_valid('922337203685.4775807'))
+        self.assertFalse(is_stellar_amount_valid('922337203685.4775808'))
+        self.assertFalse(is_stellar_amount_valid('0.00000001'))
+        self.assertFalse(is_stellar_amount_valid('0'))
+        self.assertFalse(is_stellar_amount_valid('-10'))
+        self.assertFalse(is_stellar_amount_valid('NaN'))
+        self.assertFalse(is_stellar_amount_valid('ten'))
+        self.assertFalse(is_stellar_amount_valid(None))
+
+    def test_stroops_conversion(self):
+        self.assertEqual(amount_to_stroops('10.5'), 105000000)
+        self.assertEqual(amount_to_stroops('0.0000001'), 1)
+        self.assertEqual(amount_to_stroops('922337203685.4775807'), STELLAR_AMOUNT_MAX_STROOPS)
+        for amount in ['0.00000001', 'abc', 'NaN', None]:
+            with self.assertRaises(ValueError):
+                amount_to_stroops(amount)
+        self.assertEqual(stroops_to_amount(105000000), '10.5000000')
+        self.assertEqual(stroops_to_amount(1), '0.0000001')
+        self.assertEqual(stroops_to_amount(-1), '-0.0000001')
+        self.assertEqual(format_asset(('XLM', None)), 'XLM')
+        self.assertEqual(format_asset(('EUR', 'GA')), 'EUR:GA')
+
+    def test_parse_asset(self):
+        self.assertEqual(parse_asset('xlm'), ('XLM', None))
+        self.assertEqual(parse_asset('EUR:' + StellarTest.ADDRESS_1), ('EUR', StellarTest.ADDRESS_1))
+        for asset in ['EUR', 'EUR:GA', 'EURO-1:' + StellarTest.ADDRESS_1]:
+            self.assertIsNone(parse_asset(asset))
+
     def test_is_address_matching_seed(self):
         self.assertTrue(is_seed_matching_address(StellarTest.SEED_1, StellarTest.ADDRESS_1))
         self.assertTrue(is_seed_matching_address(StellarTest.SEED_2, StellarTest.ADDRESS_2))
@@ -41,6 +74,27 @@ class StellarTest(unittest.TestCase):
         self.assertFalse(is_seed_matching_address('invalid_key', StellarTest.SEED_1))
         self.assertFalse(is_seed_matching_address(None, StellarTest.ADDRESS_1))
 
+    def test_seed_address_is_derived_once(self):
+        forget_seed_addresses()
+        with mock.patch.object(Keypair, 'from_seed', wraps=Keypair.from_seed) as from_seed:
+            for _ in range(3):
+                self.assertTrue(is_seed_matching_address(StellarTest.SEED_1, StellarTest.ADDRESS_1))
+                self.assertFalse(is_seed_matching_address(StellarTest.SEED_1, StellarTest.ADDRESS_2))
+                self.assertEqual(seed_to_address(StellarTest.SEED_1), StellarTest.ADDRESS_1)
+            self.assertEqual(from_seed.call_count, 1)
+
+            forget_seed_addresses()
+            self.assertEqual(seed_to_address(StellarTest.SEED_1), StellarTest.ADDRESS_1)
+            self.assertEqual(from_seed.call_count, 2)
+
+    def test_generate_keypairs(self):
+        with mock.patch('pygeek_stellar.utils.stellar.KEYPAIR_GENERATION_CHUNK_SIZE', 10):
+            keypairs = generate_keypairs(25, processes=2)
+        self.assertEqual(len(keypairs), 25)
+        self.assertEqual(len(set(keypairs)), 25)
+        for address, seed in keypairs:
+            self.assertTrue(is_seed_matching_address(seed, address))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,41 @@
+import builtins
+import unittest
+from unittest import mock
+from pygeek_stellar.utils.stellar import *
+
+
+class StrkeyTest(unittest.TestCase):
+
+    ADDRESS_1 = 'GB3I37MLME4LC5LVAKRTKSKE2K7X5VR4MEBVG3EVHMB2C6V6J5A3XC6L'
+    SEED_1 = 'SADGEOC6FE5KQJMC7O65HNURFZTB6SLJDM5JB665NSWOGVBEGRRGC3KK'
+    ADDRESS_2 = 'GA6S6WSZVDBJQFEGYPZO7D5HWQINTIOSCKR5PAJRGZ4ZI2H7HED6V5RX'
+
+    ADDRESSES = [ADDRESS_1, ADDRESS_2, SEED_1, ADDRESS_1[:-1] + 'M', ADDRESS_1[:-1], ADDRESS_1.lower(),
+                 'é' * 56, None, ADDRESS_2]
+    REASONS = [None, None, ADDRESS_ERROR_VERSION, ADDRESS_ERROR_CHECKSUM, ADDRESS_ERROR_LENGTH,
+               ADDRESS_ERROR_CHARACTER, ADDRESS_ERROR_CHARACTER, ADDRESS_ERROR_NOT_A_STRING, None]
+
+    def test_get_address_error(self):
+        self.assertEqual([get_address_error(address) for address in StrkeyTest.ADDRESSES], StrkeyTest.REASONS)
+
+    def test_validate_addresses(self):
+        mask, reasons = validate_addresses(StrkeyTest.ADDRESSES, chunk_size=4)
+        self.assertEqual(reasons, StrkeyTest.REASONS)
+        self.assertEqual(mask, [is_address_valid(address) for address in StrkeyTest.ADDRESSES])
+        self.assertEqual(validate_addresses([]), ([], []))
+
+    def test_validate_addresses_without_numpy(self):
+        real_import = builtins.__import__
+
+        def import_without_numpy(name, *args, **kwargs):
+            if name == 'numpy':
+                raise ImportError(name)
+            return real_import(name, *args, **kwargs)
+
+        with mock.patch('builtins.__import__', side_effect=import_without_numpy):
+            _, reasons = validate_addresses(iter(StrkeyTest.ADDRESSES), chunk_size=4)
+        self.assertEqual(reasons, StrkeyTest.REASONS)
+
+
+if __name__ == '__main__':
+    unittest.main()
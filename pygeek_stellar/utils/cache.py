@@ -0,0 +1,76 @@
+# System imports
+import threading
+import time
+from collections import OrderedDict
+
+
+class TtlLruCache:
+    """
+    Thread-safe in-memory cache whose entries expire after a given time to live. When the cache
+    is full the least recently used entry is evicted to make room for the new one.
+
+    Attributes
+    ----------
+    ttl : float or None
+        Time to live of each entry, in seconds. Entries never expire if None.
+    max_size : int
+        Maximum number of entries kept in the cache.
+    """
+
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # key -> (expiration time, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Returns the value cached for the given key, marking it as the most recently used.
+        :param key: Key to be looked up.
+        :param default: Value returned when the key is not cached or its entry has expired.
+        :return: Returns the cached value or the default value.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expiration, value = entry
+            if expiration is not None and expiration <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        """
+        Caches a value for the given key, evicting the least recently used entry if the cache is full.
+        :param key: Key of the value.
+        :param value: Value to be cached.
+        """
+        if self.max_size <= 0:
+            return
+        expiration = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expiration, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        """
+        Removes the entry of the given key from the cache, if any.
+        :param key: Key to be removed.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """
+        Removes all the entries from the cache.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
@@ -1,33 +1,49 @@
 import base64
-from cryptography.fernet import Fernet
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from cryptography.fernet import InvalidToken
+import hashlib
+import os
+import threading
+# Local imports
+from .metrics import timed_span
+# The cryptography package is only imported when some content is first encrypted or decrypted
 
+KDF_ITERATIONS = 100000
+KDF_SALT_SIZE = 16
+LEGACY_KDF_SALT = bytes("0"*16, 'utf-8')  # Fixed salt used before the encrypted content header was introduced
+ENCRYPTED_CONTENT_MAGIC = b'PGSE'
+ENCRYPTED_CONTENT_VERSION = 1
+ENCRYPTED_CONTENT_HEADER_SIZE = len(ENCRYPTED_CONTENT_MAGIC) + 1 + KDF_SALT_SIZE
 
-def encrypt(content, password):
+_derived_keys = {}  # (salt, password digest) -> derived key
+_derived_keys_lock = threading.Lock()
+
+
+def encrypt(content, password, salt=LEGACY_KDF_SALT):
     """
     Method to encrypt the given content based on the specified password.
     :param bytearray content: Content to be encrypted.
     :param str password: Encryption password.
+    :param bytes salt: Salt used to derive the encryption key from the password.
     :return: Returns a byte array with the encrypted content.
     :rtype: bytearray
     """
-    f = Fernet(password2cryptographic_key(password))
+    from cryptography.fernet import Fernet
+
+    f = Fernet(password2cryptographic_key(password, salt))
     return f.encrypt(content)
 
 
-def decrypt(content, password):
+def decrypt(content, password, salt=LEGACY_KDF_SALT):
     """
     Method to decrypt the given content based on the specified password.
     :param bytearray content: Content to be decrypted.
     :param str password: Decryption password.
+    :param bytes salt: Salt used to derive the decryption key from the password.
     :return: Returns a byte array with the decrypted content.
     :rtype: bytearray
     """
+    from cryptography.fernet import Fernet, InvalidToken
 
-    f = Fernet(password2cryptographic_key(password))
+    f = Fernet(password2cryptographic_key(password, salt))
     try:
         decrypted_content = f.decrypt(content)
     except InvalidToken:
@@ -36,19 +52,95 @@ def decrypt(content, password):
     return decrypted_content
 
 
-def password2cryptographic_key(password):
+def encrypt_with_header(content, password, salt):
+    """
+    Encrypts the given content and prepends it with a header holding the format version and the
+    salt used to derive the encryption key, which are both required to decrypt it later on.
+    :param bytearray content: Content to be encrypted.
+    :param str password: Encryption password.
+    :param bytes salt: Salt used to derive the encryption key from the password.
+    :return: Returns a byte array with the header followed by the encrypted content.
+    :rtype: bytearray
+    """
+    header = ENCRYPTED_CONTENT_MAGIC + bytes([ENCRYPTED_CONTENT_VERSION]) + salt
+    return header + encrypt(content, password, salt)
+
+
+def decrypt_with_header(content, password):
+    """
+    Decrypts content produced by encrypt_with_header(). Content without header (encrypted before the
+    header was introduced) is decrypted using the legacy fixed salt.
+    :param bytearray content: Content to be decrypted.
+    :param str password: Decryption password.
+    :return: Returns a byte array with the decrypted content or None if it could not be decrypted.
+    :rtype: bytearray or None
+    """
+    salt = get_content_salt(content)
+    if salt is None:
+        return decrypt(content, password)
+    return decrypt(content[ENCRYPTED_CONTENT_HEADER_SIZE:], password, salt)
+
+
+def get_content_salt(content):
+    """
+    Returns the salt stored on the header of content produced by encrypt_with_header().
+    :param bytearray content: Encrypted content, or at least its first ENCRYPTED_CONTENT_HEADER_SIZE bytes.
+    :return: Returns the salt or None if the content has no (supported) header.
+    :rtype: bytes or None
+    """
+    if len(content) < ENCRYPTED_CONTENT_HEADER_SIZE \
+            or not content.startswith(ENCRYPTED_CONTENT_MAGIC) \
+            or content[len(ENCRYPTED_CONTENT_MAGIC)] != ENCRYPTED_CONTENT_VERSION:
+        return None
+    return bytes(content[len(ENCRYPTED_CONTENT_MAGIC) + 1:ENCRYPTED_CONTENT_HEADER_SIZE])
+
+
+def generate_salt():
+    """
+    Generates a new random salt to be used during the key derivation.
+    :return: Returns the generated salt.
+    :rtype: bytes
+    """
+    return os.urandom(KDF_SALT_SIZE)
+
+
+def password2cryptographic_key(password, salt=LEGACY_KDF_SALT):
     """
     This method generates a key, based on the specified password, to be used during the
-    encryption and decryption procedures.
+    encryption and decryption procedures. Since the key derivation is deliberately slow, the
+    derived keys are kept in memory until wipe_cryptographic_keys() is called.
     :param str password: Password to be used during the key generation.
+    :param bytes salt: Salt to be used during the key generation.
     :return: Returns the generated key.
     """
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+
+    cache_key = (salt, hashlib.sha256(password.encode()).digest())
+    with _derived_keys_lock:
+        key = _derived_keys.get(cache_key)
+    if key is not None:
+        return key
+
     kdf = PBKDF2HMAC(
         algorithm=hashes.SHA256(),
         length=32,
-        salt=bytes("0"*16, 'utf-8'),  # os.urandom(16) TODO: Check salt influence
-        iterations=100000,
+        salt=salt,
+        iterations=KDF_ITERATIONS,
         backend=default_backend())
 
-    key = kdf.derive(password.encode())  # derive key from the user password
-    return base64.urlsafe_b64encode(key)
+    with timed_span('key_derivation'):
+        key = base64.urlsafe_b64encode(kdf.derive(password.encode()))  # derive key from the user password
+    with _derived_keys_lock:
+        _derived_keys[cache_key] = key
+    return key
+
+
+def wipe_cryptographic_keys():
+    """
+    Drops all the derived keys kept in memory. Python gives no guarantee that the memory holding them
+    is overwritten, but no reference to them is kept from then on.
+    """
+    with _derived_keys_lock:
+        _derived_keys.clear()
@@ -1,5 +1,8 @@
 # System imports
+import csv
+import json
 import os
+import tempfile
 # Local imports
 from .cryptography import *
 
@@ -11,7 +14,9 @@ FILE_MODE_WRITE_BINARY = 'wb'
 
 def write_file(filename, content, write_as_binary=False):
     """
-    Writes the given content to the specified file.
+    Writes the given content to the specified file. The content is written to a temporary file
+    which is then renamed over the specified file, so the file either keeps its previous content
+    or gets the whole new content, even if the writing is interrupted.
     :param str filename: File to which the content should be written.
     :param str content: Content to be written.
     :param bool write_as_binary: Flag that specifies if the content must be written in binary form or not.
@@ -20,13 +25,20 @@ def write_file(filename, content, write_as_binary=False):
     :rtype: bool
     """
     opening_mode = FILE_MODE_WRITE if not write_as_binary else FILE_MODE_WRITE_BINARY
+    temp_filename = None
     try:
-        file = open(filename, opening_mode)
-        file.write(content)
-        file.close()
+        fd, temp_filename = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)),
+                                             prefix='.{}.'.format(os.path.basename(filename)))
+        with os.fdopen(fd, opening_mode) as file:
+            file.write(content)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_filename, filename)
         return True
     except (OSError, IOError):
         print("There was a problem opening/writing the file: {}".format(filename))
+        if temp_filename is not None and os.path.exists(temp_filename):
+            os.remove(temp_filename)
         return False
 
 
@@ -50,6 +62,68 @@ def load_file(filename, read_as_binary=False):
     return None
 
 
+def read_csv_file(filename):
+    """
+    Lazily reads the specified CSV file, yielding one row at a time so that arbitrarily large
+    files can be processed with bounded memory. The first line of the file is used as header.
+    :param str filename: CSV file to be read.
+    :return: Returns a generator of (line_number, row) tuples, where each row is a dict keyed
+    by the header column names. Nothing is yielded if the file could not be read.
+    :rtype: generator of (int, dict)
+    """
+    try:
+        with open(filename, FILE_MODE_READ, newline='') as file:
+            reader = csv.DictReader(file, skipinitialspace=True)
+            for row in reader:
+                yield reader.line_num, row
+    except (OSError, IOError, csv.Error):
+        print("There was a problem opening/reading the file: {}".format(filename))
+
+
+def read_ndjson_file(filename):
+    """
+    Lazily reads the specified newline delimited JSON (NDJSON) file, yielding one record at a time.
+    Empty lines are skipped.
+    :param str filename: NDJSON file to be read.
+    :return: Returns a generator of (line_number, record) tuples, where the record is None if the line
+    is not a valid JSON document. Nothing is yielded if the file could not be read.
+    :rtype: generator of (int, dict)
+    """
+    try:
+        with open(filename, FILE_MODE_READ) as file:
+            for line_number, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                yield line_number, record
+    except (OSError, IOError):
+        print("There was a problem opening/reading the file: {}".format(filename))
+
+
+def write_ndjson_file(filename, records):
+    """
+    Writes the given records to the specified file as newline delimited JSON (one JSON document
+    per line). The records are consumed lazily so that they do not have to fit in memory.
+    :param str filename: File to which the records should be written.
+    :param records: Iterable of JSON serializable records.
+    :return: Returns the number of written records or None if the file could not be written.
+    :rtype: int or None
+    """
+    n_records = 0
+    try:
+        with open(filename, FILE_MODE_WRITE) as file:
+            for record in records:
+                file.write(json.dumps(record) + '\n')
+                n_records += 1
+    except (OSError, IOError):
+        print("There was a problem opening/writing the file: {}".format(filename))
+        return None
+    return n_records
+
+
 def write_encrypted_file(filename, content, password):
     """
     Writes the given content to the specified file and encrypts it with the specified password.
@@ -63,7 +137,9 @@ def write_encrypted_file(filename, content, password):
         print('A valid password must be given to decrypt the file')
         return False
 
-    encrypted_content = encrypt(content.encode(), password)
+    # The salt of an existing file is kept, so the key derived when the file was loaded can be reused
+    salt = _load_encrypted_file_salt(filename) or generate_salt()
+    encrypted_content = encrypt_with_header(content.encode(), password, salt)
     return write_file(filename, encrypted_content, write_as_binary=True)  # Encrypted files are stored as binary
 
 
@@ -85,13 +161,27 @@ def load_encrypted_file(filename, password, read_as_binary=False):
     if file_content is None:
         return None
 
-    decrypted_content = decrypt(file_content, password)
+    decrypted_content = decrypt_with_header(file_content, password)
     if decrypted_content is None:
         return None
 
     return decrypted_content if read_as_binary else decrypted_content.decode()
 
 
+def _load_encrypted_file_salt(filename):
+    """
+    Reads the key derivation salt from the header of an encrypted file.
+    :param str filename: Encrypted file.
+    :return: Returns the salt of the file or None if the file does not exist or has no header.
+    :rtype: bytes or None
+    """
+    try:
+        with open(filename, FILE_MODE_READ_BINARY) as file:
+            return get_content_salt(file.read(ENCRYPTED_CONTENT_HEADER_SIZE))
+    except (OSError, IOError):
+        return None
+
+
 def _is_valid_password(password):
     """
     Evaluates if a given password is valid. Its length must be higher than 0.
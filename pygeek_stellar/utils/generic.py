@@ -1,7 +1,10 @@
 # System imports
 import json
+from datetime import datetime
 from json import JSONDecodeError
 
+ISO_DATETIME_FORMATS = ['%Y-%m-%dT%H:%M:%SZ', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d']
+
 
 def is_float_str(string):
     """
@@ -54,6 +57,56 @@ def is_successful_http_status_code(status_code):
     return is_in_range(status_code, 200, 299)
 
 
+def pop_flag(args, flag):
+    """
+    Removes all the occurrences of a flag (e.g. '--fresh') from a list of command arguments.
+    :param list args: Command arguments. The list is modified in place.
+    :param str flag: Flag to be removed.
+    :return: Returns true if the flag was found and false otherwise.
+    :rtype: bool
+    """
+    found = flag in args
+    args[:] = [arg for arg in args if arg != flag]
+    return found
+
+
+def pop_option(args, option, default=None):
+    """
+    Removes an option and its value (e.g. '--limit 10' or '--limit=10') from a list of command arguments.
+    :param list args: Command arguments. The list is modified in place.
+    :param str option: Option to be removed.
+    :param default: Value returned if the option is not found.
+    :return: Returns the value of the option, an empty string if the option was given without a value
+    or the default value if the option was not found.
+    :rtype: str
+    """
+    for i, arg in enumerate(args):
+        if arg == option:
+            value = args[i + 1] if i + 1 < len(args) else ''
+            del args[i:i + 2]
+            return value
+        if arg.startswith(option + '='):
+            del args[i]
+            return arg[len(option) + 1:]
+    return default
+
+
+def parse_iso_datetime(string):
+    """
+    Parses an ISO 8601 UTC date (e.g. '2019-01-31') or date and time (e.g. '2019-01-31T10:00:00Z'),
+    the format used by Horizon.
+    :param str string: String to be parsed.
+    :return: Returns the parsed (naive UTC) datetime or None if the string is not in a supported format.
+    :rtype: datetime or None
+    """
+    for datetime_format in ISO_DATETIME_FORMATS:
+        try:
+            return datetime.strptime(string, datetime_format)
+        except (TypeError, ValueError):
+            pass
+    return None
+
+
 def decode_json_content(content):
     """
     Decodes a given string content to a JSON object
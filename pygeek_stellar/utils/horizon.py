@@ -0,0 +1,82 @@
+# System imports
+import os
+import threading
+# Local imports
+from ..constants import *
+
+_horizon = None
+_horizon_url = None
+_horizon_lock = threading.Lock()
+
+
+def get_horizon():
+    """
+    Returns the Horizon client shared by every request made to the Stellar network. The client is
+    created on first use and keeps its connections alive, so consecutive requests do not pay the
+    TCP and TLS handshakes again.
+    :return: Returns the shared Horizon client.
+    :rtype: Horizon
+    """
+    # Neither requests nor stellar_base are needed until the network is first reached
+    from stellar_base.horizon import Horizon
+
+    global _horizon
+    with _horizon_lock:
+        if _horizon is None:
+            _horizon = Horizon(get_horizon_url(), timeout=HORIZON_TIMEOUT_SECONDS)
+            _horizon.session.close()
+            _horizon.session = _create_horizon_session()
+        return _horizon
+
+
+def get_horizon_session():
+    """
+    Returns the pooled HTTP session of the shared Horizon client. It should be used for the
+    requests that are not covered by the Horizon client methods (e.g. Friendbot).
+    :return: Returns the shared HTTP session.
+    :rtype: requests.Session
+    """
+    return get_horizon().session
+
+
+def get_horizon_url():
+    """
+    Returns the base URL of the Horizon server in use. By order of precedence it is the URL given to
+    set_horizon_url(), the one specified by the PYGEEK_STELLAR_HORIZON_URL environment variable or
+    the Stellar Testnet Horizon URL.
+    :return: Returns the Horizon server base URL.
+    :rtype: str
+    """
+    url = _horizon_url or os.environ.get(STELLAR_HORIZON_URL_ENV_VAR) or STELLAR_HORIZON_TESTNET_URL
+    return url.rstrip('/')
+
+
+def set_horizon_url(url):
+    """
+    Sets the base URL of the Horizon server to be used, for example a local stand-in server.
+    The connections of the previously shared Horizon client are closed.
+    :param str url: Horizon server base URL. If None the default URL is used again.
+    """
+    global _horizon, _horizon_url
+    with _horizon_lock:
+        _horizon_url = url
+        if _horizon is not None:
+            _horizon.session.close()
+            _horizon = None
+
+
+def _create_horizon_session():
+    """
+    Creates the pooled HTTP session used to communicate with the Horizon server.
+    :return: Returns the newly created session.
+    :rtype: requests.Session
+    """
+    import requests
+    from .horizon_adapter import HorizonHTTPAdapter
+
+    session = requests.Session()
+    adapter = HorizonHTTPAdapter(HORIZON_TIMEOUT_SECONDS, HORIZON_CONNECTION_POOL_SIZE,
+                                 HORIZON_RATE_LIMITED_MAX_ATTEMPTS)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
@@ -0,0 +1,45 @@
+# 3rd party imports
+from requests.adapters import HTTPAdapter
+# Local imports
+from .rate_limit import *
+
+
+class HorizonHTTPAdapter(HTTPAdapter):
+    """
+    HTTP adapter used by the shared Horizon session. It keeps a pool of keep-alive connections
+    to the Horizon server and applies a default timeout to every request which does not specify one.
+    Every request goes through a rate limit scheduler, which delays the requests (transaction
+    submissions first) instead of letting them exceed the Horizon rate limit. Requests rejected
+    with HTTP 429 anyway are sent again once the scheduler allows it.
+
+    Attributes
+    ----------
+    timeout : (float, float)
+        Connect and read timeouts, in seconds, applied to requests without an explicit timeout.
+    max_attempts : int
+        Maximum number of times a request is sent while it is rejected with HTTP 429.
+    scheduler : RateLimitScheduler
+        Scheduler of the requests sent through the adapter.
+    """
+
+    def __init__(self, timeout, pool_size, max_attempts):
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.scheduler = RateLimitScheduler()
+        super(HorizonHTTPAdapter, self).__init__(pool_connections=pool_size, pool_maxsize=pool_size)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        priority = SUBMIT_PRIORITY if request.method == 'POST' else QUERY_PRIORITY
+        for attempt in range(1, self.max_attempts + 1):
+            self.scheduler.acquire(priority)
+            try:
+                response = super(HorizonHTTPAdapter, self).send(request, **kwargs)
+            except BaseException:
+                self.scheduler.on_failure()
+                raise
+            self.scheduler.on_response(response.status_code, response.headers)
+            if response.status_code != HTTP_STATUS_TOO_MANY_REQUESTS or attempt == self.max_attempts:
+                return response
+            response.close()
@@ -0,0 +1,204 @@
+# System imports
+import bisect
+import functools
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+# Upper bounds, in seconds, of the latency histograms buckets (a last +Inf bucket counts the slower spans)
+LATENCY_BUCKETS_SECONDS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LATENCY_PERCENTILES = (50, 95, 99)
+COMMAND_SPAN = 'command'  # Span measuring a whole command
+NO_COMMAND = '-'  # Command of the spans measured outside of any command (e.g. while the session is initialized)
+PROMETHEUS_METRIC_NAME = 'pygeek_stellar_span_duration_seconds'
+
+# Latency statistics of a span of a command: number of measurements, total duration and the duration, in seconds,
+# of each of the LATENCY_PERCENTILES
+LatencyStats = namedtuple('LatencyStats', ['command', 'span', 'count', 'sum', 'percentiles'])
+
+_histograms = {}  # (command, span) -> LatencyHistogram
+_histograms_lock = threading.Lock()
+_current = threading.local()  # Command being run by each thread
+
+
+class LatencyHistogram:
+    """
+    Histogram of the durations of a span, with the same cumulative buckets as a Prometheus histogram.
+    Its percentiles are estimated by linear interpolation within the bucket they fall in. It is not
+    thread-safe: the module functions access the histograms while holding their lock.
+
+    Attributes
+    ----------
+    buckets : tuple of float
+        Upper bounds, in seconds, of the buckets (excluding the last +Inf bucket).
+    counts : list of int
+        Number of durations of each bucket (not cumulative), the last one being the +Inf bucket.
+    sum : float
+        Sum of all the durations, in seconds.
+    count : int
+        Number of durations.
+    max : float
+        Longest duration, in seconds, used as upper bound of the +Inf bucket.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS_SECONDS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        """
+        Adds a duration to the histogram.
+        :param float seconds: Duration, in seconds.
+        """
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+        self.max = max(self.max, seconds)
+
+    def get_percentile(self, percentile):
+        """
+        Estimates a percentile of the durations.
+        :param float percentile: Percentile, between 0 and 100.
+        :return: Returns the estimated duration, in seconds, or None if the histogram is empty.
+        :rtype: float or None
+        """
+        if self.count == 0:
+            return None
+        rank = percentile / 100 * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - cumulative) / count, self.max)
+            cumulative += count
+        return self.max
+
+
+def get_current_command():
+    """
+    Returns the command being run by the current thread, to which the measured spans are attributed.
+    :return: Returns the command name or NO_COMMAND.
+    :rtype: str
+    """
+    return getattr(_current, 'command', NO_COMMAND)
+
+
+@contextmanager
+def command_span(command):
+    """
+    Context manager measuring a whole command (as its COMMAND_SPAN span). The spans measured by the
+    current thread until it exits are attributed to the command.
+    :param str command: Command name.
+    """
+    previous = get_current_command()
+    _current.command = command
+    try:
+        with timed_span(COMMAND_SPAN):
+            yield
+    finally:
+        _current.command = previous
+
+
+@contextmanager
+def timed_span(span):
+    """
+    Context manager measuring the duration of a phase of the current command (e.g. the transaction signing).
+    The duration is recorded even if the phase raises an exception.
+    :param str span: Span name.
+    """
+    command = get_current_command()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(command, span, time.perf_counter() - start)
+
+
+def with_current_command(function):
+    """
+    Wraps a function so it is attributed to the command of the current thread when it is run by another
+    thread (e.g. by a thread pool).
+    :param function: Function to be wrapped.
+    :return: Returns the wrapped function.
+    :rtype: function
+    """
+    command = get_current_command()
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        previous = get_current_command()
+        _current.command = command
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _current.command = previous
+    return wrapper
+
+
+def record_span(command, span, seconds):
+    """
+    Adds a span duration to the latency histogram of its command.
+    :param str command: Command name.
+    :param str span: Span name.
+    :param float seconds: Duration, in seconds.
+    """
+    with _histograms_lock:
+        histogram = _histograms.get((command, span))
+        if histogram is None:
+            histogram = _histograms[(command, span)] = LatencyHistogram()
+        histogram.observe(seconds)
+
+
+def get_latency_stats():
+    """
+    Returns the latency statistics of every measured span.
+    :return: Returns the LatencyStats of the spans, sorted by command and with the COMMAND_SPAN span first.
+    :rtype: list of LatencyStats
+    """
+    with _histograms_lock:
+        return [LatencyStats(command, span, histogram.count, histogram.sum,
+                             [histogram.get_percentile(p) for p in LATENCY_PERCENTILES])
+                for (command, span), histogram in sorted(_histograms.items(), key=_histogram_sort_key)]
+
+
+def reset_latency_stats():
+    """
+    Drops all the measured spans.
+    """
+    with _histograms_lock:
+        _histograms.clear()
+
+
+def to_prometheus_text():
+    """
+    Formats the latency histograms in the Prometheus text exposition format, e.g. to be written to the
+    textfile collector directory of the node exporter.
+    :return: Returns the formatted histograms.
+    :rtype: str
+    """
+    lines = ['# HELP {} Duration of the commands of pygeek-stellar and of their phases.'.format(PROMETHEUS_METRIC_NAME),
+             '# TYPE {} histogram'.format(PROMETHEUS_METRIC_NAME)]
+    with _histograms_lock:
+        for (command, span), histogram in sorted(_histograms.items(), key=_histogram_sort_key):
+            labels = 'command="{}",span="{}"'.format(_escape_label_value(command), _escape_label_value(span))
+            cumulative = 0
+            for bucket, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                cumulative += count
+                lines.append('{}_bucket{{{},le="{}"}} {}'.format(PROMETHEUS_METRIC_NAME, labels, bucket, cumulative))
+            lines.append('{}_sum{{{}}} {!r}'.format(PROMETHEUS_METRIC_NAME, labels, histogram.sum))
+            lines.append('{}_count{{{}}} {}'.format(PROMETHEUS_METRIC_NAME, labels, histogram.count))
+    return '\n'.join(lines) + '\n'
+
+
+def _histogram_sort_key(item):
+    (command, span), _ = item
+    return command, span != COMMAND_SPAN, span
+
+
+def _escape_label_value(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,138 @@
+# System imports
+import heapq
+import itertools
+import threading
+import time
+
+RATE_LIMIT_LIMIT_HEADER = 'X-RateLimit-Limit'
+RATE_LIMIT_REMAINING_HEADER = 'X-RateLimit-Remaining'
+RATE_LIMIT_RESET_HEADER = 'X-RateLimit-Reset'
+RETRY_AFTER_HEADER = 'Retry-After'
+HTTP_STATUS_TOO_MANY_REQUESTS = 429
+SUBMIT_PRIORITY = 0  # Transaction submissions go before any waiting query
+QUERY_PRIORITY = 1
+
+
+class RateLimitScheduler:
+    """
+    Token bucket scheduling the requests made to a rate limited server (as Horizon), so they are delayed
+    instead of being rejected with HTTP 429. The bucket follows the X-RateLimit-Limit, X-RateLimit-Remaining
+    and X-RateLimit-Reset headers of the responses: the remaining requests bound the available tokens (minus
+    the requests still in flight) and the refill rate is estimated from the time the server needs to refill
+    the used requests. Until the first response is received only one request is let through, and if the
+    server does not send the headers the requests are no longer delayed. When a token becomes available it
+    is handed to the waiting request of highest priority (the oldest one on ties). It is safe to be used from
+    several threads.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._waiting = []  # Heap of (priority, ticket) of the requests waiting for a token
+        self._tickets = itertools.count()
+        self._unlimited = False  # True once the server answered without rate limit headers
+        self._limit = None
+        self._tokens = 1.0
+        self._rate = 0.0  # Estimated refill rate, in tokens per second (0 if unknown)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0  # Set when the server rejected a request with HTTP 429
+        self._in_flight = 0
+
+    def acquire(self, priority=QUERY_PRIORITY):
+        """
+        Blocks until a request can be sent without exceeding the rate limit. Each call must be followed by a
+        call to on_response() or on_failure() once the request is done.
+        :param int priority: Priority of the request, SUBMIT_PRIORITY or QUERY_PRIORITY (lower goes first).
+        """
+        with self._condition:
+            entry = (priority, next(self._tickets))
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    delay = self._get_delay() if self._waiting[0] == entry else None
+                    if delay == 0:
+                        break
+                    self._condition.wait(delay)
+            except BaseException:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()
+                raise
+            heapq.heappop(self._waiting)
+            self._tokens -= 1
+            self._in_flight += 1
+            self._condition.notify_all()  # The next waiting request may also have a token available
+
+    def on_response(self, status_code, headers):
+        """
+        Updates the bucket with the rate limit headers of a response.
+        :param int status_code: HTTP status code of the response.
+        :param headers: Headers of the response (a case-insensitive mapping, as the requests headers).
+        """
+        with self._condition:
+            self._in_flight -= 1
+            limit = _get_int_header(headers, RATE_LIMIT_LIMIT_HEADER)
+            remaining = _get_int_header(headers, RATE_LIMIT_REMAINING_HEADER)
+            reset = _get_int_header(headers, RATE_LIMIT_RESET_HEADER)
+            now = time.monotonic()
+            if limit is None or remaining is None:
+                if status_code != HTTP_STATUS_TOO_MANY_REQUESTS:
+                    self._unlimited = True
+            else:
+                self._unlimited = False
+                self._get_delay()  # Refills the bucket up to now
+                if limit != self._limit:
+                    self._limit, self._rate, self._tokens = limit, 0.0, remaining - self._in_flight
+                else:
+                    # The responses may arrive out of order, so the remaining requests only ever lower the tokens
+                    self._tokens = min(self._tokens, remaining - self._in_flight)
+                if reset and remaining < limit - 1:
+                    # The remaining requests are rounded down and the reset time up, so the refill rate is
+                    # underestimated (never exceeding the limit) and the best estimate is kept
+                    self._rate = max(self._rate, (limit - remaining - 1) / reset)
+
+            if status_code == HTTP_STATUS_TOO_MANY_REQUESTS:
+                self._tokens = min(self._tokens, 0)
+                retry_after = _get_int_header(headers, RETRY_AFTER_HEADER)
+                if retry_after is None:
+                    retry_after = 1 / self._rate if self._rate else reset or 1
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+            self._condition.notify_all()
+
+    def on_failure(self):
+        """
+        Gives back the token of a request which got no response (e.g. the server could not be reached).
+        """
+        with self._condition:
+            self._in_flight -= 1
+            self._tokens += 1
+            self._condition.notify_all()
+
+    def _get_delay(self):
+        """
+        Refills the bucket for the time elapsed since its last update and computes how long the next request
+        must wait. It must be called while holding the condition lock.
+        :return: Returns the delay in seconds, 0 if the request can be sent or None if it must wait for another
+        request to be done.
+        :rtype: float or None
+        """
+        now = time.monotonic()
+        if self._unlimited:
+            return 0
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        self._tokens += (now - self._updated) * self._rate
+        if self._limit is not None:
+            self._tokens = min(self._tokens, self._limit)
+        self._updated = now
+        if self._tokens >= 1:
+            return 0
+        if not self._rate:
+            return None if self._in_flight else 0  # A request is let through to learn the refill rate
+        return (1 - self._tokens) / self._rate
+
+
+def _get_int_header(headers, name):
+    try:
+        return int(headers[name])
+    except (KeyError, TypeError, ValueError):
+        return None
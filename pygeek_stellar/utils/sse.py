@@ -0,0 +1,52 @@
+# System imports
+import codecs
+import re
+from collections import namedtuple
+
+SSE_LINE_SEPARATOR_REGEX = re.compile(r'\r\n|\r|\n')
+
+# Server-sent event. The fields not present on the event are None
+ServerSentEvent = namedtuple('ServerSentEvent', ['event', 'data', 'id', 'retry'])
+
+
+def iter_server_sent_events(chunks):
+    """
+    Parses a stream of server-sent events (text/event-stream), yielding each event as soon as the blank
+    line ending it is received, regardless of how the stream is split into chunks.
+    :param chunks: Iterable of bytes chunks, as received from the network.
+    :return: Returns a generator of server-sent events. The comments and the events without any field are
+    skipped.
+    :rtype: generator of ServerSentEvent
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    fields = {}
+    data = []
+    buffer = ''  # Incomplete last line
+    skip_line_feed = False  # Whether the previous chunk ended with a '\r' which may be followed by a '\n'
+    for chunk in chunks:
+        text = buffer + decoder.decode(chunk)
+        if skip_line_feed and text:
+            text = text[1:] if text.startswith('\n') else text
+            skip_line_feed = False
+        lines = SSE_LINE_SEPARATOR_REGEX.split(text)
+        buffer = lines.pop()
+        skip_line_feed = skip_line_feed or text.endswith('\r')
+        for line in lines:
+            if not line:
+                if fields or data:
+                    yield ServerSentEvent(fields.get('event'), '\n'.join(data) if data else None,
+                                          fields.get('id'), fields.get('retry'))
+                fields = {}
+                data = []
+                continue
+            if line.startswith(':'):  # Comment, used as keep-alive
+                continue
+            name, _, value = line.partition(':')
+            value = value[1:] if value.startswith(' ') else value
+            if name == 'data':
+                data.append(value)
+            elif name == 'retry':
+                if value.isdigit():
+                    fields['retry'] = int(value)
+            elif name in ('event', 'id'):
+                fields[name] = value
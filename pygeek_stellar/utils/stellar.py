@@ -1,10 +1,27 @@
-# 3rd party imports
-import stellar_base.utils
-from stellar_base.exceptions import *
-from stellar_base.keypair import Keypair
-from stellar_base.address import Address
+# System imports
+import hashlib
+import itertools
+import re
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal, InvalidOperation
+# Local imports
+from .cache import TtlLruCache
+from .horizon import *
+from .metrics import timed_span
+from .strkey import *
 
 STELLAR_MEMO_TEXT_MAX_BYTES = 28
+STELLAR_MAX_OPERATIONS_PER_TRANSACTION = 100
+STELLAR_AMOUNT_MAX_DECIMAL_PLACES = 7
+STELLAR_AMOUNT_MAX_STROOPS = 2**63 - 1
+STELLAR_ASSET_CODE_REGEX = re.compile(r'^[a-zA-Z0-9]{1,12}$')
+ACCOUNT_DETAILS_CACHE_TTL_SECONDS = 5
+ACCOUNT_DETAILS_CACHE_MAX_SIZE = 1024
+SEED_ADDRESSES_MEMO_MAX_SIZE = 256
+KEYPAIR_GENERATION_CHUNK_SIZE = 1000
+
+_account_details_cache = TtlLruCache(ACCOUNT_DETAILS_CACHE_TTL_SECONDS, ACCOUNT_DETAILS_CACHE_MAX_SIZE)
+_seed_addresses = TtlLruCache(None, SEED_ADDRESSES_MEMO_MAX_SIZE)  # seed digest -> address, for valid seeds only
 
 
 def is_address_valid(address):
@@ -15,12 +32,16 @@ def is_address_valid(address):
     :return: Returns true if the given address is valid and false otherwise.
     :rtype: bool
     """
+    # stellar_base is imported on first use since importing it takes longer than starting the CLI itself
+    from stellar_base.exceptions import DecodeError
+    from stellar_base.utils import decode_check
+
     if address is None:
         return False
     try:
-        stellar_base.utils.decode_check('account', address)
+        decode_check('account', address)
         return True
-    except DecodeError:
+    except (DecodeError, ValueError):  # ValueError is raised for non ASCII strings
         return False
 
 
@@ -31,12 +52,15 @@ def is_seed_valid(key):
     :return: Returns true if the seed is valid and false otherwise.
     :rtype: bool
     """
+    from stellar_base.exceptions import DecodeError
+    from stellar_base.utils import decode_check
+
     if key is None:
         return False
     try:
-        stellar_base.utils.decode_check('seed', key)
+        decode_check('seed', key)
         return True
-    except DecodeError:
+    except (DecodeError, ValueError):  # ValueError is raised for non ASCII strings
         return False
 
 
@@ -53,54 +77,264 @@ def is_transaction_text_memo_valid(memo):
     return False if len(memo) > STELLAR_MEMO_TEXT_MAX_BYTES else True
 
 
+def is_stellar_amount_valid(amount):
+    """
+    Checks if a given string is a valid Stellar amount. To be valid the amount must be
+    positive, have at most 7 decimal places and fit in a signed 64-bit integer once
+    converted to stroops.
+    :param str amount: Amount to be evaluated.
+    :return: Returns true if the given amount is valid and false otherwise.
+    :rtype: bool
+    """
+    if amount is None:
+        return False
+    try:
+        value = Decimal(amount)
+    except InvalidOperation:
+        return False
+    if not value.is_finite() or value <= 0:
+        return False
+    if value.as_tuple().exponent < -STELLAR_AMOUNT_MAX_DECIMAL_PLACES:
+        return False
+    return value * 10**STELLAR_AMOUNT_MAX_DECIMAL_PLACES <= STELLAR_AMOUNT_MAX_STROOPS
+
+
+def amount_to_stroops(amount):
+    """
+    Converts a Stellar amount (e.g. '10.5' XLM) into an exact integer number of stroops (the smallest
+    unit, 0.0000001).
+    :param str amount: Amount to be converted.
+    :return: Returns the number of stroops.
+    :rtype: int
+    :raises ValueError: If the amount is not a number with at most 7 decimal places.
+    """
+    try:
+        value = Decimal(amount).scaleb(STELLAR_AMOUNT_MAX_DECIMAL_PLACES)
+    except (InvalidOperation, TypeError):
+        raise ValueError('Invalid Stellar amount: {}'.format(amount))
+    if not value.is_finite() or value != value.to_integral_value():
+        raise ValueError('Invalid Stellar amount: {}'.format(amount))
+    return int(value)
+
+
+def stroops_to_amount(stroops):
+    """
+    Converts an integer number of stroops into a Stellar amount, with the 7 decimal places used by Horizon.
+    :param int stroops: Number of stroops.
+    :return: Returns the amount (e.g. '10.5000000').
+    :rtype: str
+    """
+    units, decimals = divmod(abs(int(stroops)), 10**STELLAR_AMOUNT_MAX_DECIMAL_PLACES)
+    return '{}{}.{:0{}d}'.format('-' if stroops < 0 else '', units, decimals, STELLAR_AMOUNT_MAX_DECIMAL_PLACES)
+
+
+def format_asset(asset):
+    """
+    Formats an asset as 'XLM' (native asset) or 'CODE:ISSUER', as used on the batch payments files.
+    :param tuple asset: Asset (code, issuer). The issuer is None for the native asset.
+    :return: Returns the formatted asset.
+    :rtype: str
+    """
+    code, issuer = asset
+    return code if issuer is None else '{}:{}'.format(code, issuer)
+
+
+def parse_asset(asset):
+    """
+    Parses an asset formatted as 'XLM' (native asset) or 'CODE:ISSUER'.
+    :param str asset: Asset to be parsed.
+    :return: Returns the asset (code, issuer), with a None issuer for the native asset, or None if the given
+    asset is invalid.
+    :rtype: tuple or None
+    """
+    code, _, issuer = asset.strip().partition(CSV_BATCH_PAYMENT_ASSET_SEPARATOR)
+    if not issuer:
+        return ('XLM', None) if code.upper() == 'XLM' else None
+    if not STELLAR_ASSET_CODE_REGEX.match(code) or not is_address_valid(issuer):
+        return None
+    return code, issuer
+
+
 def is_seed_matching_address(seed, address):
     """
-    Checks if the specified seed address matches the specified address.
+    Checks if the specified seed address matches the specified address. Seeds already checked (or
+    converted by seed_to_address()) are neither validated nor derived again.
     :param str seed: Seed to be evaluated.
     :param str address: Address to be evaluated.
     :return: Returns true if seed address matches the specified address, and false otherwise.
     :rtype: bool
     """
-    if not is_seed_valid(seed) \
-            or not is_address_valid(address):
+    if seed is None or address is None:
         return False
 
-    keypair = Keypair.from_seed(seed=seed)
-    if keypair.address().decode() == address:
+    seed_address = _seed_addresses.get(_seed_digest(seed))
+    if seed_address is None:
+        if not is_seed_valid(seed) \
+                or not is_address_valid(address):
+            return False
+        seed_address = seed_to_address(seed)
+
+    if seed_address == address:
         return True
     return False
 
 
-def is_account_existent(address):
+def seed_to_address(seed):
+    """
+    Derives the address of the account controlled by the specified seed. It assumes that the
+    seed parameter received is a valid seed string. Since the derivation of the public key is
+    costly, the addresses of the last used seeds are memoized, keyed by a digest of the seed.
+    :param str seed: Seed from which the address is derived.
+    :return: Returns the address matching the given seed.
+    :rtype: str
+    """
+    from stellar_base.keypair import Keypair
+
+    digest = _seed_digest(seed)
+    address = _seed_addresses.get(digest)
+    if address is None:
+        with timed_span('address_derivation'):
+            address = Keypair.from_seed(seed=seed).address().decode()
+        _seed_addresses.put(digest, address)
+    return address
+
+
+def generate_keypairs(count, processes=None):
+    """
+    Generates random Stellar keypairs. Large amounts of keypairs are generated in chunks spread across
+    a pool of processes, since the derivation of each public key is CPU bound.
+    :param int count: Number of keypairs to generate.
+    :param int processes: Number of processes generating keypairs. Defaults to the number of CPUs.
+    :return: Returns a list of (address, seed) tuples.
+    :rtype: list of (str, str)
+    """
+    if count <= KEYPAIR_GENERATION_CHUNK_SIZE or processes == 1:
+        return _generate_keypairs_chunk(count)
+
+    chunks = [KEYPAIR_GENERATION_CHUNK_SIZE] * (count // KEYPAIR_GENERATION_CHUNK_SIZE)
+    if count % KEYPAIR_GENERATION_CHUNK_SIZE:
+        chunks.append(count % KEYPAIR_GENERATION_CHUNK_SIZE)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(itertools.chain.from_iterable(executor.map(_generate_keypairs_chunk, chunks)))
+
+
+def _generate_keypairs_chunk(count):
+    """
+    Generates a chunk of random Stellar keypairs. It runs on the worker processes of generate_keypairs().
+    :param int count: Number of keypairs to generate.
+    :return: Returns a list of (address, seed) tuples.
+    :rtype: list of (str, str)
+    """
+    from stellar_base.keypair import Keypair
+
+    keypairs = []
+    for _ in range(count):
+        keypair = Keypair.random()
+        keypairs.append((keypair.address().decode(), keypair.seed().decode()))
+    return keypairs
+
+
+def forget_seed_addresses():
+    """
+    Drops the memoized addresses of the seeds converted by seed_to_address().
+    """
+    _seed_addresses.clear()
+
+
+def _seed_digest(seed):
+    """
+    Computes the digest under which the address of a seed is memoized, so that the seeds themselves
+    are not kept in memory.
+    :param str seed: Seed to be digested.
+    :return: Returns the seed digest.
+    :rtype: bytes
+    """
+    return hashlib.sha256(seed.encode()).digest()
+
+
+def is_account_existent(address, fresh=False):
     """
     Checks if a given Stellar address exists in the network. It assumes that the address
     parameter received is a valid address string.
     :param str address: address to be evaluated.
+    :param bool fresh: If True the account details cache is bypassed.
     :return: Returns true if the given address exists in the network and false otherwise.
     :rtype: bool
     """
-    return True if get_address_details_from_network(address) is not None else False
+    return True if get_address_details_from_network(address, use_cache=not fresh) is not None else False
 
 
-def get_address_details_from_network(address):
+def get_address_details_from_network(address, use_cache=True):
     """
-    Queries the Stellar network regarding the details of the specified account address.
+    Queries the Stellar network regarding the details of the specified account address. The details
+    are kept in a cache for a few seconds, so consecutive queries regarding the same address do not
+    reach the network.
     :param str address: address to be evaluated.
+    :param bool use_cache: If False the cached details are ignored and the latest ones are fetched from
+    the network (and cached).
     :return: In case of success returns a Stellar Address object with the updated address information, fetched from
     the Stellar network. In case of failure returns None
     :rtype: Address or None
     """
+    address_details, error = query_address_details(address, use_cache)
+    if error is not None:
+        print(error)
+    return address_details
+
+
+def query_address_details(address, use_cache=True):
+    """
+    Does the same as get_address_details_from_network() but, instead of printing the reason of a failure,
+    returns it to the caller. It is safe to be called concurrently from several threads.
+    :param str address: address to be evaluated.
+    :param bool use_cache: If False the cached details are ignored and the latest ones are fetched from
+    the network (and cached).
+    :return: Returns the Stellar Address object and None in case of success, or None and the reason of the
+    failure otherwise.
+    :rtype: (Address, None) or (None, str)
+    """
+    from stellar_base.address import Address
+    from stellar_base.exceptions import AccountNotExistError, HorizonError
+
     if not is_address_valid(address):
-        print('Trying to get information of an invalid address.')
-        return None
+        return None, 'Trying to get information of an invalid address.'
+
+    if use_cache:
+        cached_address = _account_details_cache.get(address)
+        if cached_address is not None:
+            return cached_address, None
 
     try:
-        address = Address(address=address)
-        address.get()  # Get the latest information from Horizon
+        with timed_span('account_query'):
+            address_details = Address(address=address, horizon=get_horizon())
+            address_details.get()  # Get the latest information from Horizon
     except AccountNotExistError:
-        print('The specified account does not exist.')
-        return None
+        return None, 'The specified account does not exist.'
     except HorizonError:
-        print('A connection error occurred (Please check your Internet connection).')
-        return None
-    return address
+        return None, 'A connection error occurred (Please check your Internet connection).'
+    except Exception as e:
+        # Too broad exception because stellar_base raises a generic Exception for the other Horizon errors
+        return None, 'The Horizon server returned an error: {}'.format(e)
+
+    _account_details_cache.put(address, address_details)
+    return address_details, None
+
+
+def invalidate_address_details(*addresses):
+    """
+    Removes the cached details of the given addresses, forcing the next query to reach the network. It
+    should be used whenever a transaction changing the state of the accounts is submitted.
+    :param str addresses: Addresses whose cached details are no longer valid.
+    """
+    for address in addresses:
+        _account_details_cache.invalidate(address)
+
+
+def configure_address_details_cache(ttl, max_size=ACCOUNT_DETAILS_CACHE_MAX_SIZE):
+    """
+    Configures the cache of account details. All the currently cached details are discarded.
+    :param float ttl: Time, in seconds, during which the details of an account are cached.
+    :param int max_size: Maximum number of cached accounts. The cache is disabled if it is 0.
+    """
+    global _account_details_cache
+    _account_details_cache = TtlLruCache(ttl, max_size)
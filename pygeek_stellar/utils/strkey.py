@@ -0,0 +1,156 @@
+# System imports
+import base64
+import binascii
+import itertools
+
+STRKEY_ACCOUNT_LENGTH = 56  # Base32 encoding of the version byte, 32 bytes of public key and 2 bytes of checksum
+STRKEY_ACCOUNT_DECODED_LENGTH = 35
+STRKEY_ACCOUNT_VERSION_BYTE = 6 << 3  # 'G'
+STRKEY_BASE32_ALPHABET = b'ABCDEFGHIJKLMNOPQRSTUVWXYZ234567'
+ADDRESS_VALIDATION_CHUNK_SIZE = 65536
+
+ADDRESS_ERROR_NOT_A_STRING = 'The address is not a string'
+ADDRESS_ERROR_LENGTH = 'The address must have {} characters'.format(STRKEY_ACCOUNT_LENGTH)
+ADDRESS_ERROR_CHARACTER = 'The address has characters other than A-Z and 2-7'
+ADDRESS_ERROR_VERSION = 'The address is not an account address (it must start with G)'
+ADDRESS_ERROR_CHECKSUM = 'The address checksum does not match'
+
+
+def _crc16_xmodem_table():
+    """
+    Builds the lookup table of the CRC16-XModem checksum used by the Stellar keys.
+    :return: Returns the checksum of each byte value.
+    :rtype: list of int
+    """
+    table = []
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021 if crc & 0x8000 else crc << 1) & 0xFFFF
+        table.append(crc)
+    return table
+
+
+_CRC16_TABLE = _crc16_xmodem_table()
+
+
+def validate_addresses(addresses, chunk_size=ADDRESS_VALIDATION_CHUNK_SIZE):
+    """
+    Checks if the given Stellar addresses are valid, like is_address_valid() but much faster for large
+    amounts of addresses. The addresses are validated in chunks: if NumPy is available each chunk is
+    decoded and checksummed with array operations, otherwise each address is decoded and checksummed
+    using lookup tables.
+    :param addresses: Iterable of addresses to be evaluated.
+    :param int chunk_size: Number of addresses validated at a time.
+    :return: Returns a list telling if each address is valid and a list with the reason why each address
+    is invalid (None for the valid addresses), both in the same order as the given addresses.
+    :rtype: (list of bool, list of str)
+    """
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+
+    reasons = []
+    addresses = iter(addresses)
+    while True:
+        chunk = list(itertools.islice(addresses, chunk_size))
+        if not chunk:
+            break
+        if numpy is not None:
+            reasons.extend(_validate_addresses_chunk_numpy(chunk, numpy))
+        else:
+            reasons.extend(get_address_error(address) for address in chunk)
+    return [reason is None for reason in reasons], reasons
+
+
+def get_address_error(address):
+    """
+    Checks if a given Stellar address is valid using lookup tables for the checksum.
+    :param str address: Address to be evaluated.
+    :return: Returns the reason why the address is invalid or None if it is valid.
+    :rtype: str or None
+    """
+    if not isinstance(address, str):
+        return ADDRESS_ERROR_NOT_A_STRING
+    if len(address) != STRKEY_ACCOUNT_LENGTH:
+        return ADDRESS_ERROR_LENGTH
+    try:
+        decoded = base64.b32decode(address)
+    except (binascii.Error, ValueError):
+        return ADDRESS_ERROR_CHARACTER
+    if decoded[0] != STRKEY_ACCOUNT_VERSION_BYTE:
+        return ADDRESS_ERROR_VERSION
+
+    crc = 0
+    for byte in decoded[:-2]:
+        crc = ((crc << 8) & 0xFFFF) ^ _CRC16_TABLE[(crc >> 8) ^ byte]
+    if crc != decoded[-2] | (decoded[-1] << 8):  # The checksum is stored in little endian
+        return ADDRESS_ERROR_CHECKSUM
+    return None
+
+
+def _validate_addresses_chunk_numpy(addresses, numpy):
+    """
+    Validates a chunk of addresses using NumPy array operations: the addresses with the right length
+    are packed into a matrix of characters which is base32 decoded and checksummed column by column.
+    :param list addresses: Addresses to be evaluated.
+    :param module numpy: The numpy module.
+    :return: Returns the reason why each address is invalid (None for the valid ones).
+    :rtype: list of str
+    """
+    reasons = [None] * len(addresses)
+    candidates = []
+    for i, address in enumerate(addresses):
+        if not isinstance(address, str):
+            reasons[i] = ADDRESS_ERROR_NOT_A_STRING
+        elif len(address) != STRKEY_ACCOUNT_LENGTH:
+            reasons[i] = ADDRESS_ERROR_LENGTH
+        else:
+            candidates.append(i)
+    if not candidates:
+        return reasons
+
+    # Non ASCII characters are replaced by '?', which keeps the length of every address and is not base32
+    encoded = ''.join(addresses[i] for i in candidates).encode('ascii', 'replace')
+    characters = numpy.frombuffer(encoded, dtype=numpy.uint8).reshape(len(candidates), STRKEY_ACCOUNT_LENGTH)
+    values = _base32_values_table(numpy)[characters]
+    invalid_character = (values == 0xFF).any(axis=1)
+
+    # Every 8 base32 characters (40 bits) are decoded to 5 bytes
+    groups = values.reshape(len(candidates), -1, 8).astype(numpy.uint64)
+    bits = numpy.zeros(groups.shape[:2], dtype=numpy.uint64)
+    for i in range(8):
+        bits |= groups[:, :, i] << numpy.uint64(35 - 5 * i)
+    decoded = numpy.empty(groups.shape[:2] + (5,), dtype=numpy.uint8)
+    for i in range(5):
+        decoded[:, :, i] = (bits >> numpy.uint64(32 - 8 * i)) & numpy.uint64(0xFF)
+    decoded = decoded.reshape(len(candidates), STRKEY_ACCOUNT_DECODED_LENGTH).astype(numpy.uint32)
+
+    crc_table = numpy.array(_CRC16_TABLE, dtype=numpy.uint32)
+    crc = numpy.zeros(len(candidates), dtype=numpy.uint32)
+    for column in range(STRKEY_ACCOUNT_DECODED_LENGTH - 2):
+        crc = ((crc << 8) & 0xFFFF) ^ crc_table[(crc >> 8) ^ decoded[:, column]]
+    invalid_checksum = crc != (decoded[:, -2] | (decoded[:, -1] << 8))
+    invalid_version = decoded[:, 0] != STRKEY_ACCOUNT_VERSION_BYTE
+
+    for i in numpy.flatnonzero(invalid_character | invalid_version | invalid_checksum):
+        if invalid_character[i]:
+            reasons[candidates[i]] = ADDRESS_ERROR_CHARACTER
+        elif invalid_version[i]:
+            reasons[candidates[i]] = ADDRESS_ERROR_VERSION
+        else:
+            reasons[candidates[i]] = ADDRESS_ERROR_CHECKSUM
+    return reasons
+
+
+def _base32_values_table(numpy):
+    """
+    Builds the lookup table of the value of each base32 character. Other characters map to 0xFF.
+    :param module numpy: The numpy module.
+    :return: Returns the value of each byte value, as a base32 character.
+    :rtype: numpy.ndarray
+    """
+    table = numpy.full(256, 0xFF, dtype=numpy.uint8)
+    table[numpy.frombuffer(STRKEY_BASE32_ALPHABET, dtype=numpy.uint8)] = numpy.arange(32, dtype=numpy.uint8)
+    return table
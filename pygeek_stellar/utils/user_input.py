@@ -6,6 +6,35 @@ from .generic import *
 USER_INPUT_YES = 'y'
 USER_INPUT_NO = 'n'
 
+_prompts_enabled = True
+
+
+class PromptsDisabledError(Exception):
+    """
+    Raised when some input is requested from the user while the prompts are disabled.
+    """
+    pass
+
+
+def set_prompts_enabled(enabled):
+    """
+    Enables or disables the user prompts. While the prompts are disabled (e.g. when running a script)
+    every Yes/No question is answered with USER_INPUT_YES and any other input request raises
+    PromptsDisabledError.
+    :param bool enabled: True to enable the prompts and False to disable them.
+    """
+    global _prompts_enabled
+    _prompts_enabled = enabled
+
+
+def are_prompts_enabled():
+    """
+    Checks if the user prompts are enabled.
+    :return: Returns True if the prompts are enabled and False otherwise.
+    :rtype: bool
+    """
+    return _prompts_enabled
+
 
 def int_input(msg):
     """
@@ -41,11 +70,14 @@ def yes_or_no_input(msg):
     """
     This methods should be used to request an Yes/No input from the user. This
     method will not return until the user inputs a valid answer (USER_INPUT_YES or
-    USER_INPUT_NO).
+    USER_INPUT_NO). If the prompts are disabled USER_INPUT_YES is returned without
+    asking the user.
     :param str msg: Message to be displayed to the user.
     :return: Returns USER_INPUT_YES if the answer is affirmative and USER_INPUT_NO otherwise.
     :rtype: str
     """
+    if not _prompts_enabled:
+        return USER_INPUT_YES
     full_msg = '{} ({}/{})'.format(msg, USER_INPUT_YES, USER_INPUT_NO)
     answer = safe_input(full_msg).lower()
     while answer not in [USER_INPUT_YES, USER_INPUT_NO]:
@@ -58,11 +90,13 @@ def password_input(msg):
     This methods should be used to request a password input from the user. With
     this method the password inserted by the user will not be displayed on the
     screen. It also exits gracefully in case of a KeyboardInterrupt signal (ctr+c)
-    being received.
+    being received. It raises PromptsDisabledError if the prompts are disabled.
     :param str msg: Message to be displayed to the user.
     :return: Returns the password inserted by the user.
     :rtype: str
     """
+    if not _prompts_enabled:
+        raise PromptsDisabledError(msg)
     try:
         return getpass.getpass('{}: '.format(msg))
     except KeyboardInterrupt:
@@ -73,11 +107,14 @@ def password_input(msg):
 def safe_input(msg):
     """
     This method extends the system built input() method in order to exit gracefully
-    in case of a KeyboardInterrupt signal (ctr+c) being received.
+    in case of a KeyboardInterrupt signal (ctr+c) being received. It raises
+    PromptsDisabledError if the prompts are disabled.
     :param str msg: Message to be displayed to the user.
     :return: Returns the input inserted by the user.
     :rtype: str
     """
+    if not _prompts_enabled:
+        raise PromptsDisabledError(msg)
     try:
         return input('{}: '.format(msg))
     except KeyboardInterrupt: